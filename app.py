@@ -1,9 +1,10 @@
 # app.py - LinkedBoost Assistant IA pour LinkedIn - Version complète
 
-from flask import Flask, render_template, request, jsonify, redirect
+from flask import Flask, render_template, request, jsonify, redirect, Response, stream_with_context
 from flask_cors import CORS
 import json
 import os
+import time
 import asyncio
 from datetime import datetime
 import logging
@@ -14,6 +15,10 @@ logger = logging.getLogger(__name__)
 
 # Imports des modules locaux
 from models.ai_generator import LinkedBoostAI
+from models.batch_generator import BatchGenerationManager
+from models.job_queue import GenerationJobQueue, QueueFullError
+from models.model_residency import ModelResidencyManager
+from models.offer_summarizer import OfferSummarizer
 from config import Config
 
 # Initialisation de l'application Flask
@@ -23,6 +28,18 @@ CORS(app)
 
 # Initialisation du générateur IA
 ai_generator = LinkedBoostAI()
+batch_manager = BatchGenerationManager(ai_generator)
+job_queue = GenerationJobQueue()
+
+# Modèles préchargés et maintenus en mémoire (aucune requête ne paie le chargement à froid)
+model_residency = ModelResidencyManager(ai_generator.client, generation_models=ai_generator.router.get_models())
+if Config.MODEL_WARMUP_ENABLED:
+    model_residency.start()
+
+# Résumés des offres calculés à l'insertion, utilisés à la place des descriptions
+offer_summarizer = OfferSummarizer(ai_generator, knowledge_base=batch_manager.knowledge_base)
+if Config.OFFER_SUMMARY_ENABLED:
+    offer_summarizer.start()
 
 # Instance globale de l'orchestrateur de scraping
 scraping_orchestrator = None
@@ -152,6 +169,140 @@ def knowledge_base_page():
 # API GÉNÉRATION DE CONTENU
 # ==========================================
 
+def is_queued_request(data):
+    """Mode file d'attente demandé via {"queued": true} ou ?mode=queued"""
+    return bool(data.get('queued')) or request.args.get('mode') == 'queued'
+
+def enqueue_generation(job_type, run, data):
+    """Dépose la génération dans la file et retourne immédiatement l'identifiant du job"""
+    try:
+        job = job_queue.submit(job_type, lambda: run(data))
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    
+    return jsonify({
+        'success': True,
+        'status_url': f"/api/jobs/{job['job_id']}",
+        **job
+    }), 202
+
+def message_params(data):
+    """Arguments communs des générations de message (bloquante, streaming, variantes)"""
+    return {
+        'message_type': data['message_type'],
+        'recipient_name': data['recipient_name'],
+        'recipient_company': data.get('recipient_company', ''),
+        'recipient_position': data.get('recipient_position', ''),
+        'context': data['context'],
+        'sender_name': data.get('sender_name', 'Utilisateur'),
+        'common_connections': data.get('common_connections', []),
+        'personalization_notes': data.get('personalization_notes', ''),
+        'use_cache': data.get('use_cache', True)
+    }
+
+def email_params(data):
+    """Arguments communs des générations d'email (bloquante, streaming, variantes)"""
+    return {
+        'email_type': data['email_type'],
+        'recipient_name': data['recipient_name'],
+        'recipient_company': data.get('recipient_company', ''),
+        'subject_context': data['subject_context'],
+        'sender_name': data.get('sender_name', 'Utilisateur'),
+        'meeting_purpose': data.get('meeting_purpose', ''),
+        'background_info': data.get('background_info', ''),
+        'use_cache': data.get('use_cache', True)
+    }
+
+def variant_count(data):
+    """Nombre de variantes demandé ("variants"), None si invalide"""
+    try:
+        count = int(data.get('variants', 1))
+    except (TypeError, ValueError):
+        return None
+    return count if 1 <= count <= Config.GENERATION_MAX_VARIANTS else None
+
+def collect_variants(variants, key):
+    """Rassemble des variantes terminées; la première réussie sert de réponse principale"""
+    started = time.monotonic()
+    results = sorted(variants, key=lambda variant: variant['index'])
+    succeeded = [variant for variant in results if key in variant]
+    if not succeeded:
+        raise RuntimeError(results[0].get('error', 'Aucune variante générée'))
+    
+    return {
+        'success': True,
+        key: succeeded[0][key],
+        'variants': results,
+        'wall_ms': round((time.monotonic() - started) * 1000, 1),
+        'generation': succeeded[0]['generation']
+    }
+
+def run_message_generation(data):
+    if variant_count(data) > 1:
+        result = collect_variants(
+            ai_generator.generate_linkedin_message_variants(variant_count(data), **message_params(data)), 'message'
+        )
+        return {**result, 'type': data['message_type']}
+    
+    message = ai_generator.generate_linkedin_message(**message_params(data))
+    
+    return {
+        'success': True,
+        'message': message,
+        'type': data['message_type'],
+        'generation': ai_generator.get_last_generation_info()
+    }
+
+def run_cover_letter_generation(data):
+    cover_letter = ai_generator.generate_cover_letter(
+        job_title=data['job_title'],
+        company_name=data['company_name'],
+        job_description=ai_generator.resolve_job_description(data.get('hash_id'), data.get('job_description', '')),
+        applicant_name=data['applicant_name'],
+        applicant_experience=data.get('applicant_experience', ''),
+        applicant_skills=data.get('applicant_skills', []),
+        tone=data.get('tone', 'professional'),
+        use_cache=data.get('use_cache', True)
+    )
+    
+    return {
+        'success': True,
+        'cover_letter': cover_letter,
+        'job_title': data['job_title'],
+        'company_name': data['company_name'],
+        'generation': ai_generator.get_last_generation_info()
+    }
+
+def run_email_generation(data):
+    if variant_count(data) > 1:
+        result = collect_variants(
+            ai_generator.generate_networking_email_variants(variant_count(data), **email_params(data)), 'email'
+        )
+        return {**result, 'type': data['email_type']}
+    
+    email = ai_generator.generate_networking_email(**email_params(data))
+    
+    return {
+        'success': True,
+        'email': email,
+        'type': data['email_type'],
+        'generation': ai_generator.get_last_generation_info()
+    }
+
+def run_profile_analysis(data):
+    analysis = ai_generator.analyze_linkedin_profile(
+        profile_text=data['profile_text'],
+        target_role=data.get('target_role', ''),
+        industry=data.get('industry', ''),
+        use_cache=data.get('use_cache', True)
+    )
+    
+    return {
+        'success': True,
+        'analysis': analysis,
+        'generation': ai_generator.get_last_generation_info()
+    }
+
 @app.route('/api/generate/message', methods=['POST'])
 def generate_linkedin_message():
     """API pour générer des messages LinkedIn personnalisés"""
@@ -162,22 +313,13 @@ def generate_linkedin_message():
         if not all(field in data for field in required_fields):
             return jsonify({'error': 'Champs requis manquants'}), 400
         
-        message = ai_generator.generate_linkedin_message(
-            message_type=data['message_type'],
-            recipient_name=data['recipient_name'],
-            recipient_company=data.get('recipient_company', ''),
-            recipient_position=data.get('recipient_position', ''),
-            context=data['context'],
-            sender_name=data.get('sender_name', 'Utilisateur'),
-            common_connections=data.get('common_connections', []),
-            personalization_notes=data.get('personalization_notes', '')
-        )
+        if variant_count(data) is None:
+            return jsonify({'error': f"variants doit être compris entre 1 et {Config.GENERATION_MAX_VARIANTS}"}), 400
         
-        return jsonify({
-            'success': True,
-            'message': message,
-            'type': data['message_type']
-        })
+        if is_queued_request(data):
+            return enqueue_generation('message', run_message_generation, data)
+        
+        return jsonify(run_message_generation(data))
         
     except Exception as e:
         logger.error(f"Erreur génération message: {e}")
@@ -193,22 +335,10 @@ def generate_cover_letter():
         if not all(field in data for field in required_fields):
             return jsonify({'error': 'Champs requis manquants'}), 400
         
-        cover_letter = ai_generator.generate_cover_letter(
-            job_title=data['job_title'],
-            company_name=data['company_name'],
-            job_description=data.get('job_description', ''),
-            applicant_name=data['applicant_name'],
-            applicant_experience=data.get('applicant_experience', ''),
-            applicant_skills=data.get('applicant_skills', []),
-            tone=data.get('tone', 'professional')
-        )
+        if is_queued_request(data):
+            return enqueue_generation('cover_letter', run_cover_letter_generation, data)
         
-        return jsonify({
-            'success': True,
-            'cover_letter': cover_letter,
-            'job_title': data['job_title'],
-            'company_name': data['company_name']
-        })
+        return jsonify(run_cover_letter_generation(data))
         
     except Exception as e:
         logger.error(f"Erreur génération lettre: {e}")
@@ -224,21 +354,13 @@ def generate_email():
         if not all(field in data for field in required_fields):
             return jsonify({'error': 'Champs requis manquants'}), 400
         
-        email = ai_generator.generate_networking_email(
-            email_type=data['email_type'],
-            recipient_name=data['recipient_name'],
-            recipient_company=data.get('recipient_company', ''),
-            subject_context=data['subject_context'],
-            sender_name=data.get('sender_name', 'Utilisateur'),
-            meeting_purpose=data.get('meeting_purpose', ''),
-            background_info=data.get('background_info', '')
-        )
+        if variant_count(data) is None:
+            return jsonify({'error': f"variants doit être compris entre 1 et {Config.GENERATION_MAX_VARIANTS}"}), 400
         
-        return jsonify({
-            'success': True,
-            'email': email,
-            'type': data['email_type']
-        })
+        if is_queued_request(data):
+            return enqueue_generation('email', run_email_generation, data)
+        
+        return jsonify(run_email_generation(data))
         
     except Exception as e:
         logger.error(f"Erreur génération email: {e}")
@@ -253,21 +375,303 @@ def analyze_profile():
         if 'profile_text' not in data:
             return jsonify({'error': 'Texte du profil requis'}), 400
         
-        analysis = ai_generator.analyze_linkedin_profile(
-            profile_text=data['profile_text'],
-            target_role=data.get('target_role', ''),
-            industry=data.get('industry', '')
-        )
+        if is_queued_request(data):
+            return enqueue_generation('profile_analysis', run_profile_analysis, data)
+        
+        return jsonify(run_profile_analysis(data))
         
+    except Exception as e:
+        logger.error(f"Erreur analyse profil: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# ==========================================
+# API FILE DE GÉNÉRATION
+# ==========================================
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_generation_job(job_id):
+    """État d'un job en file; ?wait=N attend jusqu'à N secondes sa fin (long polling)"""
+    wait = min(max(request.args.get('wait', 0, type=float), 0), 60)
+    job = job_queue.get_job(job_id, wait=wait)
+    
+    if job is None:
+        return jsonify({'error': 'Job introuvable'}), 404
+    
+    return jsonify({
+        'success': True,
+        **job
+    })
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_generation_job(job_id):
+    """Annule un job: retiré de la file s'il attend, flux Ollama coupé s'il est en cours"""
+    job = job_queue.cancel(job_id)
+    
+    if job is None:
+        return jsonify({'error': 'Job introuvable'}), 404
+    
+    return jsonify({
+        'success': True,
+        **job
+    })
+
+@app.route('/api/admin/queue/stats')
+def admin_queue_stats():
+    """Profondeur de la file de génération, temps d'attente et voies de priorité Ollama"""
+    try:
         return jsonify({
             'success': True,
-            'analysis': analysis
+            'queue': job_queue.get_stats(),
+            'scheduler': ai_generator.client.scheduler.get_stats()
         })
+    except Exception as e:
+        logger.error(f"Erreur stats file: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# ==========================================
+# API GÉNÉRATION EN LOT
+# ==========================================
+
+@app.route('/api/generate/batch', methods=['POST'])
+def create_generation_batch():
+    """Lance la génération de lettres pour une liste d'offres (hash_id) et un profil"""
+    try:
+        data = request.get_json() or {}
         
+        hash_ids = data.get('hash_ids')
+        if not isinstance(hash_ids, list) or 'applicant_name' not in data:
+            return jsonify({'error': 'Champs requis manquants (hash_ids, applicant_name)'}), 400
+        
+        profile = {
+            'applicant_name': data['applicant_name'],
+            'applicant_experience': data.get('applicant_experience', ''),
+            'applicant_skills': data.get('applicant_skills', []),
+            'tone': data.get('tone', 'professional'),
+            'use_cache': data.get('use_cache', True)
+        }
+        
+        batch = batch_manager.create_batch(hash_ids, profile, data.get('concurrency'))
+        
+        return jsonify({
+            'success': True,
+            **batch
+        }), 202
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"Erreur analyse profil: {e}")
+        logger.error(f"Erreur création lot: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/generate/batch/<batch_id>', methods=['GET'])
+def get_generation_batch(batch_id):
+    """Progression d'un lot; ?since=N ne renvoie que les résultats terminés après le curseur N"""
+    since = request.args.get('since', 0, type=int)
+    batch = batch_manager.get_batch(batch_id, since=since)
+    
+    if batch is None:
+        return jsonify({'error': 'Lot introuvable'}), 404
+    
+    return jsonify({
+        'success': True,
+        **batch
+    })
+
+@app.route('/api/generate/batch/<batch_id>', methods=['DELETE'])
+def cancel_generation_batch(batch_id):
+    """Annule un lot: éléments en attente abandonnés, générations en cours interrompues"""
+    batch = batch_manager.cancel_batch(batch_id)
+    
+    if batch is None:
+        return jsonify({'error': 'Lot introuvable'}), 404
+    
+    return jsonify({
+        'success': True,
+        **batch
+    })
+
+# ==========================================
+# API GÉNÉRATION EN STREAMING (NDJSON)
+# ==========================================
+
+def stream_ndjson(tokens, finalize=None, progress=None):
+    """Relaie les tokens Ollama au client, une ligne JSON par événement.
+    
+    Événements émis: {"event": "token", "content": ...} pour chaque token,
+    {"event": "partial", ...} quand progress(token) renvoie un état
+    intermédiaire, puis {"event": "done", ...} (enrichi par
+    finalize(texte_complet)) ou {"event": "error", "error": ...}.
+    
+    Si le client se déconnecte, le serveur WSGI ferme ce générateur: la
+    fermeture est propagée aux tokens, ce qui coupe le flux Ollama.
+    """
+    def events():
+        parts = []
+        try:
+            for token in tokens:
+                parts.append(token)
+                yield json.dumps({'event': 'token', 'content': token}, ensure_ascii=False) + '\n'
+                update = progress(token) if progress else None
+                if update:
+                    yield json.dumps({'event': 'partial', **update}, ensure_ascii=False) + '\n'
+            
+            full_text = ''.join(parts).strip()
+            done = {'event': 'done', 'success': True}
+            done.update(finalize(full_text) if finalize else {'content': full_text})
+            done['generation'] = ai_generator.get_last_generation_info()
+            yield json.dumps(done, ensure_ascii=False) + '\n'
+            
+        except GeneratorExit:
+            logger.info("🛑 Client déconnecté: génération streaming interrompue")
+            raise
+        except Exception as e:
+            logger.error(f"Erreur génération streaming: {e}")
+            yield json.dumps({'event': 'error', 'success': False, 'error': str(e)}, ensure_ascii=False) + '\n'
+        finally:
+            if hasattr(tokens, 'close'):
+                tokens.close()
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def stream_variants_ndjson(variants, key, extra=None):
+    """Relaie chaque variante dès qu'elle est terminée, une ligne JSON par événement.
+    
+    Événements émis: {"event": "variant", "index": ..., key: ...} dans
+    l'ordre de fin, puis {"event": "done", "variants": [...]} trié par index.
+    """
+    def events():
+        started = time.monotonic()
+        results = []
+        try:
+            for variant in variants:
+                variant['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+                results.append(variant)
+                yield json.dumps({'event': 'variant', **variant}, ensure_ascii=False) + '\n'
+            
+            results.sort(key=lambda variant: variant['index'])
+            done = {'event': 'done', 'success': any(key in variant for variant in results),
+                    'variants': results, 'wall_ms': round((time.monotonic() - started) * 1000, 1)}
+            done.update(extra or {})
+            yield json.dumps(done, ensure_ascii=False) + '\n'
+            
+        except GeneratorExit:
+            logger.info("🛑 Client déconnecté: variantes en cours annulées")
+            raise
+        except Exception as e:
+            logger.error(f"Erreur génération des variantes: {e}")
+            yield json.dumps({'event': 'error', 'success': False, 'error': str(e)}, ensure_ascii=False) + '\n'
+        finally:
+            variants.close()
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/generate/message/stream', methods=['POST'])
+def stream_linkedin_message():
+    """Variante streaming de /api/generate/message"""
+    data = request.get_json() or {}
+    
+    required_fields = ['message_type', 'recipient_name', 'context']
+    if not all(field in data for field in required_fields):
+        return jsonify({'error': 'Champs requis manquants'}), 400
+    
+    count = variant_count(data)
+    if count is None:
+        return jsonify({'error': f"variants doit être compris entre 1 et {Config.GENERATION_MAX_VARIANTS}"}), 400
+    
+    if count > 1:
+        variants = ai_generator.generate_linkedin_message_variants(count, **message_params(data))
+        return stream_variants_ndjson(variants, 'message', {'type': data['message_type']})
+    
+    tokens = ai_generator.stream_linkedin_message(**message_params(data))
+    
+    return stream_ndjson(tokens, lambda text: {'message': text, 'type': data['message_type']})
+
+@app.route('/api/generate/cover-letter/stream', methods=['POST'])
+def stream_cover_letter():
+    """Variante streaming de /api/generate/cover-letter"""
+    data = request.get_json() or {}
+    
+    required_fields = ['job_title', 'company_name', 'applicant_name']
+    if not all(field in data for field in required_fields):
+        return jsonify({'error': 'Champs requis manquants'}), 400
+    
+    tokens = ai_generator.stream_cover_letter(
+        job_title=data['job_title'],
+        company_name=data['company_name'],
+        job_description=ai_generator.resolve_job_description(data.get('hash_id'), data.get('job_description', '')),
+        applicant_name=data['applicant_name'],
+        applicant_experience=data.get('applicant_experience', ''),
+        applicant_skills=data.get('applicant_skills', []),
+        tone=data.get('tone', 'professional'),
+        use_cache=data.get('use_cache', True)
+    )
+    
+    return stream_ndjson(tokens, lambda text: {
+        'cover_letter': text,
+        'job_title': data['job_title'],
+        'company_name': data['company_name']
+    })
+
+@app.route('/api/generate/email/stream', methods=['POST'])
+def stream_email():
+    """Variante streaming de /api/generate/email"""
+    data = request.get_json() or {}
+    
+    required_fields = ['email_type', 'recipient_name', 'subject_context']
+    if not all(field in data for field in required_fields):
+        return jsonify({'error': 'Champs requis manquants'}), 400
+    
+    count = variant_count(data)
+    if count is None:
+        return jsonify({'error': f"variants doit être compris entre 1 et {Config.GENERATION_MAX_VARIANTS}"}), 400
+    
+    if count > 1:
+        variants = ai_generator.generate_networking_email_variants(count, **email_params(data))
+        return stream_variants_ndjson(variants, 'email', {'type': data['email_type']})
+    
+    tokens = ai_generator.stream_networking_email(**email_params(data))
+    
+    return stream_ndjson(tokens, lambda text: {
+        'email': ai_generator.parse_email_response(text),
+        'type': data['email_type']
+    })
+
+@app.route('/api/analyze/profile/stream', methods=['POST'])
+def stream_profile_analysis():
+    """Variante streaming de /api/analyze/profile"""
+    data = request.get_json() or {}
+    
+    if 'profile_text' not in data:
+        return jsonify({'error': 'Texte du profil requis'}), 400
+    
+    tokens = ai_generator.stream_profile_analysis(
+        profile_text=data['profile_text'],
+        target_role=data.get('target_role', ''),
+        industry=data.get('industry', ''),
+        use_cache=data.get('use_cache', True)
+    )
+    
+    # Un événement "partial" à chaque champ JSON terminé: l'interface affiche
+    # le score et les points forts sans attendre le résumé
+    parser = ai_generator.profile_analysis_parser()
+    
+    def progress(token):
+        known = len(parser.completed_fields)
+        analysis = parser.feed(token)
+        if len(parser.completed_fields) > known:
+            return {'analysis': analysis, 'completed_fields': list(parser.completed_fields)}
+        return None
+    
+    return stream_ndjson(tokens, lambda text: {'analysis': ai_generator.parse_profile_analysis(text)}, progress)
+
 # ==========================================
 # API SCRAPING
 # ==========================================
@@ -516,6 +920,9 @@ def admin_system_health():
             'status': status,
             'timestamp': datetime.now().isoformat(),
             'checks': checks,
+            'ollama_backends': ai_generator.client.pool.get_state(),
+            'models': model_residency.get_state(),
+            'offer_summaries': offer_summarizer.get_stats(),
             'uptime': 'Runtime',
             'version': '1.0.0'
         }
@@ -640,6 +1047,24 @@ def generate_enhanced_content():
             'error': str(e)
         }), 500
 
+# ==========================================
+# API MÉTRIQUES
+# ==========================================
+
+@app.route('/api/metrics/generation')
+def generation_metrics():
+    """Percentiles de latence et débits (tokens/s) des dernières générations; ?since=N en secondes"""
+    try:
+        since = request.args.get('since', type=float)
+        return jsonify({
+            'success': True,
+            'metrics': ai_generator.metrics.get_summary(since_seconds=since),
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        logger.error(f"Erreur métriques génération: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # ==========================================
 # API STATUS GLOBALE
 # ==========================================
@@ -652,6 +1077,7 @@ def api_status():
         status = {
             'ollama_available': ai_generator.is_available(),
             'model': ai_generator.model,
+            'ollama_backends': ai_generator.client.pool.get_state(),
             'features': {
                 'message_generation': True,
                 'cover_letter_generation': True,
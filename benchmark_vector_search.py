@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# benchmark_vector_search.py - Rappel et débit de la recherche IVF face à la recherche exacte
+
+"""
+Construit un magasin de vecteurs sur des données synthétiques groupées
+(mélange de gaussiennes, proche de la structure d'embeddings de texte),
+entraîne l'IVF sur une partie des vecteurs, ajoute le reste de façon
+incrémentale puis mesure, pour plusieurs valeurs de nprobe, le rappel@k
+et le nombre de requêtes par seconde face à la recherche exacte.
+
+Usage:
+    python benchmark_vector_search.py
+    python benchmark_vector_search.py --rows 200000 --dim 768 --nprobe 4,8,16,32
+"""
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from models.vector_store import SegmentedVectorStore
+
+
+def synthetic_vectors(rng, centers: np.ndarray, count: int, noise: float) -> np.ndarray:
+    labels = rng.integers(len(centers), size=count)
+    return (centers[labels] + noise * rng.standard_normal((count, centers.shape[1]))).astype(np.float32)
+
+
+def run_queries(store: SegmentedVectorStore, queries: np.ndarray, k: int, nprobe: int):
+    """(identifiants trouvés par requête, requêtes par seconde)"""
+    started = time.perf_counter()
+    results = [[row_id for row_id, _ in store.search(query, k, nprobe=nprobe)] for query in queries]
+    return results, len(queries) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la recherche vectorielle IVF")
+    parser.add_argument('--rows', type=int, default=100000, help="Vecteurs indexés")
+    parser.add_argument('--dim', type=int, default=384, help="Dimension des vecteurs")
+    parser.add_argument('--clusters', type=int, default=500, help="Groupes du jeu synthétique")
+    parser.add_argument('--noise', type=float, default=1.5, help="Dispersion autour des groupes")
+    parser.add_argument('--queries', type=int, default=200, help="Requêtes mesurées")
+    parser.add_argument('--k', type=int, default=10, help="Voisins demandés (rappel@k)")
+    parser.add_argument('--nlist', type=int, default=0, help="Listes IVF (0: racine du nombre de vecteurs)")
+    parser.add_argument('--nprobe', default='1,2,4,8,16,32,64', help="Valeurs de nprobe à mesurer")
+    parser.add_argument('--train-fraction', type=float, default=0.8,
+                        help="Part des vecteurs présents à l'entraînement (le reste est ajouté ensuite)")
+    parser.add_argument('--segment-rows', type=int, default=65536, help="Lignes par segment")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((args.clusters, args.dim))
+    vectors = synthetic_vectors(rng, centers, args.rows, args.noise)
+    queries = synthetic_vectors(rng, centers, args.queries, args.noise)
+    initial = int(args.rows * args.train_fraction)
+
+    directory = tempfile.mkdtemp(prefix='vector-bench-')
+    try:
+        # ann_min_rows=0: pas d'entraînement automatique, piloté ici
+        store = SegmentedVectorStore(directory, segment_max_rows=args.segment_rows, ann_min_rows=0)
+
+        started = time.perf_counter()
+        for start in range(0, initial, 10000):
+            end = min(start + 10000, initial)
+            store.append(range(start, end), vectors[start:end])
+        print(f"📥 {initial} vecteurs ajoutés en {time.perf_counter() - started:.1f}s")
+
+        training = store.train(nlist=args.nlist or None, seed=args.seed)
+        print(f"🧭 IVF entraîné: {training['nlist']} listes en {training['seconds']}s")
+
+        started = time.perf_counter()
+        for start in range(initial, args.rows, 1000):
+            end = min(start + 1000, args.rows)
+            store.append(range(start, end), vectors[start:end])
+        print(f"➕ {args.rows - initial} vecteurs ajoutés après entraînement en "
+              f"{time.perf_counter() - started:.1f}s (rangés dans les listes existantes)")
+
+        nlist = training['nlist']
+        exact, exact_qps = run_queries(store, queries, args.k, nprobe=nlist)
+        print(f"\n{'nprobe':>8} {'rappel@' + str(args.k):>10} {'req/s':>10} {'accélération':>13}")
+        print(f"{'exact':>8} {1.0:>10.3f} {exact_qps:>10.1f} {1.0:>12.1f}x")
+
+        for nprobe in sorted({int(value) for value in args.nprobe.split(',') if value.strip()}):
+            if nprobe >= nlist:
+                continue
+            found, qps = run_queries(store, queries, args.k, nprobe=nprobe)
+            recall = np.mean([len(set(a) & set(b)) / max(len(b), 1) for a, b in zip(found, exact)])
+            print(f"{nprobe:>8} {recall:>10.3f} {qps:>10.1f} {qps / exact_qps:>12.1f}x")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,10 +7,105 @@ load_dotenv()
 class Config:
     # Configuration de base
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'linkedboost-dev-key'
-    OLLAMA_BASE_URL = os.environ.get('OLLAMA_BASE_URL') or 'http://localhost:11434'
+    # Une ou plusieurs instances Ollama séparées par des virgules (répartition de charge)
+    OLLAMA_BASE_URLS = [
+        url.strip().rstrip('/')
+        for url in (os.environ.get('OLLAMA_BASE_URL') or 'http://localhost:11434').split(',')
+        if url.strip()
+    ]
+    OLLAMA_BASE_URL = OLLAMA_BASE_URLS[0]
     OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL') or 'mistral:latest'
+    # Durée de résidence du modèle après une requête (format Ollama: "30m", "-1" = permanent)
+    OLLAMA_KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE') or '30m'
+    OLLAMA_EMBEDDING_MODEL = os.environ.get('OLLAMA_EMBEDDING_MODEL') or 'nomic-embed-text'
+    # Textes par requête /api/embed (embeddings des offres scrapées)
+    OLLAMA_EMBED_BATCH_SIZE = int(os.environ.get('OLLAMA_EMBED_BATCH_SIZE', 32))
+    # Vecteurs persistés en segments mappés en mémoire (partagés entre workers)
+    VECTOR_STORE_DIR = os.environ.get('VECTOR_STORE_DIR', 'data/vectors')
+    VECTOR_SEGMENT_MAX_ROWS = int(os.environ.get('VECTOR_SEGMENT_MAX_ROWS', 65536))
+    VECTOR_COMPACT_DEAD_RATIO = float(os.environ.get('VECTOR_COMPACT_DEAD_RATIO', 0.2))
+    # Recherche approchée IVF, sur activation: au-delà de VECTOR_ANN_MIN_ROWS vecteurs
+    # (0 = toujours exacte). nprobe: listes parcourues par requête, à monter pour le
+    # rappel, baisser pour la latence (mesure: benchmark_vector_search.py)
+    VECTOR_ANN_MIN_ROWS = int(os.environ.get('VECTOR_ANN_MIN_ROWS', 0))
+    VECTOR_ANN_NLIST = int(os.environ.get('VECTOR_ANN_NLIST', 0))  # 0: racine du nombre de vecteurs
+    VECTOR_ANN_NPROBE = int(os.environ.get('VECTOR_ANN_NPROBE', 32))
+    # Modèle des contenus courts (messages LinkedIn) et modèle de repli hors budget de latence
+    OLLAMA_MODEL_SHORT = os.environ.get('OLLAMA_MODEL_SHORT') or OLLAMA_MODEL
+    OLLAMA_FALLBACK_MODEL = os.environ.get('OLLAMA_FALLBACK_MODEL', '')
+    # Routage par type de contenu (surcharges JSON optionnelles, voir get_model_routes)
+    MODEL_ROUTES_FILE = os.environ.get('MODEL_ROUTES_FILE') or 'data/model_routes.json'
+    # Dépassements consécutifs du budget avant repli, et durée du repli (secondes)
+    MODEL_ROUTE_BREACH_THRESHOLD = int(os.environ.get('MODEL_ROUTE_BREACH_THRESHOLD', 3))
+    MODEL_ROUTE_FALLBACK_COOLDOWN = float(os.environ.get('MODEL_ROUTE_FALLBACK_COOLDOWN', 300))
+    # Préchargement des modèles au démarrage et vérification périodique de leur résidence
+    MODEL_WARMUP_ENABLED = os.environ.get('MODEL_WARMUP_ENABLED', 'True').lower() == 'true'
+    MODEL_WARMUP_INTERVAL = float(os.environ.get('MODEL_WARMUP_INTERVAL', 60))
     DEBUG = os.environ.get('FLASK_DEBUG', 'True').lower() == 'true'
     
+    # Client Ollama partagé (pool, timeouts par opération, retries, disjoncteur)
+    OLLAMA_POOL_SIZE = int(os.environ.get('OLLAMA_POOL_SIZE', 10))
+    OLLAMA_TIMEOUT_CONNECT = float(os.environ.get('OLLAMA_TIMEOUT_CONNECT', 3.0))
+    OLLAMA_TIMEOUT_PROBE = float(os.environ.get('OLLAMA_TIMEOUT_PROBE', 5))
+    OLLAMA_TIMEOUT_GENERATE = float(os.environ.get('OLLAMA_TIMEOUT_GENERATE', 60))
+    OLLAMA_TIMEOUT_EMBED = float(os.environ.get('OLLAMA_TIMEOUT_EMBED', 30))
+    OLLAMA_TIMEOUT_PULL = float(os.environ.get('OLLAMA_TIMEOUT_PULL', 600))
+    OLLAMA_MAX_RETRIES = int(os.environ.get('OLLAMA_MAX_RETRIES', 2))
+    OLLAMA_RETRY_BACKOFF = float(os.environ.get('OLLAMA_RETRY_BACKOFF', 0.5))
+    OLLAMA_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('OLLAMA_CIRCUIT_FAILURE_THRESHOLD', 5))
+    OLLAMA_CIRCUIT_RESET_TIMEOUT = float(os.environ.get('OLLAMA_CIRCUIT_RESET_TIMEOUT', 30))
+    # Slots de génération parallèles côté serveur (OLLAMA_NUM_PARALLEL d'Ollama)
+    OLLAMA_NUM_PARALLEL = int(os.environ.get('OLLAMA_NUM_PARALLEL', 4))
+    # Voies de priorité: slots réservés aux requêtes interactives, plafonds des
+    # lots et des tâches de fond (0 = tous les slots non réservés)
+    OLLAMA_PRIORITY_RESERVED_INTERACTIVE = int(os.environ.get('OLLAMA_PRIORITY_RESERVED_INTERACTIVE', 1))
+    OLLAMA_PRIORITY_BATCH_MAX_SLOTS = int(os.environ.get('OLLAMA_PRIORITY_BATCH_MAX_SLOTS', 0))
+    OLLAMA_PRIORITY_BACKGROUND_MAX_SLOTS = int(os.environ.get('OLLAMA_PRIORITY_BACKGROUND_MAX_SLOTS', 1))
+    
+    # Sortie JSON contrainte par schéma ("format") et réparation par le petit modèle
+    OLLAMA_STRUCTURED_OUTPUT = os.environ.get('OLLAMA_STRUCTURED_OUTPUT', 'True').lower() == 'true'
+    STRUCTURED_OUTPUT_LLM_REPAIR = os.environ.get('STRUCTURED_OUTPUT_LLM_REPAIR', 'True').lower() == 'true'
+    
+    # Variantes générées en parallèle ("variants": N): plafond et écart de température
+    GENERATION_MAX_VARIANTS = int(os.environ.get('GENERATION_MAX_VARIANTS', 5))
+    GENERATION_VARIANT_TEMPERATURE_STEP = float(os.environ.get('GENERATION_VARIANT_TEMPERATURE_STEP', 0.15))
+    
+    # Intervalle des sondes /api/tags quand plusieurs instances sont configurées
+    OLLAMA_HEALTH_CHECK_INTERVAL = float(os.environ.get('OLLAMA_HEALTH_CHECK_INTERVAL', 15))
+    
+    # Cache des générations (LRU mémoire + SQLite)
+    GENERATION_CACHE_ENABLED = os.environ.get('GENERATION_CACHE_ENABLED', 'True').lower() == 'true'
+    GENERATION_CACHE_DB = os.environ.get('GENERATION_CACHE_DB') or 'data/generation_cache.db'
+    GENERATION_CACHE_MEMORY_SIZE = int(os.environ.get('GENERATION_CACHE_MEMORY_SIZE', 256))
+    GENERATION_CACHE_TTL_HOURS = float(os.environ.get('GENERATION_CACHE_TTL_HOURS', 24))
+    GENERATION_CACHE_MAX_MB = float(os.environ.get('GENERATION_CACHE_MAX_MB', 50))
+    
+    # Cache du contexte RAG (insights entreprise/marché, invalidé à chaque insertion)
+    RAG_CONTEXT_CACHE_SIZE = int(os.environ.get('RAG_CONTEXT_CACHE_SIZE', 512))
+    
+    # Contexte sémantique des lettres enrichies: top-k offres similaires,
+    # exigences dédupliquées et tronquées sous un budget de tokens
+    RAG_CONTEXT_TOP_K = int(os.environ.get('RAG_CONTEXT_TOP_K', 5))
+    RAG_CONTEXT_TOKEN_BUDGET = int(os.environ.get('RAG_CONTEXT_TOKEN_BUDGET', 300))
+    RAG_SNIPPET_MAX_TOKENS = int(os.environ.get('RAG_SNIPPET_MAX_TOKENS', 80))
+    RAG_MIN_SIMILARITY = float(os.environ.get('RAG_MIN_SIMILARITY', 0.3))
+    
+    # Résumés des offres (missions, exigences, stack) utilisés à la place de la
+    # description complète; calculés en tâche de fond à l'insertion
+    OFFER_SUMMARY_ENABLED = os.environ.get('OFFER_SUMMARY_ENABLED', 'True').lower() == 'true'
+    OFFER_SUMMARY_MIN_CHARS = int(os.environ.get('OFFER_SUMMARY_MIN_CHARS', 800))
+    OFFER_SUMMARY_SWEEP_INTERVAL = float(os.environ.get('OFFER_SUMMARY_SWEEP_INTERVAL', 300))
+    # Offre en échec: nouvel essai après un délai doublé à chaque échec, abandon au-delà
+    OFFER_SUMMARY_MAX_ATTEMPTS = int(os.environ.get('OFFER_SUMMARY_MAX_ATTEMPTS', 5))
+    
+    # Génération en lot (lettres de motivation sur les offres de la base)
+    BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 50))
+    BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 4))
+    
+    # File de génération (mode "queued" des routes /api/generate/*)
+    JOB_QUEUE_WORKERS = int(os.environ.get('JOB_QUEUE_WORKERS', 4))
+    JOB_QUEUE_MAX_DEPTH = int(os.environ.get('JOB_QUEUE_MAX_DEPTH', 100))
+    
     # Configuration scraping Selenium
     SCRAPING_ENABLED = os.environ.get('SCRAPING_ENABLED', 'True').lower() == 'true'
     SCRAPING_INTERVAL_HOURS = int(os.environ.get('SCRAPING_INTERVAL_HOURS', 24))
@@ -177,4 +272,30 @@ class Config:
             }
         }
         
-        return configs.get(scraper_name, {})
\ No newline at end of file
+        return configs.get(scraper_name, {})
+    
+    @classmethod
+    def get_model_routes(cls) -> dict:
+        """Table de routage par défaut: modèle, échantillonnage et budget de latence par type de contenu"""
+        message = {'model': cls.OLLAMA_MODEL_SHORT, 'temperature': 0.8, 'stop': []}
+        email = {'model': cls.OLLAMA_MODEL, 'temperature': 0.7, 'num_predict': 400,
+                 'stop': [], 'latency_budget_ms': 8000}
+        
+        return {
+            'message_connection': {**message, 'num_predict': 120, 'latency_budget_ms': 1500},
+            'message_follow_up': {**message, 'num_predict': 200, 'latency_budget_ms': 2500},
+            'message_opportunity': {**message, 'num_predict': 250, 'latency_budget_ms': 3000},
+            'cover_letter': {'model': cls.OLLAMA_MODEL, 'temperature': 0.7, 'num_predict': 700,
+                             'stop': [], 'latency_budget_ms': 20000},
+            'email_introduction': dict(email),
+            'email_meeting_request': dict(email),
+            'email_follow_up': {**email, 'num_predict': 300, 'latency_budget_ms': 6000},
+            'profile_analysis': {'model': cls.OLLAMA_MODEL, 'temperature': 0.6, 'num_predict': 600,
+                                 'stop': [], 'latency_budget_ms': 20000},
+            # Tâche de fond: pas de budget de latence, échantillonnage quasi déterministe
+            'offer_summary': {'model': cls.OLLAMA_MODEL_SHORT, 'temperature': 0.2, 'num_predict': 250,
+                              'stop': [], 'latency_budget_ms': None},
+            # Remise en forme d'un JSON invalide: recopie déterministe, sans relire le profil
+            'profile_analysis_repair': {'model': cls.OLLAMA_MODEL_SHORT, 'temperature': 0.0, 'num_predict': 700,
+                                        'stop': [], 'latency_budget_ms': None}
+        }
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# migrate_embeddings.py - Conversion des embeddings JSON d'embeddings.db en float32 binaire
+
+"""
+Réécrit en place les vecteurs encore stockés en JSON (json.dumps(...).encode())
+au format binaire float32, avec leur dimension et leur modèle. Sans effet sur
+les lignes déjà converties: le script peut être relancé sans risque.
+
+Usage:
+    python migrate_embeddings.py
+    python migrate_embeddings.py --db data/embeddings.db --model nomic-embed-text --vacuum
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+
+from config import Config
+from models.embeddings_ollama import migrate_json_embeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migration des embeddings JSON vers le format float32")
+    parser.add_argument('--db', default='data/embeddings.db', help="Base SQLite à migrer")
+    parser.add_argument('--model', default=Config.OLLAMA_EMBEDDING_MODEL,
+                        help="Modèle ayant produit les vecteurs existants")
+    parser.add_argument('--batch-size', type=int, default=500, help="Lignes converties par transaction")
+    parser.add_argument('--vacuum', action='store_true', help="Récupère l'espace disque libéré (VACUUM)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ Base introuvable: {args.db}")
+        return 1
+
+    size_before = os.path.getsize(args.db)
+    print(f"🔄 Migration de {args.db} (modèle: {args.model})...")
+    stats = migrate_json_embeddings(args.db, args.model, args.batch_size)
+
+    if args.vacuum:
+        conn = sqlite3.connect(args.db)
+        conn.execute('VACUUM')
+        conn.close()
+
+    print(f"✅ {stats['migrated']} vecteurs convertis, {stats['skipped']} illisibles ignorés")
+    if stats['bytes_before']:
+        print(f"📦 Vecteurs: {stats['bytes_before'] / 1024:.1f} Ko → {stats['bytes_after'] / 1024:.1f} Ko "
+              f"(x{stats['compression']})")
+    print(f"💾 Fichier: {size_before / 1024:.1f} Ko → {os.path.getsize(args.db) / 1024:.1f} Ko")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,28 @@
 # models/ai_generator.py - Version corrigée
-import requests
 import json
-from typing import Dict, List, Optional
+import concurrent.futures
+import contextvars
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
 from config import Config
+from models.ollama_client import get_ollama_client
+from models.ollama_async import get_async_ollama_client
+from models.generation_cache import GenerationCache
+from models.context_packer import ContextPacker
+from models.model_router import ModelRouter
+from models.generation_metrics import GenerationMetrics
+from models.cancellation import GenerationCancelled
+from models.single_flight import last_call_coalesced
+from models.structured_output import (OUTPUT_SCHEMAS, PROFILE_ANALYSIS_SCHEMA, IncrementalJSONParser,
+                                      conform_to_schema, repair_json)
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Infos de la dernière génération du thread / de la tâche async courante
+_last_generation_info = contextvars.ContextVar('last_generation_info', default=None)
+
 # Import conditionnel de la base de connaissances
 try:
     from models.knowledge_base import KnowledgeBase
@@ -17,13 +33,156 @@ except ImportError as e:
     logger.warning(f"⚠️ RAG désactivé - Dépendances manquantes: {e}")
     logger.info("💡 Pour activer le RAG: vérifiez les dépendances dans requirements.txt")
 
+# Messages système stables par type de contenu: préfixe commun réutilisé
+# par le cache de prompt d'Ollama d'un appel à l'autre
+SYSTEM_PROMPTS = {
+    "message_connection": """Tu es un expert en networking LinkedIn. Tu génères des messages de demande de connexion professionnels et personnalisés.
+
+CONSIGNES:
+- Maximum 300 caractères (limite LinkedIn)
+- Ton professionnel mais chaleureux
+- Mentionner un élément personnel/commun
+- Appel à l'action clair
+- Éviter les formules toutes faites""",
+
+    "message_follow_up": """Tu es un expert en communication LinkedIn. Tu génères des messages de suivi après une connexion acceptée.
+
+CONSIGNES:
+- Remercier pour l'acceptation
+- Proposer une valeur/collaboration
+- Ton authentique et professionnel
+- Suggestion concrète de suite
+- Maximum 500 caractères""",
+
+    "message_opportunity": """Tu es un expert en prospection LinkedIn. Tu génères des messages pour présenter une opportunité professionnelle.
+
+CONSIGNES:
+- Présenter l'opportunité clairement
+- Expliquer pourquoi cette personne
+- Ton professionnel et engageant
+- Appel à l'action précis
+- Maximum 800 caractères""",
+
+    "cover_letter": """Tu es un expert en rédaction de lettres de motivation. Tu génères des lettres de motivation professionnelles et percutantes.
+
+STRUCTURE REQUISE:
+1. En-tête avec coordonnées (laisser des espaces pour personnalisation)
+2. Objet clair
+3. Introduction accrocheuse
+4. Paragraphe expérience/compétences alignées au poste
+5. Paragraphe motivation/connaissance entreprise
+6. Conclusion avec appel à l'action
+7. Formule de politesse
+
+CONSIGNES:
+- Maximum 400 mots
+- Personnalisation évidente pour l'entreprise
+- Mise en valeur des compétences pertinentes
+- Éviter les clichés
+- Structure claire et lisible""",
+
+    "email_introduction": """Tu es un expert en networking professionnel. Tu génères des emails d'introduction pour établir un premier contact.
+
+GÉNÈRE:
+1. OBJET (max 50 caractères, accrocheur)
+2. CORPS D'EMAIL (professionnel, concis, max 200 mots)
+
+FORMAT:
+OBJET: [votre objet]
+CORPS: [votre email]""",
+
+    "email_meeting_request": """Tu es un expert en communication professionnelle. Tu génères des emails pour demander un rendez-vous professionnel.
+
+GÉNÈRE:
+1. OBJET (clair et direct, max 60 caractères)
+2. CORPS D'EMAIL (structure professionnelle, max 250 mots)
+
+FORMAT:
+OBJET: [votre objet]
+CORPS: [votre email]""",
+
+    "email_follow_up": """Tu es un expert en suivi professionnel. Tu génères des emails de suivi après un événement ou une rencontre.
+
+GÉNÈRE:
+1. OBJET (référence à l'événement, max 55 caractères)
+2. CORPS D'EMAIL (rappel + proposition, max 200 mots)
+
+FORMAT:
+OBJET: [votre objet]
+CORPS: [votre email]""",
+
+    "profile_analysis": """Tu es un expert en optimisation de profils LinkedIn. Tu analyses des profils et fournis des recommandations détaillées.
+
+ANALYSE DEMANDÉE (format JSON):
+{
+    "score_global": "X/10",
+    "points_forts": ["point1", "point2", "point3"],
+    "points_amelioration": ["amélioration1", "amélioration2", "amélioration3"],
+    "titre_suggere": "nouveau titre professionnel",
+    "resume_optimise": "résumé amélioré (150 mots max)",
+    "mots_cles_manquants": ["mot1", "mot2", "mot3"],
+    "recommandations_urgentes": ["action1", "action2"]
+}
+
+Réponds uniquement avec l'objet JSON, sans texte autour.""",
+
+    "profile_analysis_repair": """Tu corriges des objets JSON mal formés. Tu recopies le contenu fourni dans un objet JSON valide avec les clés score_global, points_forts, points_amelioration, titre_suggere, resume_optimise, mots_cles_manquants et recommandations_urgentes.
+
+CONSIGNES:
+- Ne rien inventer: reprendre le texte existant
+- Une clé absente du texte reçoit une valeur vide""",
+
+    "offer_summary": """Tu es un assistant de recrutement. Tu résumes des offres d'emploi pour qu'elles servent de contexte à la rédaction de lettres de motivation.
+
+FORMAT:
+MISSIONS: [3 à 5 missions principales, séparées par des points-virgules]
+EXIGENCES: [expérience, diplômes et compétences demandées]
+STACK: [technologies et outils cités]
+
+CONSIGNES:
+- Maximum 120 mots
+- Uniquement les informations présentes dans l'offre
+- Pas de phrase d'introduction ni de conclusion"""
+}
+
+# Valeurs affichées quand un champ manque à l'analyse de profil
+PROFILE_ANALYSIS_DEFAULTS = {
+    "score_global": "En cours d'analyse",
+    "points_forts": ["Profil analysé"],
+    "points_amelioration": ["Analyse en cours"],
+    "titre_suggere": "À définir",
+    "resume_optimise": "",
+    "mots_cles_manquants": ["À identifier"],
+    "recommandations_urgentes": ["Revoir le format d'analyse"]
+}
+
 class LinkedBoostAI:
     """Générateur IA pour LinkedBoost avec support RAG optionnel"""
     
     def __init__(self):
         self.base_url = Config.OLLAMA_BASE_URL
         self.model = Config.OLLAMA_MODEL
-        self.timeout = 60
+        self.client = get_ollama_client()
+        self.async_client = get_async_ollama_client()
+        
+        # Modèle et échantillonnage par type de contenu, avec repli hors budget
+        self.router = ModelRouter()
+        
+        # Télémétrie des durées Ollama (percentiles glissants, tokens/s)
+        self.metrics = GenerationMetrics()
+        
+        # Ratio tokens/caractère observé par modèle sur les prompts évalués en
+        # entier, pour estimer la part du préfixe système réutilisée par Ollama
+        self._prompt_tokens_per_char = {}
+        self._ratio_lock = threading.Lock()
+        
+        # Cache des générations (désactivable globalement ou par requête)
+        self.cache = None
+        if Config.GENERATION_CACHE_ENABLED:
+            try:
+                self.cache = GenerationCache()
+            except Exception as e:
+                logger.warning(f"⚠️ Cache de génération désactivé: {e}")
         
         # Initialisation conditionnelle du RAG
         self.knowledge_base = None
@@ -43,41 +202,248 @@ class LinkedBoostAI:
     
     def is_available(self) -> bool:
         """Vérifie si Ollama est disponible"""
-        try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            return response.status_code == 200
-        except requests.RequestException:
-            return False
+        return self.client.is_available()
     
-    def _generate_content(self, prompt: str, temperature: float = 0.7) -> str:
-        """Génération de contenu avec Ollama"""
+    def _build_payload(self, route: Dict[str, any], prompt: str, stream: bool) -> Dict[str, any]:
+        """Construit la requête /api/chat commune aux modes bloquant et streaming"""
+        options = {
+            "temperature": route['temperature'],
+            "num_predict": route['num_predict'],
+            "top_p": 0.9,
+            "repeat_penalty": 1.1
+        }
+        if route['stop']:
+            options["stop"] = route['stop']
+        if route.get('seed') is not None:
+            options["seed"] = route['seed']
+        
         payload = {
-            "model": self.model,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "temperature": temperature,
-                "num_predict": 500,
-                "top_p": 0.9,
-                "repeat_penalty": 1.1
-            }
+            "model": route['model'],
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPTS[route['content_type']]},
+                {"role": "user", "content": prompt}
+            ],
+            "stream": stream,
+            "keep_alive": Config.OLLAMA_KEEP_ALIVE,
+            "options": options
         }
         
-        try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json=payload,
-                timeout=self.timeout
-            )
+        # Décodage contraint par le schéma: la réponse est un JSON valide dès le premier essai
+        schema = OUTPUT_SCHEMAS.get(route['content_type'])
+        if schema and Config.OLLAMA_STRUCTURED_OUTPUT:
+            payload["format"] = schema
+        return payload
+    
+    def _cache_lookup(self, payload: Dict[str, any], use_cache: bool):
+        """Retourne (clé, réponse en cache) - clé None si le cache est ignoré"""
+        if not (use_cache and self.cache):
+            return None, None
+        cache_key = GenerationCache.make_key(payload)
+        return cache_key, self.cache.get(cache_key)
+    
+    def _record_generation(self, route: Dict[str, any], prompt: str, result: Dict[str, any] = None,
+                           cached: bool = False, elapsed_ms: float = None,
+                           coalesced: bool = False) -> Dict[str, any]:
+        """Mémorise les infos de la génération, dont le temps d'évaluation de prompt économisé"""
+        info = {
+            'model': route['model'],
+            'content_type': route['content_type'],
+            'fallback': route['fallback'],
+            'endpoint': 'chat',
+            'cached': cached,
+            'coalesced': coalesced
+        }
+        if route.get('variant'):
+            info['variant'] = {'index': route['variant'], 'temperature': route['temperature'], 'seed': route['seed']}
+        
+        if elapsed_ms is not None:
+            # Budget jugé sur la durée mesurée par Ollama: l'attente d'un slot (voies de
+            # priorité) ou d'un appel identique en vol n'est pas imputée au modèle
+            model_ms = (result or {}).get('total_duration', 0) / 1e6 or elapsed_ms
+            info['duration_ms'] = round(elapsed_ms, 1)
+            info['model_duration_ms'] = round(model_ms, 1)
+            info['latency_budget_ms'] = route['latency_budget_ms']
+            # Un résultat fusionné est celui d'un appel amont déjà compté par son leader
+            if not coalesced:
+                self.router.record_latency(route, model_ms)
+        
+        if cached:
+            self.metrics.record_cache_hit()
+        
+        if result:
+            self.metrics.record(route['content_type'], route['model'], result,
+                                wall_ms=elapsed_ms, fallback=route['fallback'])
+            eval_ms = result.get('eval_duration', 0) / 1e6
+            prompt_chars = len(SYSTEM_PROMPTS[route['content_type']]) + len(prompt)
+            prompt_eval_count = result.get('prompt_eval_count', 0)
+            prompt_eval_ms = result.get('prompt_eval_duration', 0) / 1e6
             
-            if response.status_code == 200:
-                result = response.json()
-                return result.get('response', '').strip()
-            else:
-                raise Exception(f"Erreur Ollama: {response.status_code}")
-                
-        except requests.RequestException as e:
-            raise Exception(f"Erreur de connexion à Ollama: {str(e)}")
+            # Le ratio maximal correspond à une évaluation complète (sans préfixe en cache)
+            if prompt_eval_count and prompt_chars:
+                with self._ratio_lock:
+                    self._prompt_tokens_per_char[route['model']] = max(
+                        self._prompt_tokens_per_char.get(route['model'], 0.0), prompt_eval_count / prompt_chars
+                    )
+            
+            estimated_tokens = round(prompt_chars * self._prompt_tokens_per_char.get(route['model'], 0.0))
+            reused_tokens = max(0, estimated_tokens - prompt_eval_count)
+            ms_per_token = prompt_eval_ms / prompt_eval_count if prompt_eval_count else 0.0
+            
+            info.update({
+                'prompt_tokens_estimated': estimated_tokens,
+                'prompt_eval_count': prompt_eval_count,
+                'prompt_eval_ms': round(prompt_eval_ms, 1),
+                'prompt_tokens_reused': reused_tokens,
+                'prompt_eval_ms_saved': round(reused_tokens * ms_per_token, 1),
+                'eval_count': result.get('eval_count', 0),
+                'eval_ms': round(eval_ms, 1),
+                'load_ms': round(result.get('load_duration', 0) / 1e6, 1),
+                'tokens_per_second': round(result.get('eval_count', 0) / (eval_ms / 1000), 1) if eval_ms else None
+            })
+        
+        _last_generation_info.set(info)
+        return info
+    
+    def get_last_generation_info(self) -> Dict[str, any]:
+        """Infos de la dernière génération du contexte courant (thread ou tâche)"""
+        info = _last_generation_info.get()
+        return dict(info) if info else {}
+    
+    def _generate_content(self, content_type: str, prompt: str, use_cache: bool = True,
+                          with_info: bool = False):
+        """Génération de contenu avec Ollama (with_info: retourne (contenu, infos de génération))"""
+        route = self.router.route(content_type)
+        # Un job annulable est lu en streaming par le client, sans quitter la fusion ni le cache
+        payload = self._build_payload(route, prompt, stream=False)
+        
+        cache_key, cached = self._cache_lookup(payload, use_cache)
+        if cached is not None:
+            info = self._record_generation(route, prompt, cached=True)
+            return (cached, info) if with_info else cached
+        
+        started = time.monotonic()
+        try:
+            result = self.client.post_json('/api/chat', payload, operation='generate')
+        except GenerationCancelled as e:
+            self.metrics.record_cancellation(content_type, e.reason)
+            raise
+        content = result.get('message', {}).get('content', '').strip()
+        info = self._record_generation(route, prompt, result, elapsed_ms=(time.monotonic() - started) * 1000,
+                                       coalesced=last_call_coalesced())
+        
+        if cache_key:
+            self.cache.set(cache_key, content, model=route['model'])
+        return (content, info) if with_info else content
+    
+    @staticmethod
+    def _variant_route(route: Dict[str, any], variant: int) -> Dict[str, any]:
+        """Route de la variante N: températures alternées autour de la route, graine fixe.
+        
+        La variante 0 est la génération ordinaire (même clé de cache).
+        """
+        if not variant:
+            return route
+        step = Config.GENERATION_VARIANT_TEMPERATURE_STEP * ((variant + 1) // 2)
+        temperature = route['temperature'] + (step if variant % 2 else -step)
+        return {**route, 'variant': variant, 'seed': variant,
+                'temperature': round(min(1.5, max(0.1, temperature)), 2)}
+    
+    async def _agenerate_content(self, content_type: str, prompt: str, use_cache: bool = True,
+                                 variant: int = 0) -> str:
+        """Version non bloquante de _generate_content (client aiohttp partagé)"""
+        route = self._variant_route(self.router.route(content_type), variant)
+        payload = self._build_payload(route, prompt, stream=False)
+        
+        cache_key, cached = self._cache_lookup(payload, use_cache)
+        if cached is not None:
+            self._record_generation(route, prompt, cached=True)
+            return cached
+        
+        started = time.monotonic()
+        try:
+            result = await self.async_client.post_json('/api/chat', payload, operation='generate')
+        except GenerationCancelled as e:
+            self.metrics.record_cancellation(content_type, e.reason)
+            raise
+        content = result.get('message', {}).get('content', '').strip()
+        self._record_generation(route, prompt, result, elapsed_ms=(time.monotonic() - started) * 1000,
+                                coalesced=last_call_coalesced())
+        
+        if cache_key:
+            self.cache.set(cache_key, content, model=route['model'])
+        return content
+    
+    def _stream_content(self, content_type: str, prompt: str, use_cache: bool = True) -> Iterator[str]:
+        """Génération en streaming: renvoie les tokens Ollama dès leur arrivée"""
+        route = self.router.route(content_type)
+        payload = self._build_payload(route, prompt, stream=True)
+        
+        # Un hit de cache est renvoyé d'un bloc
+        cache_key, cached = self._cache_lookup(payload, use_cache)
+        if cached is not None:
+            self._record_generation(route, prompt, cached=True)
+            yield cached
+            return
+        
+        # stream_json ferme la connexion, y compris si le client abandonne
+        started = time.monotonic()
+        parts = []
+        finished = False
+        try:
+            for chunk in self.client.stream_json('/api/chat', payload, operation='generate'):
+                token = chunk.get('message', {}).get('content', '')
+                if token:
+                    parts.append(token)
+                    yield token
+                if chunk.get('done'):
+                    finished = True
+                    self._record_generation(route, prompt, chunk, elapsed_ms=(time.monotonic() - started) * 1000)
+        except GenerationCancelled as e:
+            self.metrics.record_cancellation(content_type, e.reason)
+            raise
+        except GeneratorExit:
+            # Fermeture par le consommateur (client HTTP parti): stream_json coupe la connexion
+            if not finished:
+                self.metrics.record_cancellation(content_type, 'client_disconnect')
+            raise
+        
+        # Mise en cache uniquement des générations menées à terme
+        if cache_key:
+            self.cache.set(cache_key, ''.join(parts).strip(), model=route['model'])
+    
+    async def _agenerate_variant(self, content_type: str, prompt: str, variant: int,
+                                 use_cache: bool) -> Dict[str, any]:
+        content = await self._agenerate_content(content_type, prompt, use_cache=use_cache, variant=variant)
+        return {'index': variant, 'content': content, 'generation': self.get_last_generation_info()}
+    
+    def _iter_variants(self, content_type: str, prompt: str, count: int,
+                       use_cache: bool = True) -> Iterator[Dict[str, any]]:
+        """Génère count variantes en parallèle et les renvoie dans l'ordre où elles se terminent.
+        
+        Toutes partagent le message système et le prompt: seuls la
+        température et la graine changent. Elles occupent chacune un slot
+        d'Ollama, si bien que N variantes coûtent à peu près la durée d'une
+        seule. Une variante en erreur est renvoyée avec un champ "error".
+        """
+        count = max(1, min(count, Config.GENERATION_MAX_VARIANTS))
+        futures = {
+            self.async_client.submit(self._agenerate_variant(content_type, prompt, index, use_cache)): index
+            for index in range(count)
+        }
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    yield future.result()
+                except GenerationCancelled:
+                    raise
+                except Exception as e:
+                    logger.error(f"Erreur variante {futures[future]} ({content_type}): {e}")
+                    yield {'index': futures[future], 'error': str(e)}
+        finally:
+            # Consommateur parti avant la fin: annule les variantes encore en cours
+            for future in futures:
+                if future.cancel():
+                    self.metrics.record_cancellation(content_type, 'client_disconnect')
     
     async def generate_linkedin_message_enhanced(self, message_type: str, recipient_name: str, 
                                                recipient_company: str = "", recipient_position: str = "",
@@ -118,7 +484,7 @@ class LinkedBoostAI:
                 logger.warning(f"Erreur enrichissement RAG: {e}")
         
         # Génération du message
-        message = self.generate_linkedin_message(
+        message = await self.agenerate_message(
             message_type, recipient_name, recipient_company, 
             recipient_position, enhanced_context, sender_name, **kwargs
         )
@@ -127,80 +493,109 @@ class LinkedBoostAI:
             'message': message,
             'rag_used': self.rag_enabled,
             'company_insights': company_insights,
-            'enhancement_applied': enhancement_applied
+            'enhancement_applied': enhancement_applied,
+            'generation': self.get_last_generation_info()
         }
     
     def generate_linkedin_message(self, message_type: str, recipient_name: str, 
                                 recipient_company: str = "", recipient_position: str = "",
                                 context: str = "", sender_name: str = "Utilisateur",
                                 common_connections: List[str] = None, 
-                                personalization_notes: str = "") -> str:
+                                personalization_notes: str = "", use_cache: bool = True) -> str:
         """Génère des messages LinkedIn personnalisés"""
+        content_type, prompt = self._build_linkedin_message_prompt(
+            message_type, recipient_name, recipient_company, recipient_position,
+            context, sender_name, common_connections, personalization_notes
+        )
+        return self._generate_content(content_type, prompt, use_cache=use_cache)
+    
+    async def agenerate_message(self, message_type: str, recipient_name: str, 
+                              recipient_company: str = "", recipient_position: str = "",
+                              context: str = "", sender_name: str = "Utilisateur",
+                              common_connections: List[str] = None, 
+                              personalization_notes: str = "", use_cache: bool = True) -> str:
+        """Version async de generate_linkedin_message"""
+        content_type, prompt = self._build_linkedin_message_prompt(
+            message_type, recipient_name, recipient_company, recipient_position,
+            context, sender_name, common_connections, personalization_notes
+        )
+        return await self._agenerate_content(content_type, prompt, use_cache=use_cache)
+    
+    def stream_linkedin_message(self, message_type: str, recipient_name: str, 
+                              recipient_company: str = "", recipient_position: str = "",
+                              context: str = "", sender_name: str = "Utilisateur",
+                              common_connections: List[str] = None, 
+                              personalization_notes: str = "", use_cache: bool = True) -> Iterator[str]:
+        """Variante streaming de generate_linkedin_message"""
+        content_type, prompt = self._build_linkedin_message_prompt(
+            message_type, recipient_name, recipient_company, recipient_position,
+            context, sender_name, common_connections, personalization_notes
+        )
+        return self._stream_content(content_type, prompt, use_cache=use_cache)
+    
+    def generate_linkedin_message_variants(self, count: int, message_type: str, recipient_name: str,
+                                         recipient_company: str = "", recipient_position: str = "",
+                                         context: str = "", sender_name: str = "Utilisateur",
+                                         common_connections: List[str] = None,
+                                         personalization_notes: str = "",
+                                         use_cache: bool = True) -> Iterator[Dict[str, any]]:
+        """count versions du même message, générées en parallèle (ordre de fin)"""
+        content_type, prompt = self._build_linkedin_message_prompt(
+            message_type, recipient_name, recipient_company, recipient_position,
+            context, sender_name, common_connections, personalization_notes
+        )
+        for variant in self._iter_variants(content_type, prompt, count, use_cache=use_cache):
+            if 'content' in variant:
+                variant['message'] = variant.pop('content')
+            yield variant
+    
+    def _build_linkedin_message_prompt(self, message_type: str, recipient_name: str,
+                                     recipient_company: str = "", recipient_position: str = "",
+                                     context: str = "", sender_name: str = "Utilisateur",
+                                     common_connections: List[str] = None,
+                                     personalization_notes: str = "") -> Tuple[str, str]:
+        """Construit (type de contenu, prompt utilisateur) d'un message LinkedIn"""
         
         if common_connections is None:
             common_connections = []
         
-        # Prompts spécialisés selon le type de message
+        # Partie variable selon le type de message
         prompts = {
-            "connection": """Tu es un expert en networking LinkedIn. Génère un message de demande de connexion professionnel et personnalisé.
-
-CONTEXTE:
+            "connection": """CONTEXTE:
 - Destinataire: {recipient_name} {position_info} {company_info}
 - Expéditeur: {sender_name}
 - Contexte: {context}
 - Connexions communes: {connections}
 - Notes personnalisées: {notes}
 
-CONSIGNES:
-- Maximum 300 caractères (limite LinkedIn)
-- Ton professionnel mais chaleureux
-- Mentionner un élément personnel/commun
-- Appel à l'action clair
-- Éviter les formules toutes faites
-
 GÉNÈRE LE MESSAGE:""",
 
-            "follow_up": """Tu es un expert en communication LinkedIn. Génère un message de suivi après une connexion acceptée.
-
-CONTEXTE:
+            "follow_up": """CONTEXTE:
 - Destinataire: {recipient_name} {position_info} {company_info}
 - Expéditeur: {sender_name}
 - Contexte de la connexion: {context}
 - Notes: {notes}
 
-CONSIGNES:
-- Remercier pour l'acceptation
-- Proposer une valeur/collaboration
-- Ton authentique et professionnel
-- Suggestion concrète de suite
-- Maximum 500 caractères
-
 GÉNÈRE LE MESSAGE:""",
 
-            "opportunity": """Tu es un expert en prospection LinkedIn. Génère un message pour présenter une opportunité professionnelle.
-
-CONTEXTE:
+            "opportunity": """CONTEXTE:
 - Destinataire: {recipient_name} {position_info} {company_info}
 - Expéditeur: {sender_name}
 - Opportunité: {context}
 - Personnalisation: {notes}
 
-CONSIGNES:
-- Présenter l'opportunité clairement
-- Expliquer pourquoi cette personne
-- Ton professionnel et engageant
-- Appel à l'action précis
-- Maximum 800 caractères
-
 GÉNÈRE LE MESSAGE:"""
         }
         
+        if message_type not in prompts:
+            message_type = "connection"
+        
         # Construction des informations contextuelles
         position_info = f"({recipient_position})" if recipient_position else ""
         company_info = f"chez {recipient_company}" if recipient_company else ""
         connections_str = ", ".join(common_connections) if common_connections else "Aucune"
         
-        prompt = prompts.get(message_type, prompts["connection"]).format(
+        prompt = prompts[message_type].format(
             recipient_name=recipient_name,
             position_info=position_info,
             company_info=company_info,
@@ -210,17 +605,24 @@ GÉNÈRE LE MESSAGE:"""
             notes=personalization_notes
         )
         
-        return self._generate_content(prompt, temperature=0.8)
+        return f"message_{message_type}", prompt
     
     async def generate_cover_letter_enhanced(self, job_title: str, company_name: str,
                                            job_description: str = "", applicant_name: str = "",
-                                           **kwargs) -> Dict[str, str]:
+                                           hash_id: str = None, **kwargs) -> Dict[str, str]:
         """Génération de lettre de motivation enrichie avec insights marché"""
         
+        # Offre de la base: son résumé remplace la description complète
+        job_description = self.resolve_job_description(hash_id, job_description)
+        
         # Variables par défaut
         market_context = ""
         company_insights = {}
         market_insights = {}
+        similar_context = {}
+        packer = ContextPacker(
+            tokens_per_char=self._prompt_tokens_per_char.get(self.router.route('cover_letter')['model'])
+        )
         
         # Enrichissement avec insights marché si RAG disponible
         if self.rag_enabled:
@@ -253,6 +655,18 @@ GÉNÈRE LE MESSAGE:"""
                 
                 if context_parts:
                     market_context = f"\n\nCONTEXTE MARCHÉ:\n{' | '.join(context_parts)}"
+                
+                # Exigences des offres les plus proches, bornées par le budget de tokens
+                similar_offers = await self.knowledge_base.find_similar_jobs(
+                    f"{job_title} {company_name} {job_description}",
+                    k=Config.RAG_CONTEXT_TOP_K,
+                    min_similarity=Config.RAG_MIN_SIMILARITY
+                )
+                if similar_offers:
+                    similar_context = packer.pack(similar_offers, exclude_title=job_title,
+                                                  exclude_company=company_name)
+                    if similar_context['snippets']:
+                        market_context += f"\n\nEXIGENCES D'OFFRES SIMILAIRES:\n{similar_context['text']}"
                     
             except Exception as e:
                 logger.warning(f"Erreur enrichissement lettre: {e}")
@@ -260,7 +674,7 @@ GÉNÈRE LE MESSAGE:"""
         # Génération avec contexte enrichi
         enhanced_description = f"{job_description}{market_context}"
         
-        cover_letter = self.generate_cover_letter(
+        cover_letter = await self.agenerate_cover_letter(
             job_title, company_name, enhanced_description, applicant_name, **kwargs
         )
         
@@ -269,16 +683,58 @@ GÉNÈRE LE MESSAGE:"""
             'market_data_used': {
                 'company_insights': company_insights,
                 'market_insights': market_insights,
+                'similar_offers': similar_context.get('snippets', []),
+                'context_tokens': {
+                    'token_budget': packer.token_budget,
+                    **{key: similar_context.get(key, 0)
+                       for key in ('tokens_used', 'candidates', 'duplicates_skipped',
+                                   'truncated', 'dropped_over_budget')}
+                },
+                'market_context_tokens': packer.estimate_tokens(market_context),
                 'market_context_added': bool(market_context),
                 'rag_enabled': self.rag_enabled
-            }
+            },
+            'generation': self.get_last_generation_info()
         }
     
     def generate_cover_letter(self, job_title: str, company_name: str,
                             job_description: str = "", applicant_name: str = "",
                             applicant_experience: str = "", applicant_skills: List[str] = None,
-                            tone: str = "professional") -> str:
+                            tone: str = "professional", use_cache: bool = True) -> str:
         """Génère des lettres de motivation personnalisées"""
+        content_type, prompt = self._build_cover_letter_prompt(
+            job_title, company_name, job_description, applicant_name,
+            applicant_experience, applicant_skills, tone
+        )
+        return self._generate_content(content_type, prompt, use_cache=use_cache)
+    
+    async def agenerate_cover_letter(self, job_title: str, company_name: str,
+                                   job_description: str = "", applicant_name: str = "",
+                                   applicant_experience: str = "", applicant_skills: List[str] = None,
+                                   tone: str = "professional", use_cache: bool = True) -> str:
+        """Version async de generate_cover_letter"""
+        content_type, prompt = self._build_cover_letter_prompt(
+            job_title, company_name, job_description, applicant_name,
+            applicant_experience, applicant_skills, tone
+        )
+        return await self._agenerate_content(content_type, prompt, use_cache=use_cache)
+    
+    def stream_cover_letter(self, job_title: str, company_name: str,
+                          job_description: str = "", applicant_name: str = "",
+                          applicant_experience: str = "", applicant_skills: List[str] = None,
+                          tone: str = "professional", use_cache: bool = True) -> Iterator[str]:
+        """Variante streaming de generate_cover_letter"""
+        content_type, prompt = self._build_cover_letter_prompt(
+            job_title, company_name, job_description, applicant_name,
+            applicant_experience, applicant_skills, tone
+        )
+        return self._stream_content(content_type, prompt, use_cache=use_cache)
+    
+    def _build_cover_letter_prompt(self, job_title: str, company_name: str,
+                                 job_description: str = "", applicant_name: str = "",
+                                 applicant_experience: str = "", applicant_skills: List[str] = None,
+                                 tone: str = "professional") -> Tuple[str, str]:
+        """Construit (type de contenu, prompt utilisateur) d'une lettre de motivation"""
         
         if applicant_skills is None:
             applicant_skills = []
@@ -292,9 +748,7 @@ GÉNÈRE LE MESSAGE:"""
         
         skills_str = ", ".join(applicant_skills) if applicant_skills else "Non spécifiées"
         
-        prompt = f"""Tu es un expert en rédaction de lettres de motivation. Génère une lettre de motivation professionnelle et percutante.
-
-INFORMATIONS:
+        prompt = f"""INFORMATIONS:
 - Poste visé: {job_title}
 - Entreprise: {company_name}
 - Description du poste: {job_description}
@@ -303,87 +757,94 @@ INFORMATIONS:
 - Compétences clés: {skills_str}
 - Style souhaité: {tone_prompts.get(tone, "Ton professionnel et formel")}
 
-STRUCTURE REQUISE:
-1. En-tête avec coordonnées (laisser des espaces pour personnalisation)
-2. Objet clair
-3. Introduction accrocheuse
-4. Paragraphe expérience/compétences alignées au poste
-5. Paragraphe motivation/connaissance entreprise
-6. Conclusion avec appel à l'action
-7. Formule de politesse
-
-CONSIGNES:
-- Maximum 400 mots
-- Personnalisation évidente pour l'entreprise
-- Mise en valeur des compétences pertinentes
-- Éviter les clichés
-- Structure claire et lisible
-
 GÉNÈRE LA LETTRE COMPLÈTE:"""
         
-        return self._generate_content(prompt, temperature=0.7)
+        return "cover_letter", prompt
     
     def generate_networking_email(self, email_type: str, recipient_name: str,
                                 recipient_company: str = "", subject_context: str = "",
                                 sender_name: str = "Utilisateur", meeting_purpose: str = "",
-                                background_info: str = "") -> Dict[str, str]:
+                                background_info: str = "", use_cache: bool = True) -> Dict[str, str]:
         """Génère des emails de networking avec objet et corps"""
+        content_type, prompt = self._build_networking_email_prompt(
+            email_type, recipient_name, recipient_company, subject_context,
+            sender_name, meeting_purpose, background_info
+        )
+        response = self._generate_content(content_type, prompt, use_cache=use_cache)
+        return self.parse_email_response(response)
+    
+    async def agenerate_email(self, email_type: str, recipient_name: str,
+                            recipient_company: str = "", subject_context: str = "",
+                            sender_name: str = "Utilisateur", meeting_purpose: str = "",
+                            background_info: str = "", use_cache: bool = True) -> Dict[str, str]:
+        """Version async de generate_networking_email"""
+        content_type, prompt = self._build_networking_email_prompt(
+            email_type, recipient_name, recipient_company, subject_context,
+            sender_name, meeting_purpose, background_info
+        )
+        response = await self._agenerate_content(content_type, prompt, use_cache=use_cache)
+        return self.parse_email_response(response)
+    
+    def stream_networking_email(self, email_type: str, recipient_name: str,
+                              recipient_company: str = "", subject_context: str = "",
+                              sender_name: str = "Utilisateur", meeting_purpose: str = "",
+                              background_info: str = "", use_cache: bool = True) -> Iterator[str]:
+        """Variante streaming de generate_networking_email (texte brut, à parser avec parse_email_response)"""
+        content_type, prompt = self._build_networking_email_prompt(
+            email_type, recipient_name, recipient_company, subject_context,
+            sender_name, meeting_purpose, background_info
+        )
+        return self._stream_content(content_type, prompt, use_cache=use_cache)
+    
+    def generate_networking_email_variants(self, count: int, email_type: str, recipient_name: str,
+                                         recipient_company: str = "", subject_context: str = "",
+                                         sender_name: str = "Utilisateur", meeting_purpose: str = "",
+                                         background_info: str = "",
+                                         use_cache: bool = True) -> Iterator[Dict[str, any]]:
+        """count versions du même email, générées en parallèle (ordre de fin)"""
+        content_type, prompt = self._build_networking_email_prompt(
+            email_type, recipient_name, recipient_company, subject_context,
+            sender_name, meeting_purpose, background_info
+        )
+        for variant in self._iter_variants(content_type, prompt, count, use_cache=use_cache):
+            if 'content' in variant:
+                variant['email'] = self.parse_email_response(variant.pop('content'))
+            yield variant
+    
+    def _build_networking_email_prompt(self, email_type: str, recipient_name: str,
+                                     recipient_company: str = "", subject_context: str = "",
+                                     sender_name: str = "Utilisateur", meeting_purpose: str = "",
+                                     background_info: str = "") -> Tuple[str, str]:
+        """Construit (type de contenu, prompt utilisateur) d'un email de networking"""
         
         email_prompts = {
-            "introduction": """Tu es un expert en networking professionnel. Génère un email d'introduction pour établir un premier contact.
-
-CONTEXTE:
+            "introduction": """CONTEXTE:
 - Destinataire: {recipient_name} {company_info}
 - Expéditeur: {sender_name}
 - Contexte: {subject_context}
-- Informations supplémentaires: {background}
-
-GÉNÈRE:
-1. OBJET (max 50 caractères, accrocheur)
-2. CORPS D'EMAIL (professionnel, concis, max 200 mots)
-
-FORMAT:
-OBJET: [votre objet]
-CORPS: [votre email]""",
-
-            "meeting_request": """Tu es un expert en communication professionnelle. Génère un email pour demander un rendez-vous professionnel.
+- Informations supplémentaires: {background}""",
 
-CONTEXTE:
+            "meeting_request": """CONTEXTE:
 - Destinataire: {recipient_name} {company_info}
 - Expéditeur: {sender_name}
 - Sujet de rencontre: {meeting_purpose}
 - Contexte: {subject_context}
-- Informations: {background}
-
-GÉNÈRE:
-1. OBJET (clair et direct, max 60 caractères)
-2. CORPS D'EMAIL (structure professionnelle, max 250 mots)
-
-FORMAT:
-OBJET: [votre objet]
-CORPS: [votre email]""",
+- Informations: {background}""",
 
-            "follow_up": """Tu es un expert en suivi professionnel. Génère un email de suivi après un événement ou une rencontre.
-
-CONTEXTE:
+            "follow_up": """CONTEXTE:
 - Destinataire: {recipient_name} {company_info}
 - Expéditeur: {sender_name}
 - Événement/Rencontre: {subject_context}
 - Suite souhaitée: {meeting_purpose}
-- Détails: {background}
-
-GÉNÈRE:
-1. OBJET (référence à l'événement, max 55 caractères)
-2. CORPS D'EMAIL (rappel + proposition, max 200 mots)
-
-FORMAT:
-OBJET: [votre objet]
-CORPS: [votre email]"""
+- Détails: {background}"""
         }
         
+        if email_type not in email_prompts:
+            email_type = "introduction"
+        
         company_info = f"chez {recipient_company}" if recipient_company else ""
         
-        prompt = email_prompts.get(email_type, email_prompts["introduction"]).format(
+        prompt = email_prompts[email_type].format(
             recipient_name=recipient_name,
             company_info=company_info,
             sender_name=sender_name,
@@ -392,7 +853,10 @@ CORPS: [votre email]"""
             background=background_info
         )
         
-        response = self._generate_content(prompt, temperature=0.7)
+        return f"email_{email_type}", prompt
+    
+    def parse_email_response(self, response: str) -> Dict[str, str]:
+        """Sépare l'objet et le corps d'un email généré"""
         
         # Parsing de la réponse pour séparer objet et corps
         lines = response.split('\n')
@@ -413,49 +877,127 @@ CORPS: [votre email]"""
         }
     
     def analyze_linkedin_profile(self, profile_text: str, target_role: str = "",
-                               industry: str = "") -> Dict[str, any]:
+                               industry: str = "", use_cache: bool = True) -> Dict[str, any]:
         """Analyse un profil LinkedIn et fournit des recommandations"""
+        content_type, prompt = self._build_profile_analysis_prompt(profile_text, target_role, industry)
+        response = self._generate_content(content_type, prompt, use_cache=use_cache)
+        return self.parse_profile_analysis(response)
+    
+    async def aanalyze_profile(self, profile_text: str, target_role: str = "",
+                             industry: str = "", use_cache: bool = True) -> Dict[str, any]:
+        """Version async de analyze_linkedin_profile"""
+        content_type, prompt = self._build_profile_analysis_prompt(profile_text, target_role, industry)
+        response = await self._agenerate_content(content_type, prompt, use_cache=use_cache)
         
-        prompt = f"""Tu es un expert en optimisation de profils LinkedIn. Analyse ce profil et fournis des recommandations détaillées.
-
-PROFIL À ANALYSER:
+        analysis = self._parse_structured(response)
+        if analysis is None and Config.STRUCTURED_OUTPUT_LLM_REPAIR:
+            try:
+                repaired = await self._agenerate_content('profile_analysis_repair', response)
+                analysis = self._parse_structured(repaired, status='repaired_llm')
+            except GenerationCancelled:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Réparation JSON par le modèle impossible: {e}")
+        return self._finalize_profile_analysis(analysis, response)
+    
+    def stream_profile_analysis(self, profile_text: str, target_role: str = "",
+                              industry: str = "", use_cache: bool = True) -> Iterator[str]:
+        """Variante streaming de analyze_linkedin_profile (texte brut, à parser avec parse_profile_analysis)"""
+        content_type, prompt = self._build_profile_analysis_prompt(profile_text, target_role, industry)
+        return self._stream_content(content_type, prompt, use_cache=use_cache)
+    
+    @staticmethod
+    def profile_analysis_parser() -> IncrementalJSONParser:
+        """Parseur incrémental des tokens de stream_profile_analysis (champs partiels)"""
+        return IncrementalJSONParser()
+    
+    def _build_profile_analysis_prompt(self, profile_text: str, target_role: str = "",
+                                     industry: str = "") -> Tuple[str, str]:
+        """Construit (message système, prompt utilisateur) de l'analyse de profil"""
+        
+        prompt = f"""PROFIL À ANALYSER:
 {profile_text}
 
 OBJECTIFS:
 - Poste visé: {target_role if target_role else "Non spécifié"}
 - Secteur: {industry if industry else "Non spécifié"}
 
-ANALYSE DEMANDÉE (format JSON):
-{{
-    "score_global": "X/10",
-    "points_forts": ["point1", "point2", "point3"],
-    "points_amelioration": ["amélioration1", "amélioration2", "amélioration3"],
-    "titre_suggere": "nouveau titre professionnel",
-    "resume_optimise": "résumé amélioré (150 mots max)",
-    "mots_cles_manquants": ["mot1", "mot2", "mot3"],
-    "recommandations_urgentes": ["action1", "action2"]
-}}
-
 GÉNÈRE L'ANALYSE JSON:"""
         
-        response = self._generate_content(prompt, temperature=0.6)
+        return "profile_analysis", prompt
+    
+    def summarize_job_offer(self, job_title: str, company_name: str, description: str) -> Tuple[str, str]:
+        """Résumé compact d'une offre (missions, exigences, stack) et modèle qui l'a produit"""
+        prompt = f"""OFFRE:
+- Poste: {job_title}
+- Entreprise: {company_name}
+- Description: {description}
+
+RÉSUMÉ:"""
+        summary, info = self._generate_content("offer_summary", prompt, with_info=True)
+        return summary.strip(), info['model']
+    
+    def resolve_job_description(self, hash_id: str = None, job_description: str = "") -> str:
+        """Résumé stocké de l'offre si disponible, sinon sa description (ou celle fournie)"""
+        if not (hash_id and self.knowledge_base):
+            return job_description
+        
+        offer = self.knowledge_base.get_jobs_by_hash_ids([hash_id]).get(hash_id)
+        if not offer:
+            return job_description
+        return offer.get('summary') or job_description or offer['description']
+    
+    def parse_profile_analysis(self, response: str) -> Dict[str, any]:
+        """Convertit la réponse du modèle en analyse structurée.
         
+        JSON invalide (génération tronquée, texte autour): réparation locale,
+        puis recopie par le petit modèle, bien moins chère qu'une nouvelle
+        analyse du profil. Les champs manquants reçoivent une valeur par défaut.
+        """
+        analysis = self._parse_structured(response)
+        if analysis is None and Config.STRUCTURED_OUTPUT_LLM_REPAIR:
+            try:
+                repaired = self._generate_content('profile_analysis_repair', response)
+                analysis = self._parse_structured(repaired, status='repaired_llm')
+            except GenerationCancelled:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Réparation JSON par le modèle impossible: {e}")
+        return self._finalize_profile_analysis(analysis, response)
+    
+    @staticmethod
+    def _parse_structured(response: str, status: str = 'valid') -> Optional[Dict[str, any]]:
+        """JSON tel quel, sinon réparé localement; None si rien d'exploitable"""
         try:
-            # Tentative de parsing JSON
             analysis = json.loads(response)
-            return analysis
-        except json.JSONDecodeError:
-            # Si le JSON est mal formé, retourner une analyse basique
-            return {
-                "score_global": "En cours d'analyse",
-                "points_forts": ["Profil analysé"],
-                "points_amelioration": ["Analyse en cours"],
-                "titre_suggere": "À définir",
-                "resume_optimise": response,
-                "mots_cles_manquants": ["À identifier"],
-                "recommandations_urgentes": ["Revoir le format d'analyse"],
-                "raw_response": response
-            }
+            if isinstance(analysis, dict):
+                return {**analysis, '_status': status}
+        except (json.JSONDecodeError, TypeError):
+            pass
+        
+        analysis = repair_json(response)
+        if not analysis:
+            return None
+        return {**analysis, '_status': status if status != 'valid' else 'repaired_local'}
+    
+    def _finalize_profile_analysis(self, analysis: Optional[Dict[str, any]], response: str) -> Dict[str, any]:
+        """Conformité au schéma, valeurs par défaut et comptage de l'issue du parsing"""
+        if analysis is None:
+            self.metrics.record_structured_output('profile_analysis', 'fallback')
+            # Aucun JSON récupérable: analyse basique avec la réponse brute
+            return {**PROFILE_ANALYSIS_DEFAULTS, "resume_optimise": response, "raw_response": response}
+        
+        status = analysis.pop('_status')
+        defaults = {**PROFILE_ANALYSIS_DEFAULTS, "resume_optimise": "Non disponible"}
+        analysis, missing = conform_to_schema(analysis, PROFILE_ANALYSIS_SCHEMA, defaults)
+        self.metrics.record_structured_output('profile_analysis', status)
+        
+        if status != 'valid':
+            analysis['repaired'] = status.replace('repaired_', '')
+        if missing:
+            analysis['missing_fields'] = missing
+            logger.info(f"🧩 Analyse de profil incomplète, champs par défaut: {', '.join(missing)}")
+        return analysis
     
     def get_system_status(self) -> Dict[str, any]:
         """Retourne le statut complet du système"""
@@ -463,6 +1005,11 @@ GÉNÈRE L'ANALYSE JSON:"""
             'ollama_available': self.is_available(),
             'model': self.model,
             'rag_enabled': self.rag_enabled,
+            'ollama_client': self.client.get_stats(),
+            'ollama_async_client': self.async_client.get_stats(),
+            'generation_cache': self.cache.get_stats() if self.cache else {'enabled': False},
+            'model_routing': self.router.get_stats(),
+            'generation_metrics': self.metrics.get_summary()['overall'],
             'capabilities': {
                 'basic_generation': True,
                 'enhanced_generation': self.rag_enabled,
@@ -475,6 +1022,7 @@ GÉNÈRE L'ANALYSE JSON:"""
                 'cover_letters': True,
                 'networking_emails': True,
                 'profile_analysis': True,
+                'streaming': True,
                 'enhanced_with_rag': self.rag_enabled
             }
         }
@@ -0,0 +1,215 @@
+# models/batch_generator.py - Génération de lettres de motivation en lot
+
+import asyncio
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config import Config
+from models.cancellation import CancellationToken, GenerationCancelled, cancellation_scope
+from models.knowledge_base import knowledge_base_for
+from models.priority_scheduler import BATCH, priority_lane
+
+logger = logging.getLogger(__name__)
+
+
+class BatchGenerationManager:
+    """Génère une lettre par offre de la base de connaissances, en parallèle borné"""
+
+    def __init__(self, ai_generator, knowledge_base=None, max_batches: int = 50):
+        self.ai_generator = ai_generator
+        self._knowledge_base = knowledge_base
+        self.max_batches = max_batches
+        self.batches = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def knowledge_base(self):
+        if self._knowledge_base is None:
+            self._knowledge_base = knowledge_base_for(self.ai_generator)
+        return self._knowledge_base
+
+    def create_batch(self, hash_ids: List[str], profile: Dict[str, Any],
+                     concurrency: int = None) -> Dict[str, Any]:
+        """Crée et lance un lot; retourne immédiatement son état initial"""
+        # Déduplication en conservant l'ordre
+        hash_ids = list(dict.fromkeys(h for h in hash_ids if h))
+
+        if not hash_ids:
+            raise ValueError("Aucun hash_id fourni")
+        if len(hash_ids) > Config.BATCH_MAX_ITEMS:
+            raise ValueError(f"Maximum {Config.BATCH_MAX_ITEMS} offres par lot")
+
+        # Valeur brute du JSON de la requête ("4", 4.0...): entier attendu
+        try:
+            concurrency = int(concurrency or Config.BATCH_CONCURRENCY)
+        except (TypeError, ValueError):
+            raise ValueError(f"concurrency doit être un entier (reçu: {concurrency!r})") from None
+        concurrency = max(1, min(concurrency, Config.BATCH_CONCURRENCY))
+        offers = self.knowledge_base.get_jobs_by_hash_ids(hash_ids)
+
+        batch_id = uuid.uuid4().hex
+        batch = {
+            'batch_id': batch_id,
+            'status': 'running',
+            'created_at': datetime.now().isoformat(),
+            'finished_at': None,
+            'concurrency': concurrency,
+            'total': len(hash_ids),
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'not_found': 0,
+            'sequence': 0,
+            'items': [],
+            '_token': CancellationToken()
+        }
+
+        for index, hash_id in enumerate(hash_ids):
+            offer = offers.get(hash_id)
+            item = {
+                'index': index,
+                'hash_id': hash_id,
+                'job_title': offer['title'] if offer else None,
+                'company_name': offer['company'] if offer else None,
+                'status': 'pending' if offer else 'not_found',
+                'cover_letter': None,
+                'error': None if offer else 'Offre introuvable',
+                'duration_seconds': None,
+                'sequence': None
+            }
+            batch['items'].append(item)
+
+        with self._lock:
+            for item in batch['items']:
+                if item['status'] == 'not_found':
+                    self._finish_item(batch, item, 'not_found')
+            self.batches[batch_id] = batch
+            self._prune()
+
+        self.ai_generator.async_client.submit(self._run_batch(batch, offers, profile))
+        logger.info(f"📦 Lot {batch_id[:8]} lancé: {len(hash_ids)} offres (concurrence {concurrency})")
+
+        return self.get_batch(batch_id)
+
+    async def _run_batch(self, batch: Dict[str, Any], offers: Dict[str, Dict[str, Any]],
+                         profile: Dict[str, Any]):
+        """Exécute les générations du lot avec un sémaphore local"""
+        semaphore = asyncio.Semaphore(batch['concurrency'])
+        token = batch['_token']
+
+        async def run_item(item):
+            async with semaphore:
+                offer = offers[item['hash_id']]
+                with self._lock:
+                    if token.cancelled:
+                        self._finish_item(batch, item, 'cancelled')
+                        return
+                    item['status'] = 'running'
+                started = time.monotonic()
+
+                try:
+                    cover_letter = await self.ai_generator.agenerate_cover_letter(
+                        job_title=offer['title'],
+                        company_name=offer['company'],
+                        # Résumé calculé à l'insertion, bien plus court que la description
+                        job_description=offer.get('summary') or offer['description'],
+                        applicant_name=profile.get('applicant_name', ''),
+                        applicant_experience=profile.get('applicant_experience', ''),
+                        applicant_skills=profile.get('applicant_skills', []),
+                        tone=profile.get('tone', 'professional'),
+                        use_cache=profile.get('use_cache', True)
+                    )
+                    with self._lock:
+                        item['cover_letter'] = cover_letter
+                        item['duration_seconds'] = round(time.monotonic() - started, 2)
+                        self._finish_item(batch, item, 'completed')
+
+                except GenerationCancelled:
+                    with self._lock:
+                        item['duration_seconds'] = round(time.monotonic() - started, 2)
+                        self._finish_item(batch, item, 'cancelled')
+
+                except Exception as e:
+                    logger.warning(f"Erreur génération lot {batch['batch_id'][:8]} ({item['hash_id']}): {e}")
+                    with self._lock:
+                        item['error'] = str(e)
+                        item['duration_seconds'] = round(time.monotonic() - started, 2)
+                        self._finish_item(batch, item, 'failed')
+
+        pending = [item for item in batch['items'] if item['status'] == 'pending']
+        # Les tâches du gather héritent du jeton (annuler le lot coupe les appels en
+        # cours) et de la voie "batch", qui laisse passer les requêtes interactives
+        with cancellation_scope(token), priority_lane(BATCH):
+            await asyncio.gather(*(run_item(item) for item in pending))
+
+        with self._lock:
+            batch['status'] = 'cancelled' if token.cancelled else 'completed'
+            batch['finished_at'] = datetime.now().isoformat()
+        logger.info(f"✅ Lot {batch['batch_id'][:8]} terminé: {batch['completed']}/{batch['total']} lettres")
+
+    def _finish_item(self, batch: Dict[str, Any], item: Dict[str, Any], status: str):
+        """Marque un élément terminé et lui attribue un numéro de séquence (sous verrou)"""
+        batch['sequence'] += 1
+        item['sequence'] = batch['sequence']
+        item['status'] = status
+        batch[status] += 1
+
+    def cancel_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Annule un lot: éléments en attente abandonnés, générations en cours interrompues"""
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return None
+        if batch['_token'].cancel('batch_cancelled'):
+            logger.info(f"🛑 Lot {batch_id[:8]} annulé")
+        return self.get_batch(batch_id)
+
+    def _prune(self):
+        """Oublie les lots terminés les plus anciens au-delà de max_batches (sous verrou)"""
+        while len(self.batches) > self.max_batches:
+            oldest_id = next((bid for bid, b in self.batches.items() if b['status'] != 'running'), None)
+            if oldest_id is None:
+                break
+            del self.batches[oldest_id]
+
+    def get_batch(self, batch_id: str, since: int = 0) -> Optional[Dict[str, Any]]:
+        """État du lot et résultats terminés après le curseur `since`"""
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return None
+
+            done = batch['completed'] + batch['failed'] + batch['cancelled'] + batch['not_found']
+            results = sorted(
+                (dict(item) for item in batch['items']
+                 if item['sequence'] is not None and item['sequence'] > since),
+                key=lambda item: item['sequence']
+            )
+
+            return {
+                'batch_id': batch_id,
+                'status': batch['status'],
+                'created_at': batch['created_at'],
+                'finished_at': batch['finished_at'],
+                'progress': {
+                    'total': batch['total'],
+                    'completed': batch['completed'],
+                    'failed': batch['failed'],
+                    'cancelled': batch['cancelled'],
+                    'not_found': batch['not_found'],
+                    'running': sum(1 for item in batch['items'] if item['status'] == 'running'),
+                    'pending': sum(1 for item in batch['items'] if item['status'] == 'pending'),
+                    'percentage': round(done / batch['total'] * 100, 1) if batch['total'] else 100.0
+                },
+                'items': [
+                    {k: item[k] for k in ('index', 'hash_id', 'job_title', 'company_name', 'status')}
+                    for item in batch['items']
+                ],
+                'results': results,
+                'next_cursor': batch['sequence']
+            }
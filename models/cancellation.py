@@ -0,0 +1,87 @@
+# models/cancellation.py - Annulation des générations en cours
+
+import contextvars
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationCancelled(Exception):
+    """La génération a été annulée (client déconnecté, job annulé)"""
+
+    def __init__(self, reason: str = 'cancelled'):
+        super().__init__(f"Génération annulée ({reason})")
+        self.reason = reason
+
+
+class CancellationToken:
+    """Signal d'annulation partagé entre le demandeur et l'appel Ollama en cours.
+
+    Les clients Ollama y abonnent la fermeture de leur connexion: annuler
+    coupe immédiatement le flux amont, ce qui libère le slot du serveur
+    au lieu de laisser la génération aller jusqu'à num_predict.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.reason = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = 'cancelled') -> bool:
+        """Annule et déclenche les callbacks; False si déjà annulé"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.debug(f"Callback d'annulation en erreur: {e}")
+        return True
+
+    def add_callback(self, callback: Callable[[], None]):
+        """Abonne un callback (appelé tout de suite si l'annulation a déjà eu lieu)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise GenerationCancelled(self.reason)
+
+
+# Jeton du thread / de la tâche async courante (None: génération non annulable)
+_current_token = contextvars.ContextVar('generation_cancellation_token', default=None)
+
+
+def current_cancellation() -> Optional[CancellationToken]:
+    return _current_token.get()
+
+
+@contextmanager
+def cancellation_scope(token: CancellationToken):
+    """Rend le jeton visible des appels Ollama exécutés dans le bloc"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
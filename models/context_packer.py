@@ -0,0 +1,109 @@
+# models/context_packer.py - Assemblage du contexte RAG sous budget de tokens
+
+import re
+from typing import Any, Dict, List
+
+from config import Config
+
+# Ratio par défaut pour du français (~3,5 caractères par token), remplacé
+# par le ratio observé sur le modèle quand il est connu
+DEFAULT_TOKENS_PER_CHAR = 0.3
+
+
+class ContextPacker:
+    """Transforme des offres similaires en extraits d'exigences bornés en tokens.
+
+    Les exigences déjà vues (même libellé normalisé) et les offres en
+    double (même titre et entreprise) sont écartées, chaque extrait est
+    tronqué à snippet_max_tokens et l'assemblage s'arrête au budget: la
+    taille du prompt ne dépend plus de la taille de la base.
+    """
+
+    # En dessous, un extrait tronqué au reliquat du budget n'apporte plus rien
+    MIN_SNIPPET_TOKENS = 15
+
+    def __init__(self, token_budget: int = None, snippet_max_tokens: int = None,
+                 tokens_per_char: float = None):
+        self.token_budget = token_budget if token_budget is not None else Config.RAG_CONTEXT_TOKEN_BUDGET
+        self.snippet_max_tokens = snippet_max_tokens or Config.RAG_SNIPPET_MAX_TOKENS
+        self.tokens_per_char = tokens_per_char or DEFAULT_TOKENS_PER_CHAR
+
+    def estimate_tokens(self, text: str) -> int:
+        return round(len(text) * self.tokens_per_char)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Coupe le texte à max_tokens estimés, sur une frontière de mot"""
+        max_chars = int(max_tokens / self.tokens_per_char)
+        if len(text) <= max_chars:
+            return text
+        cut = text[:max_chars - 1].rsplit(' ', 1)[0].rstrip(' ,;:')
+        return f"{cut}…"
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return ' '.join(re.sub(r'[^\w\s+#.]', ' ', str(text).lower()).split())
+
+    def pack(self, offers: List[Dict[str, Any]], exclude_title: str = '',
+             exclude_company: str = '') -> Dict[str, Any]:
+        """Sélectionne les extraits dans l'ordre de similarité jusqu'au budget.
+
+        L'offre visée (exclude_title/exclude_company), déjà décrite dans le
+        prompt, est écartée si elle figure parmi les résultats.
+        """
+        snippets = []
+        seen_items = set()
+        seen_offers = {(self._normalize(exclude_title), self._normalize(exclude_company))}
+        tokens_used = duplicates_skipped = truncated = dropped = 0
+
+        for offer in offers:
+            offer_key = (self._normalize(offer.get('title', '')), self._normalize(offer.get('company', '')))
+            if offer_key in seen_offers:
+                duplicates_skipped += 1
+                continue
+            seen_offers.add(offer_key)
+
+            # Exigences puis stack, sans répéter ce qu'un extrait précédent a déjà apporté
+            items = {}
+            for item in list(offer.get('requirements') or []) + list(offer.get('technologies') or []):
+                key = self._normalize(item)
+                if key and key not in seen_items and key not in items:
+                    items[key] = str(item).strip()
+
+            if not items:
+                duplicates_skipped += 1
+                continue
+
+            remaining = self.token_budget - tokens_used
+            if remaining < self.MIN_SNIPPET_TOKENS:
+                dropped += 1
+                continue
+
+            seen_items.update(items)
+            text = f"{offer.get('title', '')} ({offer.get('company', '')}): {', '.join(items.values())}"
+            limit = min(self.snippet_max_tokens, remaining)
+            packed_text = self.truncate(text, limit)
+            tokens = self.estimate_tokens(packed_text)
+            is_truncated = packed_text != text
+            truncated += is_truncated
+
+            tokens_used += tokens
+            snippets.append({
+                'hash_id': offer.get('hash_id'),
+                'title': offer.get('title'),
+                'company': offer.get('company'),
+                'similarity': offer.get('similarity'),
+                'text': packed_text,
+                'tokens': tokens,
+                'truncated': is_truncated
+            })
+
+        return {
+            'text': '\n'.join(f"- {snippet['text']}" for snippet in snippets),
+            'snippets': snippets,
+            'tokens_used': tokens_used,
+            'token_budget': self.token_budget,
+            'candidates': len(offers),
+            'duplicates_skipped': duplicates_skipped,
+            'truncated': truncated,
+            'dropped_over_budget': dropped
+        }
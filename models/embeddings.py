@@ -6,6 +6,8 @@ from typing import List, Dict, Any, Optional
 import sqlite3
 import json
 from config import Config
+from models.ollama_client import OllamaError, get_ollama_client
+from models.ollama_async import get_async_ollama_client
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +17,9 @@ class EmbeddingManager:
     def __init__(self):
         self.model = None
         self.method = "ollama"  # ou "simple" en fallback
+        # /api/embed par lot: None tant qu'inconnu, False sur un serveur Ollama trop ancien
+        self.batch_supported = None
+        self.batch_stats = {'batch_requests': 0, 'single_requests': 0, 'texts': 0}
         self.initialize()
     
     def initialize(self):
@@ -40,14 +45,11 @@ class EmbeddingManager:
     
     def initialize_ollama(self):
         """Initialise les embeddings avec Ollama"""
-        import requests
-        
         # Tester la connexion Ollama
-        response = requests.get(f"{Config.OLLAMA_BASE_URL}/api/tags", timeout=5)
-        if response.status_code != 200:
+        if not get_ollama_client().is_available():
             raise Exception("Ollama non disponible")
         
-        self.model = "nomic-embed-text"  # Modèle d'embedding d'Ollama
+        self.model = Config.OLLAMA_EMBEDDING_MODEL  # Modèle d'embedding d'Ollama
         logger.info("🤖 Embeddings Ollama configurés")
     
     def initialize_simple(self):
@@ -75,33 +77,70 @@ class EmbeddingManager:
     
     async def generate_ollama_embedding(self, text: str) -> List[float]:
         """Génère un embedding avec Ollama"""
-        import requests
-        
         try:
             clean_text = self.clean_text(text)
-            
-            payload = {
-                "model": self.model,
-                "prompt": clean_text
-            }
-            
-            response = requests.post(
-                f"{Config.OLLAMA_BASE_URL}/api/embeddings",
-                json=payload,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result.get('embedding', [])
-            else:
-                logger.error(f"Erreur embedding Ollama: {response.status_code}")
-                return []
+            # Client async: la boucle partagée (flux, lots, variantes) n'est pas bloquée
+            return await get_async_ollama_client().embeddings(self.model, clean_text)
                 
         except Exception as e:
             logger.error(f"Erreur embedding Ollama: {e}")
             return []
     
+    async def generate_embeddings(self, texts: List[str], batch_size: int = None) -> List[List[float]]:
+        """Embeddings d'une liste de textes, dans l'ordre (liste vide pour un texte en échec).
+        
+        Avec Ollama, les textes partent par lots de batch_size vers /api/embed:
+        200 offres scrapées font 7 requêtes au lieu de 200. Un serveur sans
+        /api/embed (404) bascule une fois pour toutes sur /api/embeddings.
+        """
+        if self.method == "simple":
+            return [self.generate_simple_embedding(text) for text in texts]
+        if self.method != "ollama":
+            return [[] for _ in texts]
+        
+        batch_size = max(1, batch_size or Config.OLLAMA_EMBED_BATCH_SIZE)
+        cleaned = [self.clean_text(text) for text in texts]
+        embeddings = [[] for _ in texts]
+        # Les textes vides ne sont pas envoyés
+        pending = [i for i, text in enumerate(cleaned) if text]
+        
+        for start in range(0, len(pending), batch_size):
+            indexes = pending[start:start + batch_size]
+            for i, embedding in zip(indexes, await self._embed_batch([cleaned[i] for i in indexes])):
+                embeddings[i] = embedding
+        
+        return embeddings
+    
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Un lot via /api/embed, ou texte par texte si l'endpoint manque"""
+        client = get_async_ollama_client()
+        self.batch_stats['texts'] += len(texts)
+        
+        if self.batch_supported is not False:
+            try:
+                self.batch_stats['batch_requests'] += 1
+                embeddings = await client.embed(self.model, texts)
+                self.batch_supported = True
+                return embeddings
+            except OllamaError as e:
+                # 404 sans message de modèle: endpoint absent (Ollama < 0.3.4)
+                if e.status_code == 404 and 'model' not in str(e).lower():
+                    self.batch_supported = False
+                    logger.warning("⚠️ /api/embed indisponible, repli sur /api/embeddings texte par texte")
+                else:
+                    logger.error(f"Erreur embeddings par lot ({len(texts)} textes): {e}")
+                    return [[] for _ in texts]
+        
+        embeddings = []
+        for text in texts:
+            self.batch_stats['single_requests'] += 1
+            try:
+                embeddings.append(await client.embeddings(self.model, text))
+            except Exception as e:
+                logger.error(f"Erreur embedding Ollama: {e}")
+                embeddings.append([])
+        return embeddings
+    
     def generate_simple_embedding(self, text: str) -> List[float]:
         """Génère un embedding simple basé sur TF-IDF"""
         try:
@@ -186,5 +225,7 @@ class EmbeddingManager:
             'method': self.method,
             'model': self.model,
             'available': self.method != "none",
-            'embedding_size': 50 if self.method == "simple" else 384
+            'embedding_size': 50 if self.method == "simple" else 384,
+            'batch_supported': self.batch_supported,
+            **self.batch_stats
         }
\ No newline at end of file
@@ -1,45 +1,109 @@
 # RAG avec Ollama pour les embeddings
 # models/embeddings_ollama.py
 
-import requests
 import json
 import numpy as np
 from typing import List, Dict, Any
 import sqlite3
 import logging
 from config import Config
+from models.ollama_client import get_ollama_client
+from models.ollama_async import get_async_ollama_client
+from models.vector_codec import decode_stored, encode_vector
+from models.vector_store import SegmentedVectorStore, store_directory, sync_from_sqlite
 
 logger = logging.getLogger(__name__)
 
+
+def ensure_vector_columns(conn: sqlite3.Connection):
+    """Migration du schéma: dimension et modèle de chaque vecteur (NULL = ancien blob JSON)"""
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA table_info(embeddings)')
+    columns = {row[1] for row in cursor.fetchall()}
+    if 'dim' not in columns:
+        cursor.execute('ALTER TABLE embeddings ADD COLUMN dim INTEGER')
+    if 'model' not in columns:
+        cursor.execute('ALTER TABLE embeddings ADD COLUMN model TEXT')
+    conn.commit()
+
+
+def migrate_json_embeddings(db_path: str, model: str, batch_size: int = 500) -> Dict[str, Any]:
+    """Convertit les blobs JSON d'embeddings.db en float32 binaire (idempotent).
+    
+    Les vecteurs existants n'indiquent pas leur modèle: `model` est celui
+    qui les a produits. Les lignes illisibles sont comptées et laissées telles quelles.
+    """
+    conn = sqlite3.connect(db_path)
+    ensure_vector_columns(conn)
+    cursor = conn.cursor()
+    stats = {'migrated': 0, 'skipped': 0, 'bytes_before': 0, 'bytes_after': 0}
+    
+    last_id = 0
+    while True:
+        cursor.execute('''
+            SELECT id, embedding FROM embeddings
+            WHERE dim IS NULL AND id > ? ORDER BY id LIMIT ?
+        ''', (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        
+        updates = []
+        for row_id, blob in rows:
+            last_id = row_id
+            try:
+                vector = decode_stored(blob, None)
+            except (ValueError, UnicodeDecodeError):
+                stats['skipped'] += 1
+                continue
+            encoded, dim = encode_vector(vector)
+            updates.append((encoded, dim, model, row_id))
+            stats['bytes_before'] += len(blob)
+            stats['bytes_after'] += len(encoded)
+        
+        cursor.executemany('UPDATE embeddings SET embedding = ?, dim = ?, model = ? WHERE id = ?', updates)
+        conn.commit()
+        stats['migrated'] += len(updates)
+    
+    conn.close()
+    stats['compression'] = round(stats['bytes_after'] / stats['bytes_before'], 3) if stats['bytes_before'] else None
+    return stats
+
 class OllamaEmbeddingManager:
     """Gestionnaire d'embeddings utilisant Ollama (sans Hugging Face)"""
     
     def __init__(self):
-        self.base_url = Config.OLLAMA_BASE_URL
-        self.embedding_model = "nomic-embed-text"  # Modèle d'embedding d'Ollama
+        self.client = get_ollama_client()
+        self.base_url = self.client.base_url
+        self.embedding_model = Config.OLLAMA_EMBEDDING_MODEL  # Modèle d'embedding d'Ollama
         self.db_path = "data/embeddings.db"
         self.initialize_db()
         
+        # Vecteurs normalisés en segments mappés, partagés par tous les workers
+        self.vector_store = SegmentedVectorStore(store_directory('embeddings', self.embedding_model))
+        
         # Vérifier si le modèle d'embedding est disponible
         self.ensure_embedding_model()
     
     def ensure_embedding_model(self):
         """S'assure que le modèle d'embedding est disponible"""
-        try:
-            # Tenter de télécharger le modèle d'embedding si pas présent
-            import subprocess
-            result = subprocess.run(['ollama', 'list'], capture_output=True, text=True)
-            
-            if "nomic-embed-text" not in result.stdout:
-                logger.info("📥 Téléchargement du modèle d'embedding...")
-                subprocess.run(['ollama', 'pull', 'nomic-embed-text'], check=True)
-                logger.info("✅ Modèle d'embedding installé")
-            else:
-                logger.info("✅ Modèle d'embedding disponible")
+        # Chaque instance du pool doit disposer du modèle
+        for backend in self.client.pool.backends:
+            try:
+                # Tenter de télécharger le modèle d'embedding si pas présent
+                installed = self.client.list_models(backend=backend)
                 
-        except Exception as e:
-            logger.warning(f"⚠️ Impossible d'installer le modèle d'embedding: {e}")
-            logger.info("💡 Utilisez: ollama pull nomic-embed-text")
+                if not any(name.split(':')[0] == self.embedding_model for name in installed):
+                    logger.info(f"📥 Téléchargement du modèle d'embedding sur {backend.url}...")
+                    self.client.post_json('/api/pull', {'name': self.embedding_model, 'stream': False},
+                                          operation='pull', backend=backend)
+                    logger.info("✅ Modèle d'embedding installé")
+                else:
+                    logger.info("✅ Modèle d'embedding disponible")
+                    
+            except Exception as e:
+                logger.warning(f"⚠️ Impossible d'installer le modèle d'embedding sur {backend.url}: {e}")
+                logger.info("💡 Utilisez: ollama pull nomic-embed-text")
     
     def initialize_db(self):
         """Initialise la base de données SQLite pour les embeddings"""
@@ -57,7 +121,9 @@ class OllamaEmbeddingManager:
                 content TEXT,
                 embedding BLOB,
                 metadata TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                dim INTEGER,
+                model TEXT
             )
         ''')
         
@@ -83,6 +149,9 @@ class OllamaEmbeddingManager:
         ''')
         
         conn.commit()
+        # Bases créées avant le format binaire: colonnes ajoutées, lignes JSON
+        # converties par migrate_embeddings.py (lues en attendant)
+        ensure_vector_columns(conn)
         conn.close()
         logger.info("✅ Base de données d'embeddings initialisée")
     
@@ -92,24 +161,8 @@ class OllamaEmbeddingManager:
             # Nettoyage du texte
             clean_text = self.clean_text(text)
             
-            # Requête à Ollama pour l'embedding
-            payload = {
-                "model": self.embedding_model,
-                "prompt": clean_text
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/api/embeddings",
-                json=payload,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result.get('embedding', [])
-            else:
-                logger.error(f"Erreur embedding Ollama: {response.status_code}")
-                return []
+            # Requête à Ollama pour l'embedding, sans bloquer la boucle async partagée
+            return await get_async_ollama_client().embeddings(self.embedding_model, clean_text)
                 
         except Exception as e:
             logger.error(f"Erreur génération embedding: {e}")
@@ -134,8 +187,10 @@ class OllamaEmbeddingManager:
         """Calcule la similarité cosinus entre deux embeddings"""
         try:
             # Conversion en numpy arrays
-            a = np.array(embedding1)
-            b = np.array(embedding2)
+            a = np.asarray(embedding1, dtype=np.float32)
+            b = np.asarray(embedding2, dtype=np.float32)
+            if a.shape != b.shape:
+                return 0.0
             
             # Similarité cosinus
             dot_product = np.dot(a, b)
@@ -175,8 +230,8 @@ class OllamaEmbeddingManager:
             cursor = conn.cursor()
             
             try:
-                # Stockage de l'embedding
-                embedding_blob = json.dumps(embedding).encode('utf-8')
+                # Stockage de l'embedding: float32 binaire (4 octets par composante)
+                embedding_blob, dim = encode_vector(embedding)
                 metadata = json.dumps({
                     'job_id': job_data.get('hash_id', ''),
                     'source': job_data.get('source', ''),
@@ -184,9 +239,9 @@ class OllamaEmbeddingManager:
                 })
                 
                 cursor.execute('''
-                    INSERT INTO embeddings (content_hash, content, embedding, metadata)
-                    VALUES (?, ?, ?, ?)
-                ''', (content_hash, full_text, embedding_blob, metadata))
+                    INSERT INTO embeddings (content_hash, content, embedding, metadata, dim, model)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (content_hash, full_text, embedding_blob, metadata, dim, self.embedding_model))
                 
                 # Stockage des données structurées
                 cursor.execute('''
@@ -212,6 +267,13 @@ class OllamaEmbeddingManager:
                 
                 conn.commit()
                 logger.debug(f"✅ Offre stockée: {job_data.get('title', 'Sans titre')}")
+                
+                # Rattrapage jusqu'à MAX(id): la ligne insérée et celles des autres
+                # workers deviennent visibles de tous les processus
+                try:
+                    self._sync_vector_store()
+                except Exception as e:  # rattrapé à la prochaine recherche
+                    logger.warning(f"⚠️ Indexation du vecteur différée: {e}")
                 return True
                 
             except sqlite3.IntegrityError:
@@ -224,6 +286,11 @@ class OllamaEmbeddingManager:
         finally:
             conn.close()
     
+    def _sync_vector_store(self) -> SegmentedVectorStore:
+        """Ajoute au magasin les lignes SQLite qu'il n'a pas encore (base existante, insertion interrompue)"""
+        return sync_from_sqlite(self.vector_store, self.db_path, 'embeddings', 'embedding, dim',
+                                'dim IS NULL OR model = ?', (self.embedding_model,), decode=decode_stored)
+    
     async def search_similar_jobs(self, query: str, limit: int = 10, 
                                 threshold: float = 0.7) -> List[Dict[str, Any]]:
         """Recherche des offres similaires par similarité sémantique"""
@@ -234,56 +301,48 @@ class OllamaEmbeddingManager:
             if not query_embedding:
                 return []
             
-            # Récupération de tous les embeddings stockés
+            # Un produit matrice-vecteur par segment mappé, puis lecture des seuls k résultats
+            hits = self._sync_vector_store().search(query_embedding, limit, threshold)
+            if not hits:
+                return []
+            
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
-            cursor.execute('''
-                SELECT e.content_hash, e.content, e.embedding, e.metadata,
+            cursor.execute(f'''
+                SELECT e.id, e.content_hash, e.content,
                        j.title, j.company, j.location, j.description,
                        j.technologies, j.experience_level, j.remote, j.url, j.source
                 FROM embeddings e
                 JOIN job_offers j ON e.content_hash = j.content_hash
-                ORDER BY j.scraped_at DESC
-            ''')
+                WHERE e.id IN ({','.join('?' * len(hits))})
+            ''', [row_id for row_id, _ in hits])
             
-            results = cursor.fetchall()
+            rows = {row[0]: row for row in cursor.fetchall()}
             conn.close()
             
-            # Calcul de similarité pour chaque résultat
             similar_jobs = []
-            
-            for row in results:
-                try:
-                    stored_embedding = json.loads(row[2].decode('utf-8'))
-                    similarity = self.calculate_similarity(query_embedding, stored_embedding)
-                    
-                    if similarity >= threshold:
-                        job_data = {
-                            'content_hash': row[0],
-                            'content': row[1],
-                            'similarity_score': similarity,
-                            'title': row[4],
-                            'company': row[5],
-                            'location': row[6],
-                            'description': row[7][:300] + "..." if len(row[7]) > 300 else row[7],
-                            'technologies': json.loads(row[8]) if row[8] else [],
-                            'experience_level': row[9],
-                            'remote': bool(row[10]),
-                            'url': row[11],
-                            'source': row[12]
-                        }
-                        similar_jobs.append(job_data)
-                        
-                except Exception as e:
-                    logger.debug(f"Erreur traitement résultat: {e}")
+            for row_id, similarity in hits:
+                row = rows.get(row_id)
+                if row is None:
                     continue
-            
-            # Tri par similarité décroissante
-            similar_jobs.sort(key=lambda x: x['similarity_score'], reverse=True)
+                similar_jobs.append({
+                    'content_hash': row[1],
+                    'content': row[2],
+                    'similarity_score': similarity,
+                    'title': row[3],
+                    'company': row[4],
+                    'location': row[5],
+                    'description': row[6][:300] + "..." if len(row[6]) > 300 else row[6],
+                    'technologies': json.loads(row[7]) if row[7] else [],
+                    'experience_level': row[8],
+                    'remote': bool(row[9]),
+                    'url': row[10],
+                    'source': row[11]
+                })
             
             logger.info(f"🔍 Trouvé {len(similar_jobs)} offres similaires pour '{query[:50]}...'")
-            return similar_jobs[:limit]
+            return similar_jobs
             
         except Exception as e:
             logger.error(f"Erreur recherche similarité: {e}")
@@ -343,7 +402,8 @@ class OllamaEmbeddingManager:
                 'sources': sources,
                 'last_update': last_update,
                 'embedding_model': self.embedding_model,
-                'database_path': self.db_path
+                'database_path': self.db_path,
+                'vector_store': self.vector_store.get_stats()
             }
             
         except Exception as e:
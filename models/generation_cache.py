@@ -0,0 +1,212 @@
+# models/generation_cache.py - Cache persistant des générations LLM
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationCache:
+    """Cache à deux niveaux (LRU mémoire + SQLite) adressé par le contenu de la requête"""
+
+    # Nombre d'écritures entre deux passes d'éviction SQLite
+    EVICTION_INTERVAL = 50
+
+    def __init__(self, db_path: str = None, memory_size: int = None,
+                 ttl_seconds: float = None, max_bytes: int = None):
+        self.db_path = db_path or Config.GENERATION_CACHE_DB
+        self.memory_size = memory_size if memory_size is not None else Config.GENERATION_CACHE_MEMORY_SIZE
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.GENERATION_CACHE_TTL_HOURS * 3600
+        self.max_bytes = max_bytes if max_bytes is not None else int(Config.GENERATION_CACHE_MAX_MB * 1024 * 1024)
+
+        self._memory = OrderedDict()  # clé -> (expires_at, réponse)
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0
+        }
+
+        self.initialize_db()
+
+    def initialize_db(self):
+        """Crée la table de cache si nécessaire"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS generation_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    model TEXT,
+                    response TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_generation_cache_access ON generation_cache (last_access)')
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        """Clé de contenu: modèle, prompt/messages et options d'échantillonnage"""
+        relevant = {k: v for k, v in payload.items() if k not in ('stream', 'keep_alive')}
+        canonical = json.dumps(relevant, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Retourne la réponse en cache ou None"""
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return entry[1]
+                del self._memory[key]
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                row = conn.execute(
+                    'SELECT response, expires_at FROM generation_cache WHERE cache_key = ?', (key,)
+                ).fetchone()
+                if row and row[1] > now:
+                    conn.execute('UPDATE generation_cache SET last_access = ? WHERE cache_key = ?', (now, key))
+                    conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Cache de génération illisible: {e}")
+            row = None
+
+        with self._lock:
+            if row and row[1] > now:
+                self._remember(key, row[1], row[0])
+                self.stats['disk_hits'] += 1
+                return row[0]
+
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, key: str, response: str, model: str = ''):
+        """Enregistre une réponse dans les deux niveaux"""
+        if not response:
+            return
+
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+
+        with self._lock:
+            self._remember(key, expires_at, response)
+            self.stats['writes'] += 1
+            self._writes_since_eviction += 1
+            run_eviction = self._writes_since_eviction >= self.EVICTION_INTERVAL
+            if run_eviction:
+                self._writes_since_eviction = 0
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                conn.execute('''
+                    INSERT OR REPLACE INTO generation_cache
+                    (cache_key, model, response, size_bytes, created_at, expires_at, last_access)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (key, model, response, len(response.encode('utf-8')), now, expires_at, now))
+                conn.commit()
+
+                if run_eviction:
+                    self._evict(conn, now)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Écriture cache de génération impossible: {e}")
+
+    def _remember(self, key: str, expires_at: float, response: str):
+        """Insertion dans le LRU mémoire (appelé sous verrou)"""
+        if self.memory_size <= 0:
+            return
+        self._memory[key] = (expires_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Supprime les entrées expirées puis les moins récemment lues au-delà de max_bytes"""
+        removed = conn.execute('DELETE FROM generation_cache WHERE expires_at <= ?', (now,)).rowcount
+
+        total = conn.execute('SELECT COALESCE(SUM(size_bytes), 0) FROM generation_cache').fetchone()[0]
+        if total > self.max_bytes:
+            excess = total - self.max_bytes
+            rows = conn.execute('SELECT cache_key, size_bytes FROM generation_cache ORDER BY last_access ASC')
+            victims = []
+            for cache_key, size_bytes in rows:
+                if excess <= 0:
+                    break
+                victims.append((cache_key,))
+                excess -= size_bytes
+            conn.executemany('DELETE FROM generation_cache WHERE cache_key = ?', victims)
+            removed += len(victims)
+
+        conn.commit()
+        if removed:
+            with self._lock:
+                self.stats['evictions'] += removed
+            logger.debug(f"🧹 Cache de génération: {removed} entrées évincées")
+
+    def clear(self):
+        """Vide les deux niveaux"""
+        with self._lock:
+            self._memory.clear()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('DELETE FROM generation_cache')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiques hit/miss et occupation"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self._memory)
+
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups * 100, 1) if lookups else 0.0
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                count, size = conn.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM generation_cache'
+                ).fetchone()
+            finally:
+                conn.close()
+            stats['disk_entries'] = count
+            stats['disk_size_bytes'] = size
+        except sqlite3.Error as e:
+            stats['error'] = str(e)
+
+        stats['ttl_seconds'] = self.ttl_seconds
+        stats['max_bytes'] = self.max_bytes
+        return stats
@@ -0,0 +1,132 @@
+# models/generation_metrics.py - Télémétrie des générations à partir des durées renvoyées par Ollama
+
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+
+class GenerationMetrics:
+    """Fenêtre glissante des derniers appels Ollama, agrégée à la demande.
+
+    Ollama renvoie ses durées en nanosecondes (load_duration,
+    prompt_eval_duration, eval_duration, total_duration); elles sont
+    conservées en millisecondes avec les compteurs de tokens, étiquetées
+    par type de contenu et modèle.
+    """
+
+    DURATION_FIELDS = ('total_duration', 'load_duration', 'prompt_eval_duration', 'eval_duration')
+
+    def __init__(self, window: int = 1000):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        # Générations interrompues avant leur fin, par motif et par type de contenu
+        self.cancellations = {'total': 0, 'by_reason': {}, 'by_content_type': {}}
+        # Issue du parsing des sorties JSON: valide, réparée (locale / modèle) ou repli
+        self.structured_output = {}
+
+    def record(self, content_type: str, model: str, result: Dict[str, Any],
+               wall_ms: float = None, fallback: bool = False):
+        """Enregistre les champs de timing d'une réponse Ollama (non streaming ou chunk final)"""
+        sample = {
+            'timestamp': time.time(),
+            'content_type': content_type,
+            'model': model,
+            'fallback': fallback,
+            'prompt_eval_count': result.get('prompt_eval_count', 0),
+            'eval_count': result.get('eval_count', 0),
+            'wall_ms': wall_ms
+        }
+        for field in self.DURATION_FIELDS:
+            sample[field.replace('_duration', '_ms')] = result.get(field, 0) / 1e6
+
+        with self._lock:
+            self.samples.append(sample)
+
+    def record_cache_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def record_cancellation(self, content_type: str, reason: str):
+        with self._lock:
+            self.cancellations['total'] += 1
+            for key, value in (('by_reason', reason), ('by_content_type', content_type)):
+                self.cancellations[key][value] = self.cancellations[key].get(value, 0) + 1
+
+    def record_structured_output(self, content_type: str, status: str):
+        with self._lock:
+            counts = self.structured_output.setdefault(content_type, {})
+            counts[status] = counts.get(status, 0) + 1
+
+    @staticmethod
+    def _percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+        if not values:
+            return None
+        ordered = sorted(values)
+
+        def pick(pct):
+            return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))], 1)
+
+        return {'p50': pick(50), 'p90': pick(90), 'p99': pick(99), 'max': round(ordered[-1], 1)}
+
+    @classmethod
+    def _aggregate(cls, samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Percentiles des durées et débits en tokens/s d'un ensemble d'appels"""
+        # Débit de génération: eval_count / eval_duration, par appel
+        eval_rates = [s['eval_count'] / (s['eval_ms'] / 1000) for s in samples if s['eval_ms'] > 0]
+        prompt_rates = [
+            s['prompt_eval_count'] / (s['prompt_eval_ms'] / 1000) for s in samples if s['prompt_eval_ms'] > 0
+        ]
+        eval_ms_total = sum(s['eval_ms'] for s in samples)
+
+        return {
+            'count': len(samples),
+            'cold_loads': sum(1 for s in samples if s['load_ms'] >= 1000),
+            'fallbacks': sum(1 for s in samples if s['fallback']),
+            'total_ms': cls._percentiles([s['total_ms'] for s in samples]),
+            'wall_ms': cls._percentiles([s['wall_ms'] for s in samples if s['wall_ms'] is not None]),
+            'load_ms': cls._percentiles([s['load_ms'] for s in samples]),
+            'prompt_eval_ms': cls._percentiles([s['prompt_eval_ms'] for s in samples]),
+            'eval_ms': cls._percentiles([s['eval_ms'] for s in samples]),
+            'prompt_tokens': cls._percentiles([s['prompt_eval_count'] for s in samples]),
+            'output_tokens': cls._percentiles([s['eval_count'] for s in samples]),
+            'tokens_per_second': cls._percentiles(eval_rates),
+            'prompt_tokens_per_second': cls._percentiles(prompt_rates),
+            # Débit agrégé: total des tokens générés / temps total de génération
+            'overall_tokens_per_second': round(
+                sum(s['eval_count'] for s in samples) / (eval_ms_total / 1000), 1
+            ) if eval_ms_total else None
+        }
+
+    def get_summary(self, since_seconds: float = None) -> Dict[str, Any]:
+        """Agrégats globaux, par type de contenu et par modèle"""
+        with self._lock:
+            samples = list(self.samples)
+            cache_hits = self.cache_hits
+            cancellations = {
+                'total': self.cancellations['total'],
+                'by_reason': dict(self.cancellations['by_reason']),
+                'by_content_type': dict(self.cancellations['by_content_type'])
+            }
+            structured_output = {key: dict(counts) for key, counts in self.structured_output.items()}
+
+        if since_seconds:
+            cutoff = time.time() - since_seconds
+            samples = [s for s in samples if s['timestamp'] >= cutoff]
+
+        by_content_type, by_model = {}, {}
+        for sample in samples:
+            by_content_type.setdefault(sample['content_type'], []).append(sample)
+            by_model.setdefault(sample['model'], []).append(sample)
+
+        return {
+            'window_size': self.samples.maxlen,
+            'since_seconds': since_seconds,
+            'cache_hits': cache_hits,
+            'cancellations': cancellations,
+            'structured_output': structured_output,
+            'overall': self._aggregate(samples),
+            'by_content_type': {key: self._aggregate(group) for key, group in by_content_type.items()},
+            'by_model': {key: self._aggregate(group) for key, group in by_model.items()}
+        }
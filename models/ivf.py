@@ -0,0 +1,66 @@
+# models/ivf.py - Partitionnement IVF (k-means sphérique) pour la recherche approchée
+
+from typing import Tuple
+
+import numpy as np
+
+from models.vector_codec import VECTOR_DTYPE
+
+LIST_DTYPE = np.dtype('<i4')
+
+
+def default_nlist(rows: int) -> int:
+    """Nombre de listes par défaut: racine du nombre de vecteurs (listes d'environ √n lignes)"""
+    return max(1, int(np.sqrt(rows)))
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    """Liste de chaque vecteur normalisé: centroïde de plus grand produit scalaire"""
+    assignments = np.empty(len(vectors), dtype=LIST_DTYPE)
+    for start in range(0, len(vectors), batch_size):
+        block = np.asarray(vectors[start:start + batch_size])
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """k-means sphérique sur un échantillon de vecteurs normalisés; centroïdes normalisés.
+
+    Une liste restée vide est réensemencée avec le vecteur le plus éloigné
+    de son centroïde, pour que toutes les listes servent.
+    """
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].astype(VECTOR_DTYPE)
+
+    for _ in range(iterations):
+        scores = np.empty(len(vectors), dtype=VECTOR_DTYPE)
+        assignments = np.empty(len(vectors), dtype=LIST_DTYPE)
+        for start in range(0, len(vectors), 8192):
+            block = vectors[start:start + 8192] @ centroids.T
+            assignments[start:start + len(block)] = np.argmax(block, axis=1)
+            scores[start:start + len(block)] = block[np.arange(len(block)), assignments[start:start + len(block)]]
+
+        # Somme des vecteurs de chaque liste en une passe (tri puis reduceat)
+        counts = np.bincount(assignments, minlength=nlist)
+        order = np.argsort(assignments, kind='stable')
+        filled = np.nonzero(counts)[0]
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        sums = np.zeros_like(centroids)
+        sums[filled] = np.add.reduceat(vectors[order], starts, axis=0)
+
+        empty = np.nonzero(counts == 0)[0]
+        if len(empty):
+            sums[empty] = vectors[np.argsort(scores)[:len(empty)]]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = (sums / np.where(norms == 0, 1.0, norms)).astype(VECTOR_DTYPE)
+
+    return centroids
+
+
+def inverted_lists(assignments: np.ndarray, nlist: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(lignes triées par liste, bornes): la liste l occupe order[offsets[l]:offsets[l + 1]]"""
+    assignments = np.asarray(assignments)
+    order = np.argsort(assignments, kind='stable').astype(LIST_DTYPE)
+    offsets = np.searchsorted(assignments[order], np.arange(nlist + 1))
+    return order, offsets
@@ -0,0 +1,214 @@
+# models/job_queue.py - File de jobs de génération avec pool de workers dédié
+
+import queue
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from config import Config
+from models.cancellation import CancellationToken, GenerationCancelled, cancellation_scope
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """La file de génération a atteint sa profondeur maximale"""
+
+
+class GenerationJobQueue:
+    """File FIFO de générations vidée par un pool de threads dédié.
+
+    Les routes Flask y déposent un job et rendent la main immédiatement:
+    seuls les workers de la file restent bloqués sur Ollama.
+    """
+
+    def __init__(self, num_workers: int = None, max_depth: int = None, max_jobs_kept: int = 500):
+        self.num_workers = num_workers or Config.JOB_QUEUE_WORKERS
+        self.max_depth = max_depth or Config.JOB_QUEUE_MAX_DEPTH
+        self.max_jobs_kept = max_jobs_kept
+
+        self._queue = queue.Queue()
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._workers = []
+
+        # Jobs en attente non annulés: la file interne garde les annulés jusqu'à leur tour
+        self.queued = 0
+        self.running = 0
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'rejected': 0}
+        self._wait_times = deque(maxlen=200)
+        self._run_times = deque(maxlen=200)
+
+    def _ensure_workers(self):
+        """Démarre paresseusement le pool de workers"""
+        if self._workers:
+            return
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f'generation-worker-{i + 1}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        logger.info(f"👷 File de génération: {self.num_workers} workers démarrés")
+
+    def submit(self, job_type: str, fn: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Ajoute un job; fn() s'exécutera dans un worker et retournera le résultat JSON"""
+        with self._lock:
+            self._ensure_workers()
+
+            if self.queued >= self.max_depth:
+                self.counters['rejected'] += 1
+                raise QueueFullError(f"File de génération pleine ({self.max_depth} jobs en attente)")
+
+            job_id = uuid.uuid4().hex
+            job = {
+                'job_id': job_id,
+                'type': job_type,
+                'status': 'queued',
+                'created_at': datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None,
+                'wait_seconds': None,
+                'run_seconds': None,
+                'result': None,
+                'error': None,
+                'cancel_requested': False,
+                '_enqueued': time.monotonic(),
+                '_token': CancellationToken()
+            }
+            self.jobs[job_id] = job
+            self.queued += 1
+            self.counters['submitted'] += 1
+            self._prune()
+
+        self._queue.put((job_id, fn))
+        return self.get_job(job_id)
+
+    def _worker_loop(self):
+        while True:
+            job_id, fn = self._queue.get()
+            with self._lock:
+                job = self.jobs.get(job_id)
+                # Oublié, ou annulé avant d'avoir démarré
+                if job is None or job['status'] != 'queued':
+                    continue
+                started = time.monotonic()
+                self.queued -= 1
+                job['status'] = 'running'
+                job['started_at'] = datetime.now().isoformat()
+                job['wait_seconds'] = round(started - job['_enqueued'], 3)
+                self._wait_times.append(job['wait_seconds'])
+                self.running += 1
+
+            try:
+                with cancellation_scope(job['_token']):
+                    result = fn()
+                status, error = 'completed', None
+            except GenerationCancelled as e:
+                logger.info(f"🛑 Job {job_id[:8]} ({job['type']}) annulé en cours d'exécution")
+                result, status, error = None, 'cancelled', str(e)
+            except Exception as e:
+                logger.error(f"Erreur job {job_id[:8]} ({job['type']}): {e}")
+                result, status, error = None, 'failed', str(e)
+
+            with self._done:
+                self.running -= 1
+                job['status'] = status
+                job['result'] = result
+                job['error'] = error
+                job['finished_at'] = datetime.now().isoformat()
+                job['run_seconds'] = round(time.monotonic() - started, 3)
+                self._run_times.append(job['run_seconds'])
+                self.counters[status] += 1
+                self._done.notify_all()
+
+    def cancel(self, job_id: str, reason: str = 'job_cancelled') -> Optional[Dict[str, Any]]:
+        """Annule un job: retiré de la file s'il attend, connexion Ollama coupée s'il tourne"""
+        with self._done:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+
+            if job['status'] in ('queued', 'running'):
+                job['cancel_requested'] = True
+
+            if job['status'] == 'queued':
+                self.queued -= 1
+                job['status'] = 'cancelled'
+                job['error'] = 'Annulé avant exécution'
+                job['finished_at'] = datetime.now().isoformat()
+                self.counters['cancelled'] += 1
+                self._done.notify_all()
+            elif job['status'] == 'running':
+                # Le worker passe le job en "cancelled" quand l'appel en cours s'interrompt
+                job['_token'].cancel(reason)
+            return self._snapshot(job)
+
+    def _prune(self):
+        """Oublie les jobs terminés les plus anciens (sous verrou)"""
+        while len(self.jobs) > self.max_jobs_kept:
+            oldest_id = next((jid for jid, j in self.jobs.items()
+                              if j['status'] in ('completed', 'failed', 'cancelled')), None)
+            if oldest_id is None:
+                break
+            del self.jobs[oldest_id]
+
+    def _snapshot(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        snapshot = {k: v for k, v in job.items() if not k.startswith('_')}
+        if job['status'] == 'queued':
+            snapshot['position'] = sum(
+                1 for j in self.jobs.values() if j['status'] == 'queued' and j['_enqueued'] <= job['_enqueued']
+            )
+        return snapshot
+
+    def get_job(self, job_id: str, wait: float = 0) -> Optional[Dict[str, Any]]:
+        """État d'un job; avec wait > 0, attend sa fin au plus `wait` secondes (long polling)"""
+        deadline = time.monotonic() + max(0.0, wait)
+        with self._done:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            while job['status'] in ('queued', 'running'):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._done.wait(remaining)
+            return self._snapshot(job)
+
+    @staticmethod
+    def _percentile(values, pct: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return round(ordered[index], 3)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Profondeur de file et temps d'attente, pour le dashboard admin"""
+        with self._lock:
+            now = time.monotonic()
+            queued = [j for j in self.jobs.values() if j['status'] == 'queued']
+            waits = list(self._wait_times)
+            runs = list(self._run_times)
+
+            return {
+                'workers': self.num_workers,
+                'workers_started': len(self._workers),
+                'depth': self.queued,
+                'max_depth': self.max_depth,
+                'running': self.running,
+                'oldest_wait_seconds': round(max((now - j['_enqueued'] for j in queued), default=0.0), 3),
+                'wait_seconds': {
+                    'avg': round(sum(waits) / len(waits), 3) if waits else 0.0,
+                    'p50': self._percentile(waits, 50),
+                    'p95': self._percentile(waits, 95)
+                },
+                'run_seconds': {
+                    'avg': round(sum(runs) / len(runs), 3) if runs else 0.0,
+                    'p95': self._percentile(runs, 95)
+                },
+                **self.counters
+            }
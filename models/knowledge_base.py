@@ -2,25 +2,49 @@
 
 import sqlite3
 import json
+import threading
+import time
+import numpy as np
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import logging
 from config import Config
+from models.rag_cache import get_rag_context_cache, normalize_company_name
+from models.vector_store import SegmentedVectorStore, store_directory, sync_from_sqlite
 
 logger = logging.getLogger(__name__)
 
+# Callbacks appelés avec le hash_id de chaque offre nouvellement insérée
+_job_stored_listeners = []
+
+# Instance commune aux services de fond quand le générateur n'a pas de RAG
+_fallback_knowledge_base = None
+_fallback_lock = threading.Lock()
+
+
+def add_job_stored_listener(callback):
+    """Abonne un callback aux insertions (toutes instances de KnowledgeBase du processus)"""
+    if callback not in _job_stored_listeners:
+        _job_stored_listeners.append(callback)
+
+
 class KnowledgeBase:
     """Base de connaissances - Version avec import corrigé"""
     
     def __init__(self):
         self.db_path = "data/knowledge_base.db"
         self.embedding_manager = None
+        self.vector_store = None
+        self.context_cache = get_rag_context_cache()
         
         # Initialisation conditionnelle des embeddings - CORRECTION
         try:
             from models.embeddings import EmbeddingManager  # Import local
             self.embedding_manager = EmbeddingManager()
             self.embeddings_enabled = self.embedding_manager.method != "none"
+            if self.embeddings_enabled:
+                self.vector_store = SegmentedVectorStore(
+                    store_directory('knowledge_base', self.embedding_manager.model))
             logger.info(f"🧠 Base de connaissances initialisée (embeddings: {self.embeddings_enabled})")
         except ImportError as e:
             self.embeddings_enabled = False
@@ -65,6 +89,43 @@ class KnowledgeBase:
                 )
             ''')
             
+            # Migration: embedding de l'offre (JSON), fourni par les scrapers
+            columns = {row[1] for row in cursor.execute('PRAGMA table_info(job_offers_main)')}
+            if 'embedding' not in columns:
+                cursor.execute('ALTER TABLE job_offers_main ADD COLUMN embedding TEXT')
+            
+            # Résumés des offres (missions, exigences, stack), calculés une seule fois
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS job_offer_summaries (
+                    hash_id TEXT PRIMARY KEY REFERENCES job_offers_main (hash_id),
+                    summary TEXT NOT NULL,
+                    model TEXT,  -- NULL: description assez courte, reprise telle quelle
+                    source_chars INTEGER,
+                    summary_chars INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Échecs de résumé: l'offre est écartée du balayage jusqu'à retry_at
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS job_offer_summary_failures (
+                    hash_id TEXT PRIMARY KEY REFERENCES job_offers_main (hash_id),
+                    attempts INTEGER NOT NULL,
+                    last_error TEXT,
+                    retry_at REAL NOT NULL  -- epoch
+                )
+            ''')
+            
+            # Compteur de version: incrémenté à chaque insertion, il invalide
+            # le cache du contexte RAG de tous les processus
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS kb_meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            ''')
+            cursor.execute("INSERT OR IGNORE INTO kb_meta (key, value) VALUES ('version', 0)")
+            
             conn.commit()
             conn.close()
             logger.info("✅ Tables de base de données créées")
@@ -96,8 +157,8 @@ class KnowledgeBase:
                 INSERT INTO job_offers_main (
                     hash_id, title, company, location, description,
                     requirements, technologies, salary_min, salary_max, salary_text,
-                    experience_level, remote, contract_type, url, source
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    experience_level, remote, contract_type, url, source, embedding
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 hash_id,
                 job_data.get('title', ''),
@@ -113,11 +174,25 @@ class KnowledgeBase:
                 job_data.get('remote', False),
                 job_data.get('contract_type', ''),
                 job_data.get('url', ''),
-                job_data.get('source', '')
+                job_data.get('source', ''),
+                json.dumps(job_data['embedding']) if job_data.get('embedding') else None
             ))
+            cursor.execute("UPDATE kb_meta SET value = value + 1 WHERE key = 'version'")
             
             conn.commit()
             conn.close()
+            
+            if self.vector_store is not None and job_data.get('embedding'):
+                try:
+                    self._sync_vector_store()
+                except Exception as e:  # rattrapé à la prochaine recherche
+                    logger.warning(f"⚠️ Indexation du vecteur différée: {e}")
+            
+            for callback in _job_stored_listeners:
+                try:
+                    callback(hash_id)
+                except Exception as e:
+                    logger.warning(f"⚠️ Notification d'insertion échouée: {e}")
             return True
             
         except Exception as e:
@@ -201,8 +276,87 @@ class KnowledgeBase:
             logger.error(f"Erreur recherche: {e}")
             return []
     
+    def _sync_vector_store(self) -> SegmentedVectorStore:
+        """Indexe les embeddings JSON des offres pas encore présentes dans le magasin de vecteurs"""
+        return sync_from_sqlite(self.vector_store, self.db_path, 'job_offers_main', 'embedding',
+                                'embedding IS NOT NULL')
+    
+    async def find_similar_jobs(self, query_text: str, k: int = 5,
+                                min_similarity: float = 0.0) -> List[Dict[str, Any]]:
+        """Top-k des offres stockées les plus proches du texte (similarité cosinus)"""
+        if not (self.vector_store is not None and query_text):
+            return []
+        
+        try:
+            query = np.asarray(await self.embedding_manager.generate_embedding(query_text), dtype=np.float32)
+            if not query.size or not np.any(query):
+                return []
+            
+            # Seuls les vecteurs de la dimension du magasin (même méthode d'embedding) sont
+            # comparables; marge de k pour les offres désactivées depuis leur indexation
+            hits = self._sync_vector_store().search(query, k * 2, min_similarity)
+            if not hits:
+                return []
+            
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            placeholders = ','.join('?' * len(hits))
+            cursor.execute(f'''
+                SELECT id, hash_id, title, company, requirements, technologies
+                FROM job_offers_main
+                WHERE id IN ({placeholders}) AND is_active = 1
+            ''', [row_id for row_id, _ in hits])
+            rows = {row[0]: row for row in cursor.fetchall()}
+            conn.close()
+            
+            results = []
+            for row_id, similarity in hits:
+                row = rows.get(row_id)
+                if row is None:
+                    continue
+                results.append({
+                    'hash_id': row[1],
+                    'title': row[2],
+                    'company': row[3],
+                    'requirements': json.loads(row[4]) if row[4] else [],
+                    'technologies': json.loads(row[5]) if row[5] else [],
+                    'similarity': round(similarity, 4)
+                })
+                if len(results) == k:
+                    break
+            return results
+            
+        except Exception as e:
+            logger.error(f"Erreur recherche offres similaires: {e}")
+            return []
+    
+    def get_version(self) -> int:
+        """Version courante de la base (nombre d'insertions)"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute("SELECT value FROM kb_meta WHERE key = 'version'").fetchone()
+            return row[0] if row else 0
+        finally:
+            conn.close()
+    
+    def _cached_insights(self, kind: str, key: str, compute) -> Dict[str, Any]:
+        """Passe par le cache du contexte RAG, ou calcule directement si la version est illisible"""
+        try:
+            version = self.get_version()
+        except Exception as e:
+            logger.warning(f"⚠️ Version de la base illisible, cache RAG ignoré: {e}")
+            return dict(compute(), cached=False)
+        return self.context_cache.get_or_compute(kind, key, version, compute)
+    
     async def get_market_insights(self) -> Dict[str, Any]:
-        """Génère des insights du marché basés sur les données collectées"""
+        """Insights du marché basés sur les données collectées.
+
+        last_updated est la date du calcul; cached=True indique un résultat
+        servi par le cache, la base n'ayant pas changé depuis ce calcul.
+        """
+        return self._cached_insights('market', '', self._compute_market_insights)
+    
+    def _compute_market_insights(self) -> Dict[str, Any]:
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
@@ -274,13 +428,21 @@ class KnowledgeBase:
     
     def get_company_insights(self, company_name: str) -> Dict[str, Any]:
         """Insights spécifiques à une entreprise"""
+        normalized_name = normalize_company_name(company_name)
+        insights = self._cached_insights(
+            'company', normalized_name,
+            lambda: self._compute_company_insights(company_name, normalized_name)
+        )
+        # L'entrée est partagée entre graphies ("Acme", "ACME "): on rend celle demandée
+        if 'company' in insights:
+            insights['company'] = company_name
+        return insights
+    
+    def _compute_company_insights(self, company_name: str, normalized_name: str) -> Dict[str, Any]:
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
-            # Normalisation du nom d'entreprise
-            normalized_name = company_name.lower().strip()
-            
             # Offres de cette entreprise
             cursor.execute('''
                 SELECT title, location, experience_level, remote, technologies, scraped_at
@@ -328,6 +490,115 @@ class KnowledgeBase:
             logger.error(f"Erreur insights entreprise: {e}")
             return {'error': str(e)}
     
+    def get_jobs_by_hash_ids(self, hash_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Récupère les offres complètes (description non tronquée) par hash_id"""
+        if not hash_ids:
+            return {}
+        
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            
+            placeholders = ','.join('?' * len(hash_ids))
+            cursor.execute(f'''
+                SELECT j.hash_id, j.title, j.company, j.location, j.description, j.requirements,
+                       j.technologies, j.experience_level, j.remote, j.contract_type, j.url, j.source,
+                       s.summary
+                FROM job_offers_main j
+                LEFT JOIN job_offer_summaries s ON s.hash_id = j.hash_id
+                WHERE j.hash_id IN ({placeholders})
+            ''', list(hash_ids))
+            rows = cursor.fetchall()
+            conn.close()
+            
+            jobs = {}
+            for row in rows:
+                jobs[row[0]] = {
+                    'hash_id': row[0],
+                    'title': row[1],
+                    'company': row[2],
+                    'location': row[3],
+                    'description': row[4] or '',
+                    'requirements': json.loads(row[5]) if row[5] else [],
+                    'technologies': json.loads(row[6]) if row[6] else [],
+                    'experience_level': row[7],
+                    'remote': bool(row[8]),
+                    'contract_type': row[9],
+                    'url': row[10],
+                    'source': row[11],
+                    'summary': row[12]
+                }
+            return jobs
+            
+        except Exception as e:
+            logger.error(f"Erreur récupération offres: {e}")
+            return {}
+    
+    def get_hash_ids_without_summary(self, limit: int = 50, max_attempts: int = None) -> List[str]:
+        """Offres actives encore sans résumé, les plus récentes d'abord.
+        
+        Les offres en échec n'y reviennent qu'après leur délai d'attente, et
+        plus du tout après max_attempts échecs.
+        """
+        max_attempts = max_attempts or Config.OFFER_SUMMARY_MAX_ATTEMPTS
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT j.hash_id
+                FROM job_offers_main j
+                LEFT JOIN job_offer_summaries s ON s.hash_id = j.hash_id
+                LEFT JOIN job_offer_summary_failures f ON f.hash_id = j.hash_id
+                WHERE s.hash_id IS NULL AND j.is_active = 1
+                  AND (f.hash_id IS NULL OR (f.retry_at <= ? AND f.attempts < ?))
+                ORDER BY j.scraped_at DESC
+                LIMIT ?
+            ''', (time.time(), max_attempts, limit))
+            hash_ids = [row[0] for row in cursor.fetchall()]
+            conn.close()
+            return hash_ids
+            
+        except Exception as e:
+            logger.error(f"Erreur recherche offres sans résumé: {e}")
+            return []
+    
+    def store_summary(self, hash_id: str, summary: str, model: Optional[str], source_chars: int) -> bool:
+        """Enregistre (ou remplace) le résumé d'une offre"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute('''
+                INSERT OR REPLACE INTO job_offer_summaries
+                    (hash_id, summary, model, source_chars, summary_chars)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (hash_id, summary, model, source_chars, len(summary)))
+            conn.execute('DELETE FROM job_offer_summary_failures WHERE hash_id = ?', (hash_id,))
+            conn.commit()
+            conn.close()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Erreur stockage résumé: {e}")
+            return False
+    
+    def record_summary_failure(self, hash_id: str, error: str, base_delay: float) -> int:
+        """Compte un échec de résumé; le prochain essai attend base_delay, doublé à chaque échec.
+        
+        Retourne le nombre d'échecs de l'offre.
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute('SELECT attempts FROM job_offer_summary_failures WHERE hash_id = ?',
+                               (hash_id,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            conn.execute('''
+                INSERT OR REPLACE INTO job_offer_summary_failures (hash_id, attempts, last_error, retry_at)
+                VALUES (?, ?, ?, ?)
+            ''', (hash_id, attempts, error[:500], time.time() + base_delay * 2 ** (attempts - 1)))
+            conn.commit()
+            return attempts
+        finally:
+            conn.close()
+    
     def get_stats(self) -> Dict[str, Any]:
         """Retourne les statistiques de la base de connaissances"""
         try:
@@ -350,6 +621,12 @@ class KnowledgeBase:
             cursor.execute('SELECT MAX(scraped_at) FROM job_offers_main')
             last_scrape = cursor.fetchone()[0]
             
+            cursor.execute('SELECT COUNT(*) FROM job_offers_main WHERE embedding IS NOT NULL')
+            embedded_jobs = cursor.fetchone()[0]
+            
+            cursor.execute('SELECT COUNT(*), SUM(source_chars), SUM(summary_chars) FROM job_offer_summaries')
+            summarized_jobs, source_chars, summary_chars = cursor.fetchone()
+            
             conn.close()
             
             return {
@@ -358,7 +635,12 @@ class KnowledgeBase:
                 'sources': sources,
                 'last_scrape': last_scrape,
                 'embeddings_enabled': self.embeddings_enabled,
-                'database_path': self.db_path
+                'embedded_jobs': embedded_jobs,
+                'summarized_jobs': summarized_jobs,
+                'summary_compression': round(summary_chars / source_chars, 3) if source_chars else None,
+                'database_path': self.db_path,
+                'version': self.get_version(),
+                'context_cache': self.context_cache.get_stats()
             }
             
         except Exception as e:
@@ -370,4 +652,15 @@ class KnowledgeBase:
         import hashlib
         
         unique_string = f"{job_data.get('title', '')}{job_data.get('company', '')}{job_data.get('url', '')}"
-        return hashlib.md5(unique_string.encode()).hexdigest()
\ No newline at end of file
+        return hashlib.md5(unique_string.encode()).hexdigest()
+
+
+def knowledge_base_for(ai_generator) -> KnowledgeBase:
+    """Base de connaissances du générateur, ou instance partagée si le RAG est désactivé"""
+    global _fallback_knowledge_base
+    if ai_generator.knowledge_base is not None:
+        return ai_generator.knowledge_base
+    with _fallback_lock:
+        if _fallback_knowledge_base is None:
+            _fallback_knowledge_base = KnowledgeBase()
+        return _fallback_knowledge_base
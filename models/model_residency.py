@@ -0,0 +1,180 @@
+# models/model_residency.py - Préchargement et maintien en mémoire des modèles Ollama
+
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config import Config
+from models.ollama_client import OllamaBackend, OllamaClient, get_ollama_client
+from models.priority_scheduler import BACKGROUND, priority_lane
+
+logger = logging.getLogger(__name__)
+
+
+class ModelResidencyManager:
+    """Garde les modèles de génération et d'embedding chargés sur chaque instance.
+
+    Un thread de fond interroge /api/ps: un modèle absent (redémarrage
+    d'Ollama, éviction, keep_alive expiré) ou proche de l'expiration est
+    rechargé avant qu'une requête utilisateur n'en paie le chargement.
+    """
+
+    def __init__(self, client: OllamaClient = None, generation_models: List[str] = None,
+                 embedding_model: str = None, interval: float = None):
+        self.client = client or get_ollama_client()
+        self.generation_models = generation_models or [Config.OLLAMA_MODEL]
+        self.embedding_model = embedding_model or Config.OLLAMA_EMBEDDING_MODEL
+        self.interval = interval if interval is not None else Config.MODEL_WARMUP_INTERVAL
+        self.keep_alive = Config.OLLAMA_KEEP_ALIVE
+
+        self._thread = None
+        self._lock = threading.Lock()
+        # url de l'instance -> modèle -> état
+        self.state: Dict[str, Dict[str, Dict[str, Any]]] = {
+            backend.url: {
+                model: self._initial_state() for model in self.models
+            }
+            for backend in self.client.pool.backends
+        }
+        self.stats = {'warmups': 0, 'warmup_failures': 0, 'checks': 0}
+
+    @property
+    def models(self) -> List[str]:
+        return list(dict.fromkeys(self.generation_models + [self.embedding_model]))
+
+    @staticmethod
+    def _initial_state() -> Dict[str, Any]:
+        return {
+            'loaded': False,
+            'expires_at': None,
+            'size_vram': None,
+            'last_warmup_at': None,
+            'last_warmup_ms': None,
+            'last_error': None
+        }
+
+    def start(self):
+        """Lance le préchargement puis la surveillance en arrière-plan"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='ollama-model-residency', daemon=True)
+        self._thread.start()
+        logger.info(f"🔥 Préchargement des modèles: {', '.join(self.models)}")
+
+    def _run(self):
+        with priority_lane(BACKGROUND):
+            while True:
+                try:
+                    self.check_and_warm()
+                except Exception as e:
+                    logger.error(f"Erreur maintien des modèles: {e}")
+                time.sleep(self.interval)
+
+    def warm(self, backend: OllamaBackend, model: str) -> bool:
+        """Charge un modèle sur une instance avec le keep_alive configuré"""
+        started = time.monotonic()
+        try:
+            if model == self.embedding_model:
+                payload = {'model': model, 'prompt': 'warm-up', 'keep_alive': self.keep_alive}
+                self.client.post_json('/api/embeddings', payload, operation='embed', backend=backend)
+            else:
+                # Sans prompt, Ollama se contente de charger le modèle
+                payload = {'model': model, 'keep_alive': self.keep_alive, 'stream': False}
+                self.client.post_json('/api/generate', payload, operation='generate', backend=backend)
+
+            elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+            with self._lock:
+                entry = self.state[backend.url][model]
+                entry['loaded'] = True
+                entry['last_warmup_at'] = datetime.now().isoformat()
+                entry['last_warmup_ms'] = elapsed_ms
+                entry['last_error'] = None
+                self.stats['warmups'] += 1
+            logger.info(f"🔥 Modèle {model} chargé sur {backend.url} ({elapsed_ms} ms)")
+            return True
+
+        except Exception as e:
+            with self._lock:
+                entry = self.state[backend.url][model]
+                entry['loaded'] = False
+                entry['last_error'] = str(e)
+                self.stats['warmup_failures'] += 1
+            logger.warning(f"⚠️ Préchargement de {model} impossible sur {backend.url}: {e}")
+            return False
+
+    def _loaded_models(self, backend: OllamaBackend) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Modèles résidents d'une instance d'après /api/ps (None si injoignable)"""
+        try:
+            running = self.client.get_json('/api/ps', backend=backend).get('models', [])
+        except Exception as e:
+            logger.debug(f"/api/ps indisponible sur {backend.url}: {e}")
+            return None
+
+        loaded = {}
+        for entry in running:
+            name = entry.get('name') or entry.get('model', '')
+            loaded[name] = entry
+            # "mistral:latest" et "mistral" désignent le même modèle
+            if name.endswith(':latest'):
+                loaded[name[:-len(':latest')]] = entry
+        return loaded
+
+    def _expires_soon(self, entry: Dict[str, Any]) -> bool:
+        """Le keep_alive expire-t-il avant la prochaine vérification ?"""
+        expires_at = entry.get('expires_at')
+        if not expires_at:
+            return False
+        try:
+            remaining = datetime.fromisoformat(expires_at).timestamp() - time.time()
+        except ValueError:
+            return False
+        return remaining < self.interval * 2
+
+    def check_and_warm(self):
+        """Compare les modèles résidents aux modèles attendus et recharge les manquants"""
+        with self._lock:
+            self.stats['checks'] += 1
+
+        for backend in self.client.pool.backends:
+            if not backend.healthy:
+                with self._lock:
+                    for entry in self.state[backend.url].values():
+                        entry['loaded'] = False
+                continue
+
+            loaded = self._loaded_models(backend)
+            if loaded is None:
+                continue
+
+            for model in self.models:
+                running = loaded.get(model)
+                with self._lock:
+                    entry = self.state[backend.url][model]
+                    entry['loaded'] = running is not None
+                    entry['expires_at'] = running.get('expires_at') if running else None
+                    entry['size_vram'] = running.get('size_vram') if running else None
+
+                if running is None or self._expires_soon(running):
+                    self.warm(backend, model)
+
+    def get_state(self) -> Dict[str, Any]:
+        """État de chargement par instance, pour /api/admin/system/health"""
+        with self._lock:
+            backends = {
+                url: {model: dict(entry) for model, entry in models.items()}
+                for url, models in self.state.items()
+            }
+            stats = dict(self.stats)
+
+        return {
+            'enabled': self._thread is not None,
+            'keep_alive': self.keep_alive,
+            'interval_seconds': self.interval,
+            'all_loaded': all(
+                entry['loaded'] for models in backends.values() for entry in models.values()
+            ),
+            'backends': backends,
+            **stats
+        }
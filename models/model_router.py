@@ -0,0 +1,146 @@
+# models/model_router.py - Routage des générations par type de contenu avec budget de latence
+
+import json
+import os
+import threading
+import time
+import logging
+from collections import deque
+from typing import Any, Dict, List
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRouter:
+    """Choisit modèle et profil d'échantillonnage selon le type de contenu.
+
+    Chaque route a un budget de latence: après N dépassements consécutifs
+    sur le modèle principal, la route bascule sur le modèle de repli
+    (plus petit) pendant un temps de refroidissement, puis retente le
+    modèle principal.
+    """
+
+    def __init__(self, routes: Dict[str, Dict[str, Any]] = None, fallback_model: str = None,
+                 breach_threshold: int = None, cooldown_seconds: float = None):
+        self.routes = routes or self._load_routes()
+        self.fallback_model = fallback_model if fallback_model is not None else Config.OLLAMA_FALLBACK_MODEL
+        self.breach_threshold = breach_threshold or Config.MODEL_ROUTE_BREACH_THRESHOLD
+        self.cooldown_seconds = cooldown_seconds if cooldown_seconds is not None else Config.MODEL_ROUTE_FALLBACK_COOLDOWN
+
+        self._lock = threading.Lock()
+        self._state = {content_type: self._new_state() for content_type in self.routes}
+
+    @staticmethod
+    def _new_state() -> Dict[str, Any]:
+        return {
+            'consecutive_breaches': 0,
+            'fallback_until': 0.0,
+            'fallback_activations': 0,
+            'calls': 0,
+            'breaches': 0,
+            'latencies_ms': deque(maxlen=100)
+        }
+
+    @staticmethod
+    def _load_routes() -> Dict[str, Dict[str, Any]]:
+        """Table par défaut de Config, complétée par le fichier JSON de surcharges s'il existe"""
+        routes = Config.get_model_routes()
+        path = Config.MODEL_ROUTES_FILE
+
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    overrides = json.load(f)
+                for content_type, override in overrides.items():
+                    routes.setdefault(content_type, {}).update(override)
+                logger.info(f"🧭 Routes de modèles surchargées depuis {path}")
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Surcharges de routes ignorées ({path}): {e}")
+
+        return routes
+
+    def get_models(self) -> List[str]:
+        """Modèles de génération utilisés par les routes, repli compris"""
+        models = [route.get('model') or Config.OLLAMA_MODEL for route in self.routes.values()]
+        if self.fallback_model:
+            models.append(self.fallback_model)
+        return list(dict.fromkeys(models))
+
+    def route(self, content_type: str) -> Dict[str, Any]:
+        """Route effective: modèle (principal ou repli) et options d'échantillonnage"""
+        base = self.routes.get(content_type, {})
+        route = {
+            'content_type': content_type,
+            'model': base.get('model') or Config.OLLAMA_MODEL,
+            'temperature': base.get('temperature', 0.7),
+            'num_predict': base.get('num_predict', 500),
+            'stop': list(base.get('stop') or []),
+            'latency_budget_ms': base.get('latency_budget_ms'),
+            'fallback': False
+        }
+
+        state = self._state.get(content_type)
+        if state and self.fallback_model and state['fallback_until'] > time.monotonic():
+            route['primary_model'] = route['model']
+            route['model'] = self.fallback_model
+            route['fallback'] = True
+        return route
+
+    def record_latency(self, route: Dict[str, Any], elapsed_ms: float):
+        """Enregistre la durée côté modèle (total_duration d'Ollama) d'un appel amont,
+        ni servi par le cache ni fusionné avec un appel identique, et bascule si besoin"""
+        with self._lock:
+            state = self._state.setdefault(route['content_type'], self._new_state())
+            state['calls'] += 1
+            state['latencies_ms'].append(elapsed_ms)
+
+            budget = route.get('latency_budget_ms')
+            if not budget or elapsed_ms <= budget:
+                if not route['fallback']:
+                    state['consecutive_breaches'] = 0
+                return
+
+            state['breaches'] += 1
+            # Seuls les dépassements du modèle principal déclenchent le repli
+            if route['fallback']:
+                return
+
+            state['consecutive_breaches'] += 1
+            if self.fallback_model and state['consecutive_breaches'] >= self.breach_threshold:
+                state['consecutive_breaches'] = 0
+                state['fallback_until'] = time.monotonic() + self.cooldown_seconds
+                state['fallback_activations'] += 1
+                logger.warning(
+                    f"🐢 Budget de latence dépassé pour {route['content_type']} "
+                    f"({elapsed_ms:.0f} ms > {budget} ms): repli sur {self.fallback_model} "
+                    f"pendant {self.cooldown_seconds:.0f}s"
+                )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Route effective et latences observées par type de contenu"""
+        now = time.monotonic()
+        with self._lock:
+            per_type = {}
+            for content_type, state in self._state.items():
+                latencies = sorted(state['latencies_ms'])
+                route = self.route(content_type)
+                per_type[content_type] = {
+                    'model': route['model'],
+                    'fallback_active': route['fallback'],
+                    'fallback_remaining_seconds': round(max(0.0, state['fallback_until'] - now), 1),
+                    'latency_budget_ms': route['latency_budget_ms'],
+                    'calls': state['calls'],
+                    'breaches': state['breaches'],
+                    'fallback_activations': state['fallback_activations'],
+                    'p50_ms': round(latencies[len(latencies) // 2], 1) if latencies else None,
+                    'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1) if latencies else None
+                }
+
+        return {
+            'fallback_model': self.fallback_model or None,
+            'breach_threshold': self.breach_threshold,
+            'cooldown_seconds': self.cooldown_seconds,
+            'routes': per_type
+        }
@@ -0,0 +1,145 @@
+# models/offer_summarizer.py - Résumés des offres calculés en tâche de fond
+
+import queue
+import threading
+import time
+import logging
+from collections import deque
+from typing import Any, Dict
+
+from config import Config
+from models.knowledge_base import add_job_stored_listener, knowledge_base_for
+from models.priority_scheduler import BACKGROUND, priority_lane
+
+logger = logging.getLogger(__name__)
+
+
+class OfferSummarizer:
+    """Résume une fois chaque offre stockée, hors du chemin des requêtes.
+
+    Les insertions de store_job alimentent une file vidée par un thread
+    unique; un balayage périodique rattrape les offres stockées sans
+    notification (autre processus, redémarrage). Les descriptions plus
+    courtes que min_chars sont reprises telles quelles, sans appel LLM.
+    Un échec est enregistré en base: l'offre ne revient au balayage
+    qu'après un délai doublé à chaque échec, et plus après max_attempts.
+    """
+
+    def __init__(self, ai_generator, knowledge_base=None, min_chars: int = None,
+                 sweep_interval: float = None, sweep_batch: int = 20, max_attempts: int = None):
+        self.ai_generator = ai_generator
+        self._knowledge_base = knowledge_base
+        self.min_chars = min_chars if min_chars is not None else Config.OFFER_SUMMARY_MIN_CHARS
+        self.sweep_interval = sweep_interval or Config.OFFER_SUMMARY_SWEEP_INTERVAL
+        self.sweep_batch = sweep_batch
+        self.max_attempts = max_attempts or Config.OFFER_SUMMARY_MAX_ATTEMPTS
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {'summarized': 0, 'copied': 0, 'failed': 0, 'abandoned': 0,
+                      'source_chars': 0, 'summary_chars': 0}
+        self._summary_times = deque(maxlen=100)
+
+    @property
+    def knowledge_base(self):
+        if self._knowledge_base is None:
+            self._knowledge_base = knowledge_base_for(self.ai_generator)
+        return self._knowledge_base
+
+    def start(self):
+        """S'abonne aux insertions et lance le thread de résumé"""
+        if self._thread is not None:
+            return
+        add_job_stored_listener(self.enqueue)
+        self._thread = threading.Thread(target=self._run, name='offer-summarizer', daemon=True)
+        self._thread.start()
+        logger.info("📝 Résumés des offres activés")
+
+    def enqueue(self, hash_id: str):
+        self._queue.put(hash_id)
+
+    def _run(self):
+        with priority_lane(BACKGROUND):
+            # Premier passage: offres stockées avant le démarrage
+            self.sweep()
+            while True:
+                try:
+                    hash_id = self._queue.get(timeout=self.sweep_interval)
+                except queue.Empty:
+                    self.sweep()
+                    continue
+                self.summarize(hash_id)
+
+    def sweep(self) -> int:
+        """Résume un lot d'offres restées sans résumé"""
+        try:
+            hash_ids = self.knowledge_base.get_hash_ids_without_summary(self.sweep_batch, self.max_attempts)
+        except Exception as e:
+            logger.error(f"Erreur balayage des résumés: {e}")
+            return 0
+        return sum(1 for hash_id in hash_ids if self.summarize(hash_id))
+
+    def summarize(self, hash_id: str) -> bool:
+        """Calcule et stocke le résumé d'une offre (sans effet si déjà présent)"""
+        offer = self.knowledge_base.get_jobs_by_hash_ids([hash_id]).get(hash_id)
+        if not offer or offer.get('summary'):
+            return False
+
+        description = offer['description']
+        try:
+            if len(description) < self.min_chars:
+                summary, model = description, None
+            else:
+                started = time.monotonic()
+                summary, model = self.ai_generator.summarize_job_offer(offer['title'], offer['company'], description)
+                elapsed = time.monotonic() - started
+                if not summary:
+                    raise ValueError("résumé vide")
+
+            if not self.knowledge_base.store_summary(hash_id, summary, model, len(description)):
+                raise RuntimeError("écriture du résumé impossible")
+
+        except Exception as e:
+            self._record_failure(hash_id, e)
+            return False
+
+        with self._lock:
+            self.stats['summarized' if model else 'copied'] += 1
+            self.stats['source_chars'] += len(description)
+            self.stats['summary_chars'] += len(summary)
+            if model:
+                self._summary_times.append(elapsed)
+        return True
+
+    def _record_failure(self, hash_id: str, error: Exception):
+        """Compte l'échec en base (report du prochain essai) et dans les statistiques"""
+        try:
+            attempts = self.knowledge_base.record_summary_failure(hash_id, str(error), self.sweep_interval)
+        except Exception as e:
+            logger.error(f"Erreur enregistrement échec de résumé: {e}")
+            attempts = 0
+
+        with self._lock:
+            self.stats['failed'] += 1
+            if attempts >= self.max_attempts:
+                self.stats['abandoned'] += 1
+        if attempts >= self.max_attempts:
+            logger.warning(f"⚠️ Résumé de l'offre {hash_id[:8]} abandonné après {attempts} échecs: {error}")
+        else:
+            logger.warning(f"⚠️ Résumé de l'offre {hash_id[:8]} impossible (essai {attempts}): {error}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            times = list(self._summary_times)
+
+        return {
+            'enabled': self._thread is not None,
+            'pending': self._queue.qsize(),
+            'min_chars': self.min_chars,
+            'max_attempts': self.max_attempts,
+            'compression': round(stats['summary_chars'] / stats['source_chars'], 3) if stats['source_chars'] else None,
+            'avg_summary_seconds': round(sum(times) / len(times), 2) if times else None,
+            **stats
+        }
@@ -0,0 +1,356 @@
+# models/ollama_async.py - Client Ollama asynchrone (aiohttp) avec limiteur de concurrence
+
+import asyncio
+import json
+import random
+import threading
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from config import Config
+from models.ollama_client import (OllamaClient, OllamaError, OllamaUnavailableError, get_ollama_client,
+                                  merge_stream_chunks)
+from models.single_flight import SingleFlight
+from models.cancellation import GenerationCancelled, cancellation_scope, current_cancellation
+from models.priority_scheduler import PriorityScheduler
+
+logger = logging.getLogger(__name__)
+
+# Import conditionnel d'aiohttp (repli sur le client synchrone dans un exécuteur)
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+    logger.warning("⚠️ aiohttp non installé - le client async utilisera des threads")
+
+
+class AsyncOllamaClient:
+    """Client async non bloquant, partagé par tout le processus.
+
+    Toutes les requêtes s'exécutent sur une boucle d'événements dédiée qui
+    possède la session HTTP. Les slots parallèles d'Ollama sont attribués
+    par l'ordonnanceur à priorités du client synchrone, partagé par les
+    deux clients. Les coroutines appelées depuis une autre boucle (par ex.
+    les boucles créées par requête Flask) y sont relayées.
+    """
+
+    def __init__(self, sync_client: OllamaClient = None, max_parallel: int = None):
+        self.sync_client = sync_client or get_ollama_client()
+        self.base_url = self.sync_client.base_url
+        # Slots parallèles de chaque instance du pool, cumulés
+        self.scheduler = self.sync_client.scheduler
+        self.max_parallel = max_parallel or self.scheduler.capacity
+
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._start_lock = threading.Lock()
+
+        self.in_flight = 0
+        self.waiting = 0
+
+    # ------------------------------------------------------------------
+    # Boucle dédiée
+    # ------------------------------------------------------------------
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Démarre paresseusement la boucle propriétaire de la session"""
+        if self._loop is None:
+            with self._start_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    ready = threading.Event()
+
+                    def run():
+                        asyncio.set_event_loop(loop)
+                        ready.set()
+                        loop.run_forever()
+
+                    self._thread = threading.Thread(target=run, name='ollama-async-loop', daemon=True)
+                    self._thread.start()
+                    ready.wait()
+                    self._loop = loop
+        return self._loop
+
+    async def _on_home_loop(self, coro):
+        """Exécute la coroutine sur la boucle dédiée et en attend le résultat"""
+        home = self._ensure_loop()
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+
+        if current is home:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, home))
+
+    def submit(self, coro):
+        """Planifie une coroutine sur la boucle dédiée (retourne un concurrent.futures.Future)"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run_sync(self, coro, timeout: float = None):
+        """Exécute une coroutine depuis du code synchrone (routes Flask)"""
+        return self.submit(coro).result(timeout)
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=Config.OLLAMA_POOL_SIZE, keepalive_timeout=60)
+            )
+        return self._session
+
+    def _timeout(self, operation: str):
+        return aiohttp.ClientTimeout(
+            sock_connect=self.sync_client.connect_timeout,
+            sock_read=self.sync_client.timeouts.get(operation, self.sync_client.timeouts['probe'])
+        )
+
+    # ------------------------------------------------------------------
+    # Requêtes
+    # ------------------------------------------------------------------
+
+    async def _acquire_slot(self) -> str:
+        """Slot de la voie de priorité courante (interactif, lot ou fond)"""
+        self.waiting += 1
+        try:
+            lane = await self.scheduler.aacquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return lane
+
+    def _release_slot(self, lane: str):
+        self.in_flight -= 1
+        self.scheduler.release(lane)
+
+    async def _run_sync(self, fn, *args):
+        """Repli sans aiohttp: client synchrone dans un thread, sans reprendre de slot"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, PriorityScheduler.run_holding_slot, fn, *args)
+
+    async def _post_json(self, path: str, payload: Dict[str, Any], operation: str) -> Dict[str, Any]:
+        lane = await self._acquire_slot()
+        try:
+            if not AIOHTTP_AVAILABLE:
+                # Requête brute: post_json repasserait par la fusion dont cet appel est déjà le leader
+                return await self._run_sync(
+                    lambda: self.sync_client.request('POST', path, operation, payload=payload).json()
+                )
+
+            session = await self._get_session()
+            tried = []
+
+            for attempt in range(self.sync_client.max_retries + 1):
+                backend = self.sync_client.acquire_backend(exclude=tried)
+                self.sync_client._count('requests')
+                try:
+                    async with session.post(f"{backend.url}{path}", json=payload,
+                                            timeout=self._timeout(operation)) as response:
+                        if response.status in (502, 503, 504) and attempt < self.sync_client.max_retries:
+                            backend.breaker.record_failure()
+                            tried.append(backend)
+                            self.sync_client._count('retries')
+                            await self._sleep_before_retry(attempt)
+                            continue
+
+                        if response.status >= 500:
+                            self.sync_client._count('failures')
+                            backend.breaker.record_failure()
+                        else:
+                            backend.breaker.record_success()
+
+                        if response.status != 200:
+                            # Corps de l'erreur conservé (ex. 404 modèle absent / endpoint absent)
+                            detail = (await response.text())[:200].strip()
+                            raise OllamaError(f"Erreur Ollama: {response.status} {detail}".strip(),
+                                              status_code=response.status)
+
+                        return await response.json(content_type=None)
+
+                except aiohttp.ClientConnectionError as e:
+                    backend.breaker.record_failure()
+                    if attempt < self.sync_client.max_retries and not isinstance(e, aiohttp.ServerTimeoutError):
+                        tried.append(backend)
+                        self.sync_client._count('retries')
+                        await self._sleep_before_retry(attempt)
+                        continue
+                    self.sync_client._count('failures')
+                    raise OllamaUnavailableError(f"Erreur de connexion à Ollama: {str(e)}")
+
+                except asyncio.TimeoutError as e:
+                    self.sync_client._count('failures')
+                    backend.breaker.record_failure()
+                    raise OllamaUnavailableError(f"Timeout Ollama: {str(e)}")
+
+                finally:
+                    self.sync_client.release_backend(backend)
+        finally:
+            self._release_slot(lane)
+
+    async def _sleep_before_retry(self, attempt: int):
+        delay = self.sync_client.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+        await asyncio.sleep(delay)
+
+    async def post_json(self, path: str, payload: Dict[str, Any], operation: str = 'generate') -> Dict[str, Any]:
+        """POST JSON non bloquant, limité à max_parallel requêtes simultanées.
+
+        Comme côté synchrone, un appel annulable est lu en streaming (connexion
+        coupée à l'annulation) sans sortir de la fusion des requêtes identiques.
+        """
+        async def call():
+            if current_cancellation() is not None and path in OllamaClient.STREAMABLE_PATHS:
+                stream_payload = dict(payload, stream=True)
+                return merge_stream_chunks([chunk async for chunk in self.stream_json(path, stream_payload, operation)])
+            return await self._on_home_loop(self._post_json(path, payload, operation))
+
+        if operation in OllamaClient.COALESCED_OPERATIONS:
+            # Table partagée avec le client synchrone: fusion sync/async
+            return await self.sync_client.single_flight.ado(SingleFlight.make_key(path, payload), call)
+        return await call()
+
+    async def _stream_into(self, path: str, payload: Dict[str, Any], operation: str, push, token=None):
+        """Producteur exécuté sur la boucle dédiée: pousse chaque objet NDJSON via push()"""
+        lane = await self._acquire_slot()
+        try:
+            if not AIOHTTP_AVAILABLE:
+                # Flux synchrone lu dans un thread: chaque objet est relayé dès réception,
+                # et le jeton y reste actif pour fermer la connexion à l'annulation
+                loop = asyncio.get_running_loop()
+                stopped = threading.Event()
+
+                def pump():
+                    with cancellation_scope(token):
+                        chunks = self.sync_client.stream_json(path, payload, operation)
+                        try:
+                            for chunk in chunks:
+                                if stopped.is_set():
+                                    break
+                                loop.call_soon_threadsafe(push, chunk)
+                        finally:
+                            chunks.close()
+
+                try:
+                    await self._run_sync(pump)
+                finally:
+                    stopped.set()  # consommateur parti: le thread ferme le flux au chunk suivant
+                return
+
+            session = await self._get_session()
+            backend = self.sync_client.acquire_backend()
+            self.sync_client._count('requests')
+            try:
+                async with session.post(f"{backend.url}{path}", json=payload,
+                                        timeout=self._timeout(operation)) as response:
+                    if response.status != 200:
+                        if response.status >= 500:
+                            backend.breaker.record_failure()
+                        raise OllamaError(f"Erreur Ollama: {response.status}", status_code=response.status)
+                    backend.breaker.record_success()
+
+                    async for line in response.content:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get('error'):
+                            raise OllamaError(f"Erreur Ollama: {chunk['error']}")
+                        push(chunk)
+                        if chunk.get('done'):
+                            break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.sync_client._count('failures')
+                backend.breaker.record_failure()
+                raise OllamaUnavailableError(f"Erreur de connexion à Ollama: {str(e)}")
+            finally:
+                self.sync_client.release_backend(backend)
+        finally:
+            self._release_slot(lane)
+
+    async def stream_json(self, path: str, payload: Dict[str, Any],
+                          operation: str = 'generate') -> AsyncIterator[Dict[str, Any]]:
+        """Itère de façon asynchrone sur les objets NDJSON d'une réponse streaming.
+
+        Un jeton d'annulation du contexte interrompt la lecture: le
+        producteur est alors annulé, ce qui ferme la connexion amont.
+        """
+        token = current_cancellation()
+        if token:
+            token.raise_if_cancelled()
+        home = self._ensure_loop()
+        caller = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        end = object()
+
+        def push(item):
+            if caller is home:
+                queue.put_nowait(item)
+            else:
+                caller.call_soon_threadsafe(queue.put_nowait, item)
+
+        async def produce():
+            try:
+                await self._stream_into(path, payload, operation, push, token)
+                push(end)
+            except Exception as e:
+                push(e)
+
+        def on_cancel():
+            caller.call_soon_threadsafe(queue.put_nowait, GenerationCancelled(token.reason))
+
+        future = asyncio.run_coroutine_threadsafe(produce(), home)
+        if token:
+            token.add_callback(on_cancel)
+        try:
+            while True:
+                item = await queue.get()
+                if item is end:
+                    break
+                if isinstance(item, Exception):
+                    if isinstance(item, GenerationCancelled):
+                        self.sync_client._count('streams_cancelled')
+                    raise item
+                yield item
+        finally:
+            if token:
+                token.remove_callback(on_cancel)
+            # Abandon du consommateur ou annulation: on coupe le producteur (ferme la connexion)
+            if not future.done():
+                future.cancel()
+
+    async def embeddings(self, model: str, prompt: str) -> List[float]:
+        """Embedding non bloquant via /api/embeddings"""
+        payload = {'model': model, 'prompt': prompt, 'keep_alive': Config.OLLAMA_KEEP_ALIVE}
+        result = await self.post_json('/api/embeddings', payload, operation='embed')
+        return result.get('embedding', [])
+
+    async def embed(self, model: str, texts: List[str]) -> List[List[float]]:
+        """Embeddings par lot non bloquants via /api/embed (voir OllamaClient.embed)"""
+        payload = {'model': model, 'input': list(texts), 'keep_alive': Config.OLLAMA_KEEP_ALIVE}
+        result = await self.post_json('/api/embed', payload, operation='embed')
+        embeddings = result.get('embeddings', [])
+        if len(embeddings) != len(texts):
+            raise OllamaError(f"Réponse /api/embed incomplète: {len(embeddings)} vecteurs pour {len(texts)} textes")
+        return embeddings
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'backend': 'aiohttp' if AIOHTTP_AVAILABLE else 'thread_executor',
+            'max_parallel': self.max_parallel,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting
+        }
+
+
+_async_client: Optional[AsyncOllamaClient] = None
+_async_client_lock = threading.Lock()
+
+
+def get_async_ollama_client() -> AsyncOllamaClient:
+    """Retourne le client async partagé du processus"""
+    global _async_client
+    if _async_client is None:
+        with _async_client_lock:
+            if _async_client is None:
+                _async_client = AsyncOllamaClient()
+    return _async_client
@@ -0,0 +1,507 @@
+# models/ollama_client.py - Client Ollama partagé (pool de connexions, retries, disjoncteur)
+
+import json
+import random
+import threading
+import time
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+from models.single_flight import SingleFlight
+from models.cancellation import GenerationCancelled, current_cancellation
+from models.priority_scheduler import PriorityScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaError(Exception):
+    """Erreur renvoyée par Ollama (statut HTTP ou message d'erreur)"""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class OllamaUnavailableError(OllamaError):
+    """Ollama injoignable ou disjoncteur ouvert"""
+
+
+class CircuitBreaker:
+    """Disjoncteur simple: coupe les appels après N échecs consécutifs"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Indique si un appel peut partir (un seul essai en demi-ouverture)"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"⚡ Disjoncteur Ollama ouvert après {self.failures} échecs")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def trip(self):
+        """Ouverture immédiate (sonde de santé en échec)"""
+        with self._lock:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def get_state(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'retry_in_seconds': max(0.0, round(self.reset_timeout - (time.monotonic() - self.opened_at), 1))
+                if self.state == self.OPEN else 0.0
+            }
+
+
+class OllamaBackend:
+    """Une instance Ollama du pool: disjoncteur propre et requêtes en cours"""
+
+    def __init__(self, url: str, failure_threshold: int, reset_timeout: float):
+        self.url = url.rstrip('/')
+        self.breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+        self.outstanding = 0
+        self.total_requests = 0
+        self.last_probe_at = None
+        self.last_probe_ok = None
+        self.probe_latency_ms = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.breaker.state == CircuitBreaker.CLOSED
+
+    def get_state(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'total_requests': self.total_requests,
+            'last_probe_at': self.last_probe_at,
+            'last_probe_ok': self.last_probe_ok,
+            'probe_latency_ms': self.probe_latency_ms,
+            'circuit_breaker': self.breaker.get_state()
+        }
+
+
+class OllamaBackendPool:
+    """Répartition des appels sur plusieurs instances Ollama.
+
+    Chaque appel part vers l'instance saine ayant le moins de requêtes en
+    cours (à égalité, tourniquet). Une instance dont le disjoncteur est
+    ouvert est écartée; elle est réadmise par une sonde de santé réussie
+    ou par l'essai unique autorisé en demi-ouverture.
+    """
+
+    def __init__(self, urls: List[str], failure_threshold: int, reset_timeout: float):
+        self.backends = [
+            OllamaBackend(url, failure_threshold, reset_timeout)
+            for url in dict.fromkeys(url.rstrip('/') for url in urls)
+        ]
+        self._lock = threading.Lock()
+        self._rotation = 0
+
+    def acquire(self, exclude: List[OllamaBackend] = (), pinned: OllamaBackend = None) -> Optional[OllamaBackend]:
+        """Réserve l'instance la moins chargée (None si aucune n'accepte d'appel)"""
+        with self._lock:
+            chosen = None
+
+            if pinned is not None:
+                if pinned.healthy or pinned.breaker.allow_request():
+                    chosen = pinned
+            else:
+                others = [b for b in self.backends if b not in exclude]
+                # On évite d'abord les instances déjà essayées pour cet appel
+                for candidates in (others, self.backends):
+                    healthy = [b for b in candidates if b.healthy]
+                    if healthy:
+                        self._rotation += 1
+                        offset = self._rotation % len(healthy)
+                        rotated = healthy[offset:] + healthy[:offset]
+                        chosen = min(rotated, key=lambda b: b.outstanding)
+                        break
+                    chosen = next((b for b in candidates if b.breaker.allow_request()), None)
+                    if chosen is not None:
+                        break
+
+            if chosen is not None:
+                chosen.outstanding += 1
+                chosen.total_requests += 1
+            return chosen
+
+    def release(self, backend: OllamaBackend):
+        with self._lock:
+            backend.outstanding -= 1
+
+    def get_state(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [backend.get_state() for backend in self.backends]
+
+
+def merge_stream_chunks(chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reconstitue une réponse non streaming: champs du chunk final, texte concaténé"""
+    final = next((chunk for chunk in reversed(chunks) if chunk.get('done')), {})
+    result = dict(final)
+    if any('message' in chunk for chunk in chunks):
+        result['message'] = {
+            'role': 'assistant',
+            'content': ''.join(chunk.get('message', {}).get('content', '') for chunk in chunks)
+        }
+    if any('response' in chunk for chunk in chunks):
+        result['response'] = ''.join(chunk.get('response', '') for chunk in chunks)
+    return result
+
+
+class OllamaClient:
+    """Client HTTP unique vers Ollama, partagé par le générateur et les embeddings"""
+
+    # Opérations idempotentes dont les requêtes identiques en vol sont fusionnées
+    COALESCED_OPERATIONS = ('generate', 'embed')
+    # Routes lues en streaming quand l'appel est annulable (connexion coupée à l'annulation)
+    STREAMABLE_PATHS = ('/api/chat', '/api/generate')
+    # Opérations qui occupent un slot de calcul d'Ollama (les sondes et pulls passent)
+    SCHEDULED_OPERATIONS = ('generate', 'embed')
+
+    def __init__(self, base_urls: List[str] = None):
+        self.pool = OllamaBackendPool(
+            base_urls or Config.OLLAMA_BASE_URLS,
+            failure_threshold=Config.OLLAMA_CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=Config.OLLAMA_CIRCUIT_RESET_TIMEOUT
+        )
+        # Instance principale (affichage, compatibilité)
+        self.base_url = self.pool.backends[0].url
+
+        # Pool de connexions keep-alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=Config.OLLAMA_POOL_SIZE,
+            pool_maxsize=Config.OLLAMA_POOL_SIZE
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Timeouts par type d'opération (secondes)
+        self.connect_timeout = Config.OLLAMA_TIMEOUT_CONNECT
+        self.timeouts = {
+            'probe': Config.OLLAMA_TIMEOUT_PROBE,
+            'generate': Config.OLLAMA_TIMEOUT_GENERATE,
+            'embed': Config.OLLAMA_TIMEOUT_EMBED,
+            'pull': Config.OLLAMA_TIMEOUT_PULL
+        }
+
+        self.max_retries = Config.OLLAMA_MAX_RETRIES
+        self.retry_backoff = Config.OLLAMA_RETRY_BACKOFF
+
+        # Fusion des requêtes identiques simultanées (générations et embeddings)
+        self.single_flight = SingleFlight(shared_errors=(OllamaError,))
+
+        # Voies de priorité (interactif, lot, fond) sur les slots parallèles du pool
+        self.scheduler = PriorityScheduler(Config.OLLAMA_NUM_PARALLEL * len(self.pool.backends))
+
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'retries': 0,
+            'failures': 0,
+            'rejected_by_breaker': 0,
+            'streams_cancelled': 0
+        }
+
+        # Sondes de santé périodiques (uniquement avec plusieurs instances)
+        self.health_check_interval = Config.OLLAMA_HEALTH_CHECK_INTERVAL
+        self._health_thread = None
+        if len(self.pool.backends) > 1 and self.health_check_interval > 0:
+            self._health_thread = threading.Thread(target=self._health_loop, name='ollama-health-check', daemon=True)
+            self._health_thread.start()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _sleep_before_retry(self, attempt: int):
+        """Backoff exponentiel avec jitter pour ne pas synchroniser les clients"""
+        delay = self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+        time.sleep(delay)
+
+    def acquire_backend(self, exclude: List[OllamaBackend] = (), pinned: OllamaBackend = None) -> OllamaBackend:
+        """Réserve une instance pour un appel (à libérer avec release_backend)"""
+        backend = self.pool.acquire(exclude=exclude, pinned=pinned)
+        if backend is None:
+            self._count('rejected_by_breaker')
+            raise OllamaUnavailableError("Ollama indisponible (disjoncteur ouvert)")
+        return backend
+
+    def release_backend(self, backend: OllamaBackend):
+        self.pool.release(backend)
+
+    def _send(self, method: str, path: str, operation: str, payload: Dict[str, Any] = None,
+              stream: bool = False, backend: OllamaBackend = None):
+        """Envoie la requête et retourne (instance, réponse), l'instance restant réservée.
+
+        Seuls les échecs de connexion et les statuts 502/503/504 sont rejoués,
+        de préférence sur une autre instance: un timeout de lecture sur une
+        génération n'est jamais relancé.
+        """
+        timeout = (self.connect_timeout, self.timeouts.get(operation, self.timeouts['probe']))
+        tried = []
+
+        for attempt in range(self.max_retries + 1):
+            target = self.acquire_backend(exclude=tried, pinned=backend)
+            self._count('requests')
+            try:
+                response = self.session.request(method, f"{target.url}{path}", json=payload,
+                                                stream=stream, timeout=timeout)
+
+            except requests.ConnectionError as e:
+                self.release_backend(target)
+                target.breaker.record_failure()
+                if attempt < self.max_retries:
+                    tried.append(target)
+                    self._count('retries')
+                    self._sleep_before_retry(attempt)
+                    continue
+                self._count('failures')
+                raise OllamaUnavailableError(f"Erreur de connexion à Ollama: {str(e)}")
+
+            except requests.RequestException as e:
+                self.release_backend(target)
+                self._count('failures')
+                target.breaker.record_failure()
+                raise OllamaUnavailableError(f"Erreur de connexion à Ollama: {str(e)}")
+
+            if response.status_code in (502, 503, 504) and attempt < self.max_retries:
+                response.close()
+                self.release_backend(target)
+                target.breaker.record_failure()
+                tried.append(target)
+                self._count('retries')
+                self._sleep_before_retry(attempt)
+                continue
+
+            if response.status_code >= 500:
+                self._count('failures')
+                target.breaker.record_failure()
+            else:
+                target.breaker.record_success()
+
+            if response.status_code != 200:
+                detail = response.text[:200].strip() if not stream else ''
+                response.close()
+                self.release_backend(target)
+                raise OllamaError(f"Erreur Ollama: {response.status_code} {detail}".strip(),
+                                  status_code=response.status_code)
+
+            return target, response
+
+    def request(self, method: str, path: str, operation: str = 'probe',
+                payload: Dict[str, Any] = None, stream: bool = False,
+                backend: OllamaBackend = None) -> requests.Response:
+        """Envoie une requête avec retries bornés, répartition de charge et disjoncteur.
+
+        `backend` force une instance précise (préchargement, téléchargement de modèle).
+        """
+        lane = self.scheduler.acquire() if operation in self.SCHEDULED_OPERATIONS else None
+        try:
+            target, response = self._send(method, path, operation, payload, stream, backend)
+            self.release_backend(target)
+        finally:
+            self.scheduler.release(lane)
+        return response
+
+    def get_json(self, path: str, operation: str = 'probe', backend: OllamaBackend = None) -> Dict[str, Any]:
+        response = self.request('GET', path, operation, backend=backend)
+        return response.json()
+
+    def post_json(self, path: str, payload: Dict[str, Any], operation: str = 'generate',
+                  backend: OllamaBackend = None) -> Dict[str, Any]:
+        """POST JSON; les appels identiques simultanés sont fusionnés.
+
+        Avec un jeton d'annulation dans le contexte, le leader lit la réponse
+        en streaming pour pouvoir couper la connexion: la fusion et la clé
+        restent celles de la requête non streaming.
+        """
+        def call():
+            if current_cancellation() is not None and path in self.STREAMABLE_PATHS and backend is None:
+                return merge_stream_chunks(list(self.stream_json(path, dict(payload, stream=True), operation)))
+            response = self.request('POST', path, operation, payload=payload, backend=backend)
+            return response.json()
+        
+        if operation in self.COALESCED_OPERATIONS and backend is None:
+            return self.single_flight.do(SingleFlight.make_key(path, payload), call)
+        return call()
+
+    def stream_json(self, path: str, payload: Dict[str, Any], operation: str = 'generate') -> Iterator[Dict[str, Any]]:
+        """Itère sur les objets NDJSON d'une réponse streaming (connexion fermée en sortie).
+
+        Avec un jeton d'annulation dans le contexte, annuler ferme la
+        connexion depuis n'importe quel thread: Ollama interrompt alors la
+        génération et libère son slot.
+        """
+        token = current_cancellation()
+        if token:
+            token.raise_if_cancelled()
+        lane = self.scheduler.acquire() if operation in self.SCHEDULED_OPERATIONS else None
+        try:
+            backend, response = self._send('POST', path, operation, payload=payload, stream=True)
+        except Exception:
+            self.scheduler.release(lane)
+            raise
+        if token:
+            token.add_callback(response.close)
+
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('error'):
+                    raise OllamaError(f"Erreur Ollama: {chunk['error']}")
+                yield chunk
+                if chunk.get('done'):
+                    break
+            else:
+                # Flux terminé sans chunk final: coupé par une annulation ?
+                if token:
+                    token.raise_if_cancelled()
+
+        except Exception as e:
+            # La fermeture par annulation interrompt la lecture avec une erreur quelconque
+            if token and token.cancelled:
+                self._count('streams_cancelled')
+                raise GenerationCancelled(token.reason) from None
+            if isinstance(e, requests.RequestException):
+                backend.breaker.record_failure()
+                raise OllamaUnavailableError(f"Erreur de connexion à Ollama: {str(e)}")
+            raise
+        finally:
+            if token:
+                token.remove_callback(response.close)
+            response.close()
+            self.release_backend(backend)
+            self.scheduler.release(lane)
+
+    def _probe(self, backend: OllamaBackend, eject: bool = False) -> bool:
+        """Sonde /api/tags d'une instance; eject=True l'écarte dès le premier échec"""
+        started = time.monotonic()
+        try:
+            response = self.session.get(
+                f"{backend.url}/api/tags",
+                timeout=(self.connect_timeout, self.timeouts['probe'])
+            )
+            available = response.status_code == 200
+            response.close()
+        except requests.RequestException:
+            available = False
+
+        backend.last_probe_at = time.time()
+        backend.last_probe_ok = available
+        backend.probe_latency_ms = round((time.monotonic() - started) * 1000, 1) if available else None
+
+        if available:
+            if not backend.healthy:
+                logger.info(f"♻️ Instance Ollama réadmise: {backend.url}")
+            backend.breaker.record_success()
+        elif eject:
+            if backend.healthy:
+                logger.warning(f"🚫 Instance Ollama écartée (sonde en échec): {backend.url}")
+            backend.breaker.trip()
+        else:
+            backend.breaker.record_failure()
+        return available
+
+    def check_backends(self) -> Dict[str, bool]:
+        """Sonde toutes les instances du pool"""
+        return {backend.url: self._probe(backend, eject=True) for backend in self.pool.backends}
+
+    def _health_loop(self):
+        while True:
+            time.sleep(self.health_check_interval)
+            try:
+                self.check_backends()
+            except Exception as e:
+                logger.error(f"Erreur sonde de santé Ollama: {e}")
+
+    def is_available(self) -> bool:
+        """Vérifie si au moins une instance répond (sans retry, pour rester rapide)"""
+        for backend in self.pool.backends:
+            if not backend.healthy and not backend.breaker.allow_request():
+                continue
+            if self._probe(backend):
+                return True
+        return False
+
+    def list_models(self, backend: OllamaBackend = None) -> List[str]:
+        """Noms des modèles installés sur le serveur"""
+        return [m.get('name', '') for m in self.get_json('/api/tags', backend=backend).get('models', [])]
+
+    def embeddings(self, model: str, prompt: str) -> List[float]:
+        """Embedding d'un texte via /api/embeddings"""
+        payload = {'model': model, 'prompt': prompt, 'keep_alive': Config.OLLAMA_KEEP_ALIVE}
+        result = self.post_json('/api/embeddings', payload, operation='embed')
+        return result.get('embedding', [])
+
+    def embed(self, model: str, texts: List[str]) -> List[List[float]]:
+        """Embeddings de plusieurs textes en une requête /api/embed (Ollama >= 0.3.4, vecteurs normalisés)"""
+        payload = {'model': model, 'input': list(texts), 'keep_alive': Config.OLLAMA_KEEP_ALIVE}
+        result = self.post_json('/api/embed', payload, operation='embed')
+        embeddings = result.get('embeddings', [])
+        if len(embeddings) != len(texts):
+            raise OllamaError(f"Réponse /api/embed incomplète: {len(embeddings)} vecteurs pour {len(texts)} textes")
+        return embeddings
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['base_url'] = self.base_url
+        stats['backends'] = self.pool.get_state()
+        stats['healthy_backends'] = sum(1 for backend in stats['backends'] if backend['healthy'])
+        stats['single_flight'] = self.single_flight.get_stats()
+        stats['scheduler'] = self.scheduler.get_stats()
+        stats['timeouts'] = dict(self.timeouts)
+        return stats
+
+
+_client: Optional[OllamaClient] = None
+_client_lock = threading.Lock()
+
+
+def get_ollama_client() -> OllamaClient:
+    """Retourne le client Ollama partagé du processus"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OllamaClient()
+    return _client
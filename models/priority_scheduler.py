@@ -0,0 +1,228 @@
+# models/priority_scheduler.py - Files de priorité devant les appels Ollama
+
+import asyncio
+import contextvars
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from config import Config
+from models.cancellation import GenerationCancelled, current_cancellation
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+BACKGROUND = 'background'
+LANES = (INTERACTIVE, BATCH, BACKGROUND)
+
+# Voie du thread / de la tâche courante; par défaut, un appel sert un utilisateur
+_current_lane = contextvars.ContextVar('ollama_priority_lane', default=INTERACTIVE)
+# Slot déjà détenu par l'appelant (client async replié sur le client synchrone)
+_slot_held = contextvars.ContextVar('ollama_slot_held', default=False)
+
+
+def current_lane() -> str:
+    return _current_lane.get()
+
+
+@contextmanager
+def priority_lane(lane: str):
+    """Exécute le bloc dans la voie indiquée (batch, background...)"""
+    if lane not in LANES:
+        raise ValueError(f"Voie de priorité inconnue: {lane}")
+    reset = _current_lane.set(lane)
+    try:
+        yield lane
+    finally:
+        _current_lane.reset(reset)
+
+
+class _Waiter:
+    __slots__ = ('lane', 'notify', 'granted', 'enqueued')
+
+    def __init__(self, lane: str, notify):
+        self.lane = lane
+        self.notify = notify
+        self.granted = False
+        self.enqueued = time.monotonic()
+
+
+class PriorityScheduler:
+    """Répartit les slots parallèles d'Ollama entre trois voies de priorité.
+
+    Les slots libérés vont d'abord aux requêtes interactives, puis aux lots,
+    puis aux tâches de fond (embeddings du scraping, résumés, préchargement).
+    `reserved_interactive` slots ne sont jamais cédés aux autres voies: un
+    scraping en cours ne peut pas faire attendre une génération utilisateur.
+    La voie de fond est en plus plafonnée à `background_max` slots.
+    """
+
+    def __init__(self, capacity: int, reserved_interactive: int = None,
+                 batch_max: int = None, background_max: int = None):
+        self.capacity = max(1, capacity)
+        reserved = Config.OLLAMA_PRIORITY_RESERVED_INTERACTIVE if reserved_interactive is None else reserved_interactive
+        self.reserved_interactive = min(max(0, reserved), self.capacity - 1)
+        shared = self.capacity - self.reserved_interactive
+        self.limits = {
+            INTERACTIVE: self.capacity,
+            BATCH: min(shared, batch_max or Config.OLLAMA_PRIORITY_BATCH_MAX_SLOTS or shared),
+            BACKGROUND: min(shared, background_max or Config.OLLAMA_PRIORITY_BACKGROUND_MAX_SLOTS or shared)
+        }
+
+        self._lock = threading.Lock()
+        self._waiters = {lane: deque() for lane in LANES}
+        self.in_use = {lane: 0 for lane in LANES}
+        self.stats = {lane: {'granted': 0, 'waited': 0, 'cancelled': 0} for lane in LANES}
+        self._wait_ms = {lane: deque(maxlen=200) for lane in LANES}
+
+    # ------------------------------------------------------------------
+    # Admission (sous verrou)
+    # ------------------------------------------------------------------
+
+    def _admissible(self, lane: str) -> bool:
+        total = sum(self.in_use.values())
+        if total >= self.capacity or self.in_use[lane] >= self.limits[lane]:
+            return False
+        if lane != INTERACTIVE and total >= self.capacity - self.reserved_interactive:
+            return False
+        if lane == BACKGROUND and (self._waiters[INTERACTIVE] or self._waiters[BATCH]):
+            return False
+        return True
+
+    def _grant(self, waiter: _Waiter):
+        waiter.granted = True
+        self.in_use[waiter.lane] += 1
+        self.stats[waiter.lane]['granted'] += 1
+        self._wait_ms[waiter.lane].append((time.monotonic() - waiter.enqueued) * 1000)
+
+    def _dispatch(self):
+        """Attribue les slots libres aux attentes, par ordre de priorité puis d'arrivée"""
+        for lane in LANES:
+            waiters = self._waiters[lane]
+            while waiters and self._admissible(lane):
+                waiter = waiters.popleft()
+                self._grant(waiter)
+                waiter.notify()
+
+    def _try_enter(self, waiter: _Waiter) -> bool:
+        """Admission immédiate si personne de même priorité n'attend déjà"""
+        if not self._waiters[waiter.lane] and self._admissible(waiter.lane):
+            self._grant(waiter)
+            return True
+        self._waiters[waiter.lane].append(waiter)
+        self.stats[waiter.lane]['waited'] += 1
+        return False
+
+    def _abandon(self, waiter: _Waiter):
+        """Retire une attente abandonnée; rend le slot s'il venait d'être attribué"""
+        if waiter.granted:
+            self._release_locked(waiter.lane)
+        elif waiter in self._waiters[waiter.lane]:
+            self._waiters[waiter.lane].remove(waiter)
+        self.stats[waiter.lane]['cancelled'] += 1
+
+    def _release_locked(self, lane: str):
+        self.in_use[lane] -= 1
+        self._dispatch()
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def acquire(self) -> Optional[str]:
+        """Attend un slot dans la voie courante (threads); retourne la voie à libérer"""
+        if _slot_held.get():
+            return None
+
+        lane = current_lane()
+        event = threading.Event()
+        waiter = _Waiter(lane, event.set)
+        with self._lock:
+            if self._try_enter(waiter):
+                return lane
+
+        # Un job annulé pendant l'attente sort de la file sans jamais appeler Ollama
+        token = current_cancellation()
+        if token:
+            token.add_callback(event.set)
+        try:
+            event.wait()
+        finally:
+            if token:
+                token.remove_callback(event.set)
+
+        with self._lock:
+            if token and token.cancelled and waiter.granted is False:
+                self._abandon(waiter)
+                raise GenerationCancelled(token.reason)
+        return lane
+
+    async def aacquire(self) -> str:
+        """Variante asyncio de acquire (notification par la boucle appelante)"""
+        lane = current_lane()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            if not future.done():
+                future.set_result(True)
+
+        waiter = _Waiter(lane, lambda: loop.call_soon_threadsafe(wake))
+        with self._lock:
+            if self._try_enter(waiter):
+                return lane
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                self._abandon(waiter)
+            raise
+        return lane
+
+    def release(self, lane: Optional[str]):
+        if lane is None:
+            return
+        with self._lock:
+            self._release_locked(lane)
+
+    @contextmanager
+    def slot(self):
+        """Bloc exécuté avec un slot de la voie courante"""
+        lane = self.acquire()
+        try:
+            yield lane
+        finally:
+            self.release(lane)
+
+    @staticmethod
+    def run_holding_slot(fn, *args):
+        """Appelle fn dans un contexte marqué comme détenteur d'un slot (sans ré-acquisition)"""
+        context = contextvars.copy_context()
+        context.run(_slot_held.set, True)
+        return context.run(fn, *args)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lanes = {}
+            for lane in LANES:
+                waits = sorted(self._wait_ms[lane])
+                lanes[lane] = {
+                    'in_use': self.in_use[lane],
+                    'waiting': len(self._waiters[lane]),
+                    'max_slots': self.limits[lane],
+                    'wait_ms_p50': round(waits[len(waits) // 2], 1) if waits else None,
+                    'wait_ms_p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 1) if waits else None,
+                    **self.stats[lane]
+                }
+
+        return {
+            'capacity': self.capacity,
+            'reserved_interactive': self.reserved_interactive,
+            'in_use': sum(lane['in_use'] for lane in lanes.values()),
+            'lanes': lanes
+        }
@@ -0,0 +1,94 @@
+# models/rag_cache.py - Cache du contexte RAG (insights entreprise et marché)
+
+import copy
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_company_name(company_name: str) -> str:
+    """Forme canonique d'un nom d'entreprise: minuscules, espaces réduits"""
+    return ' '.join((company_name or '').lower().split())
+
+
+class RAGContextCache:
+    """LRU mémoire des insights calculés sur la base de connaissances.
+
+    Chaque entrée retient la version de la base au moment du calcul:
+    dès que store_job insère une offre, la version augmente et l'entrée
+    est recalculée au prochain accès. Une génération enrichie ne coûte
+    donc plus qu'une lecture de version tant que la base n'a pas bougé.
+    Les valeurs rendues portent cached=True si elles viennent du cache
+    (leurs dates, comme last_updated, restent celles du calcul).
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries if max_entries is not None else Config.RAG_CONTEXT_CACHE_SIZE
+        self._entries = OrderedDict()  # (type, clé) -> (version, valeur)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0}
+
+    def get_or_compute(self, kind: str, key: str, version: int,
+                       compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Retourne la valeur en cache pour cette version (cached=True), sinon la calcule
+        et la mémorise (cached=False)"""
+        cache_key = (kind, key)
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(cache_key)
+                self.stats['hits'] += 1
+                return dict(copy.deepcopy(entry[1]), cached=True)
+            self.stats['stale' if entry is not None else 'misses'] += 1
+
+        value = compute()
+
+        # Les erreurs SQLite ne sont pas mémorisées
+        if 'error' not in value:
+            with self._lock:
+                current = self._entries.get(cache_key)
+                if current is None or current[0] <= version:
+                    self._entries[cache_key] = (version, copy.deepcopy(value))
+                    self._entries.move_to_end(cache_key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats['evictions'] += 1
+
+        return dict(value, cached=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            entries = len(self._entries)
+
+        lookups = stats['hits'] + stats['misses'] + stats['stale']
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'hit_rate': round(stats['hits'] / lookups, 3) if lookups else None,
+            **stats
+        }
+
+
+_cache: Optional[RAGContextCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_rag_context_cache() -> RAGContextCache:
+    """Cache partagé du processus (KnowledgeBase est instanciée à plusieurs endroits)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RAGContextCache()
+    return _cache
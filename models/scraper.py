@@ -13,6 +13,7 @@ from scrapers.wttj_scraper import WTTJScraper
 from scrapers.linkedin_scraper import LinkedInScraper  # ✅ NOUVEAU
 from models.embeddings import EmbeddingManager
 from models.knowledge_base import KnowledgeBase
+from models.priority_scheduler import BACKGROUND, priority_lane
 from config import Config
 
 logging.basicConfig(level=logging.INFO)
@@ -186,14 +187,6 @@ class ScrapingOrchestrator:
                         'experience_level': self.detect_experience_level(job.get('title', '') + ' ' + job.get('description', '')),
                         'technologies': self.extract_technologies(job.get('description', '') + ' ' + job.get('title', '')),
                     })
-                    
-                    # Génération d'embedding conditionnelle
-                    try:
-                        full_text = f"{clean_job['title']} {clean_job['company']} {clean_job['description']}"
-                        clean_job['embedding'] = await self.embedding_manager.generate_embedding(full_text)
-                    except Exception as e:
-                        logger.debug(f"Erreur embedding: {e}")
-                        clean_job['embedding'] = []
                 
                 processed.append(clean_job)
                 
@@ -205,6 +198,19 @@ class ScrapingOrchestrator:
                 self.add_log(f"❌ Erreur traitement offre {i+1}: {e}", 'error')
                 continue
         
+        # Embeddings de toutes les offres par lots /api/embed (voie de fond: cède le pas aux utilisateurs)
+        if self.ai_features_enabled and processed:
+            try:
+                texts = [f"{job['title']} {job['company']} {job['description']}" for job in processed]
+                with priority_lane(BACKGROUND):
+                    embeddings = await self.embedding_manager.generate_embeddings(texts)
+            except Exception as e:
+                logger.debug(f"Erreur embedding: {e}")
+                embeddings = [[] for _ in processed]
+            for job, embedding in zip(processed, embeddings):
+                job['embedding'] = embedding
+            self.add_log(f"🧠 {sum(1 for e in embeddings if e)}/{len(processed)} embeddings générés")
+        
         # Log du résumé par source
         for source, count in source_counts.items():
             self.add_log(f"📈 {source.upper()}: {count} offres traitées")
@@ -8,6 +8,7 @@ from scrapers.wttj_scraper import WTTJScraper
 from scrapers.linkedin_scraper import LinkedInScraper
 from scrapers.indeed_scraper import IndeedScraper
 from models.embeddings import EmbeddingManager
+from models.priority_scheduler import BACKGROUND, priority_lane
 from models.knowledge_base import KnowledgeBase
 from config import Config
 import os
@@ -182,21 +183,24 @@ class ScrapingManager:
                 # Génération d'un hash unique
                 clean_job['hash_id'] = self.generate_job_hash(clean_job)
                 
-                # Génération d'embedding pour le contenu complet
-                if hasattr(self.embedding_manager, 'generate_embedding'):
-                    full_text = f"{clean_job['title']} {clean_job['company']} {clean_job['description']}"
-                    try:
-                        embedding = await self.embedding_manager.generate_embedding(full_text)
-                        clean_job['embedding'] = embedding
-                    except Exception as e:
-                        logger.debug(f"Erreur génération embedding: {e}")
-                
                 processed.append(clean_job)
                 
             except Exception as e:
                 logger.error(f"Erreur traitement offre: {e}")
                 continue
         
+        # Embeddings du contenu complet, par lots /api/embed (voie de fond)
+        if processed and hasattr(self.embedding_manager, 'generate_embeddings'):
+            texts = [f"{job['title']} {job['company']} {job['description']}" for job in processed]
+            try:
+                with priority_lane(BACKGROUND):
+                    embeddings = await self.embedding_manager.generate_embeddings(texts)
+                for job, embedding in zip(processed, embeddings):
+                    if embedding:
+                        job['embedding'] = embedding
+            except Exception as e:
+                logger.debug(f"Erreur génération embeddings: {e}")
+        
         logger.info(f"✅ {len(processed)} offres traitées ({duplicates_removed} doublons supprimés)")
         return processed
     
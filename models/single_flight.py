@@ -0,0 +1,175 @@
+# models/single_flight.py - Fusion des requêtes Ollama identiques en vol
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, InvalidStateError, wait
+from typing import Any, Awaitable, Callable, Dict, Tuple, Type
+
+from models.cancellation import GenerationCancelled, current_cancellation
+
+# Résultat posé quand le leader abandonne (annulation): les suiveurs relancent l'appel
+_RELEASED = object()
+
+# Le dernier appel do/ado du contexte (thread ou tâche) a-t-il reçu le résultat d'un autre ?
+_last_coalesced = contextvars.ContextVar('single_flight_last_coalesced', default=False)
+
+
+def last_call_coalesced() -> bool:
+    """Vrai si le dernier appel fusionné du contexte a attendu un leader au lieu d'appeler l'amont"""
+    return _last_coalesced.get()
+
+
+class SingleFlight:
+    """Un seul appel amont par clé: les appels concurrents identiques attendent son résultat.
+
+    Les appels synchrones (threads Flask) et asynchrones (boucle du client
+    aiohttp) partagent la même table, donc une requête bloquante et une
+    requête async identiques sont aussi fusionnées.
+
+    Seuls les résultats et les erreurs de shared_errors (erreurs Ollama)
+    sont transmis aux suiveurs. Si le leader est annulé (client déconnecté,
+    job supprimé), la clé est libérée et un suiveur relance l'appel; un
+    suiveur annulé cesse d'attendre sans toucher à l'appel partagé.
+    """
+
+    def __init__(self, shared_errors: Tuple[Type[BaseException], ...] = ()):
+        self.shared_errors = shared_errors
+        self._flights: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'upstream_calls': 0,
+            'coalesced': 0,
+            'released': 0
+        }
+
+    @staticmethod
+    def make_key(path: str, payload: Dict[str, Any]) -> str:
+        canonical = json.dumps({'path': path, 'payload': payload}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _join_or_lead(self, key: str):
+        """Retourne (future, est_leader)"""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.stats['coalesced'] += 1
+                return future, False
+
+            future = Future()
+            self._flights[key] = future
+            self.stats['upstream_calls'] += 1
+            return future, True
+
+    def _land(self, key: str, future: Future, result: Any = None, error: BaseException = None):
+        with self._lock:
+            self._flights.pop(key, None)
+        if error is None:
+            future.set_result(result)
+        elif isinstance(error, self.shared_errors):
+            future.set_exception(error)
+        else:
+            # Annulation ou erreur propre au leader: les suiveurs reprennent l'appel
+            with self._lock:
+                self.stats['released'] += 1
+            future.set_result(_RELEASED)
+
+    @staticmethod
+    def _wait_sync(future: Future) -> Any:
+        """Attend le leader; un jeton d'annulation du contexte interrompt l'attente"""
+        token = current_cancellation()
+        if token is None:
+            return future.result()
+
+        abandoned = Future()
+
+        def on_cancel():
+            try:
+                abandoned.set_result(None)
+            except InvalidStateError:
+                pass
+
+        token.add_callback(on_cancel)
+        try:
+            wait([future, abandoned], return_when=FIRST_COMPLETED)
+        finally:
+            token.remove_callback(on_cancel)
+        if not future.done():
+            raise GenerationCancelled(token.reason)
+        return future.result()
+
+    @staticmethod
+    async def _wait_async(future: Future) -> Any:
+        """Attente async; shield: annuler ce suiveur n'annule pas le Future partagé"""
+        waiter = asyncio.ensure_future(asyncio.shield(asyncio.wrap_future(future)))
+        token = current_cancellation()
+        if token is None:
+            return await waiter
+
+        loop = asyncio.get_running_loop()
+        abandoned = loop.create_future()
+
+        def on_cancel():
+            loop.call_soon_threadsafe(lambda: abandoned.done() or abandoned.set_result(None))
+
+        token.add_callback(on_cancel)
+        try:
+            await asyncio.wait([waiter, abandoned], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            token.remove_callback(on_cancel)
+            abandoned.cancel()
+            if not waiter.done():
+                waiter.cancel()
+        if waiter.cancelled():
+            raise GenerationCancelled(token.reason)
+        return waiter.result()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Version synchrone: exécute fn() ou attend l'appel identique déjà en cours"""
+        while True:
+            future, leader = self._join_or_lead(key)
+            if leader:
+                break
+            result = self._wait_sync(future)
+            if result is not _RELEASED:
+                _last_coalesced.set(True)
+                return result
+
+        _last_coalesced.set(False)
+        try:
+            result = fn()
+        except BaseException as e:
+            self._land(key, future, error=e)
+            raise
+        self._land(key, future, result=result)
+        return result
+
+    async def ado(self, key: str, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Version async: même table que do(), attente non bloquante"""
+        while True:
+            future, leader = self._join_or_lead(key)
+            if leader:
+                break
+            result = await self._wait_async(future)
+            if result is not _RELEASED:
+                _last_coalesced.set(True)
+                return result
+
+        _last_coalesced.set(False)
+        try:
+            result = await coro_factory()
+        except BaseException as e:
+            self._land(key, future, error=e)
+            raise
+        self._land(key, future, result=result)
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self._flights)
+        total = stats['upstream_calls'] + stats['coalesced']
+        stats['coalesced_percentage'] = round(stats['coalesced'] / total * 100, 1) if total else 0.0
+        return stats
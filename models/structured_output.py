@@ -0,0 +1,221 @@
+# models/structured_output.py - Sortie JSON contrainte (schémas, parsing incrémental, réparation)
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+PROFILE_ANALYSIS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'score_global': {'type': 'string'},
+        'points_forts': {'type': 'array', 'items': {'type': 'string'}},
+        'points_amelioration': {'type': 'array', 'items': {'type': 'string'}},
+        'titre_suggere': {'type': 'string'},
+        'resume_optimise': {'type': 'string'},
+        'mots_cles_manquants': {'type': 'array', 'items': {'type': 'string'}},
+        'recommandations_urgentes': {'type': 'array', 'items': {'type': 'string'}}
+    },
+    'required': ['score_global', 'points_forts', 'points_amelioration', 'titre_suggere',
+                 'resume_optimise', 'mots_cles_manquants', 'recommandations_urgentes']
+}
+
+# Schéma passé dans "format" par type de contenu: Ollama contraint alors le
+# décodage et la réponse est un JSON valide, sauf troncature à num_predict
+OUTPUT_SCHEMAS = {
+    'profile_analysis': PROFILE_ANALYSIS_SCHEMA,
+    'profile_analysis_repair': PROFILE_ANALYSIS_SCHEMA
+}
+
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+class IncrementalJSONParser:
+    """Parse un objet JSON au fil des tokens et expose les champs déjà lisibles.
+
+    Le scanner retient, pour chaque position où une valeur vient de se
+    terminer, la pile des conteneurs ouverts: fermer ces conteneurs donne
+    toujours un JSON valide. Une chaîne en cours d'écriture (le résumé,
+    par exemple) est refermée telle quelle pour être affichée en partiel.
+    Le texte qui précède la première accolade (bloc ```json...) est ignoré.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.completed_fields: List[str] = []
+        self._started = False
+        self._frames = []  # [type, attendu] avec attendu parmi key/colon/value/comma
+        self._in_string = False
+        self._escape = False
+        self._string_is_key = False
+        self._string_start = 0
+        self._top_key = None
+        self._safe = None  # (position, types des conteneurs ouverts)
+        self._snapshot = {}
+
+    @property
+    def complete(self) -> bool:
+        return self._started and not self._frames
+
+    def feed(self, text: str) -> Dict[str, Any]:
+        """Ajoute un morceau de réponse; retourne les champs lisibles à ce stade"""
+        start = len(self.buffer)
+        self.buffer += text
+        for pos in range(start, len(self.buffer)):
+            self._scan(pos, self.buffer[pos])
+        return self.snapshot()
+
+    def _value_done(self, end: int):
+        """Une valeur se termine juste avant end"""
+        if not self._frames:
+            return
+        frame = self._frames[-1]
+        frame[1] = 'comma'
+        if len(self._frames) == 1 and frame[0] == '{' and self._top_key is not None:
+            if self._top_key not in self.completed_fields:
+                self.completed_fields.append(self._top_key)
+        self._safe = (end, tuple(f[0] for f in self._frames))
+
+    def _scan(self, pos: int, char: str):
+        if not self._started:
+            if char != '{':
+                return
+            self._started = True
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == '\\':
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._string_is_key:
+                    self._frames[-1][1] = 'colon'
+                    if len(self._frames) == 1:
+                        try:
+                            self._top_key = json.loads(self.buffer[self._string_start:pos + 1])
+                        except ValueError:
+                            self._top_key = None
+                else:
+                    self._value_done(pos + 1)
+            return
+
+        if not self._frames and self._safe is not None:
+            return  # objet racine déjà fermé: la suite est ignorée
+
+        frame = self._frames[-1] if self._frames else None
+        if char in '{[':
+            self._frames.append([char, 'key' if char == '{' else 'value'])
+            self._safe = (pos + 1, tuple(f[0] for f in self._frames))
+        elif char in '}]':
+            if frame:
+                self._literal_done(pos)
+                self._frames.pop()
+                self._value_done(pos + 1)
+                if not self._frames:
+                    self._safe = (pos + 1, ())
+        elif char == '"':
+            self._in_string = True
+            self._string_start = pos
+            self._string_is_key = bool(frame) and frame[0] == '{' and frame[1] == 'key'
+        elif char == ':':
+            if frame:
+                frame[1] = 'value'
+        elif char == ',':
+            if frame:
+                self._literal_done(pos)
+                frame[1] = 'key' if frame[0] == '{' else 'value'
+        elif not char.isspace() and frame and frame[1] == 'value':
+            frame[1] = 'literal'
+
+    def _literal_done(self, pos: int):
+        """Nombre / true / false / null terminé par le séparateur en pos"""
+        if self._frames and self._frames[-1][1] == 'literal':
+            self._value_done(pos)
+
+    def _candidates(self) -> List[str]:
+        candidates = []
+        if self._in_string and not self._string_is_key:
+            text = self.buffer[:-1] if self._escape else self.buffer
+            candidates.append(text + '"' + ''.join(_CLOSERS[f[0]] for f in reversed(self._frames)))
+        if self._safe is not None:
+            end, frames = self._safe
+            candidates.append(self.buffer[:end] + ''.join(_CLOSERS[f] for f in reversed(frames)))
+        return candidates
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Dernier état lisible (les champs en cours peuvent être incomplets)"""
+        for candidate in self._candidates():
+            try:
+                value = json.loads(candidate[candidate.index('{'):])
+            except ValueError:
+                continue
+            if isinstance(value, dict):
+                self._snapshot = value
+                break
+        return dict(self._snapshot)
+
+
+def repair_json(text: str) -> Optional[Dict[str, Any]]:
+    """Réparation locale, sans appel au modèle, d'un objet JSON mal formé.
+
+    Couvre les défauts courants d'une sortie libre ou tronquée: bloc
+    markdown autour du JSON, virgules finales, guillemets typographiques
+    et conteneurs non refermés (génération coupée à num_predict).
+    """
+    if not text:
+        return None
+
+    cleaned = re.sub(r'```(?:json)?', '', text)
+    cleaned = cleaned.replace('“', '"').replace('”', '"')
+    cleaned = re.sub(r',\s*([}\]])', r'\1', cleaned)
+
+    start = cleaned.find('{')
+    if start < 0:
+        return None
+
+    try:
+        value, _ = json.JSONDecoder().raw_decode(cleaned[start:])
+        if isinstance(value, dict):
+            return value
+    except ValueError:
+        pass
+
+    parser = IncrementalJSONParser()
+    value = parser.feed(cleaned[start:])
+    return value or None
+
+
+def _coerce(value: Any, schema: Dict[str, Any]) -> Any:
+    """Ramène une valeur au type attendu (liste <-> texte, nombre -> texte)"""
+    kind = schema.get('type')
+    if kind == 'array':
+        if isinstance(value, list):
+            return [_coerce(item, schema.get('items', {})) for item in value if item not in (None, '')]
+        if isinstance(value, str):
+            return [part.strip(' -•') for part in re.split(r'[\n;]', value) if part.strip(' -•')]
+        return [] if value is None else [_coerce(value, schema.get('items', {}))]
+    if kind == 'string':
+        if isinstance(value, list):
+            return ', '.join(str(item) for item in value)
+        if isinstance(value, dict):
+            return json.dumps(value, ensure_ascii=False)
+        return '' if value is None else str(value)
+    return value
+
+
+def conform_to_schema(data: Dict[str, Any], schema: Dict[str, Any],
+                      defaults: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """Types du schéma sur les champs présents, valeurs par défaut pour les manquants.
+
+    Retourne (objet conforme, champs requis absents ou vides).
+    """
+    result = dict(data)
+    missing = []
+    for key, sub_schema in schema.get('properties', {}).items():
+        value = _coerce(data.get(key), sub_schema) if key in data else None
+        if value in (None, '', []):
+            if key in schema.get('required', []):
+                missing.append(key)
+            value = defaults.get(key, value)
+        result[key] = value
+    return result, missing
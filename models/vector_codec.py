@@ -0,0 +1,30 @@
+# models/vector_codec.py - Format binaire des vecteurs d'embedding
+
+import json
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+# float32 petit-boutiste: 4 octets par composante, indépendant de la machine
+VECTOR_DTYPE = np.dtype('<f4')
+
+
+def encode_vector(embedding: Sequence[float]) -> Tuple[bytes, int]:
+    """Sérialise un vecteur en octets float32; retourne (blob, dimension)"""
+    vector = np.asarray(embedding, dtype=VECTOR_DTYPE).ravel()
+    return vector.tobytes(), int(vector.shape[0])
+
+
+def decode_vector(blob: bytes, dim: int) -> np.ndarray:
+    """Vue NumPy en lecture seule sur le blob (aucune copie ni parsing)"""
+    return np.frombuffer(blob, dtype=VECTOR_DTYPE, count=dim)
+
+
+def decode_stored(blob, dim: Optional[int]) -> np.ndarray:
+    """Décode un embedding stocké: binaire si la dimension est connue, sinon ancien JSON"""
+    if dim is not None:
+        return decode_vector(blob, dim)
+    if isinstance(blob, (bytes, bytearray, memoryview)):
+        blob = bytes(blob).decode('utf-8')
+    return np.asarray(json.loads(blob), dtype=VECTOR_DTYPE)
+
@@ -0,0 +1,571 @@
+# models/vector_store.py - Segments de vecteurs mappés en mémoire, partagés entre processus
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+from models.ivf import LIST_DTYPE, assign_lists, default_nlist, inverted_lists, train_centroids
+from models.vector_codec import VECTOR_DTYPE
+
+try:
+    import fcntl
+except ImportError:  # Windows: verrou d'écriture limité au processus courant
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ID_DTYPE = np.dtype('<i8')
+
+
+def store_directory(*parts: str) -> str:
+    """Dossier d'un magasin sous VECTOR_STORE_DIR (noms de modèles rendus sûrs pour le disque)"""
+    return os.path.join(Config.VECTOR_STORE_DIR, *(re.sub(r'[^\w.-]', '_', part) for part in parts))
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Normalisation L2 (ligne par ligne): le cosinus devient un produit scalaire"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.where(norms == 0, 1.0, norms)).astype(VECTOR_DTYPE, copy=False)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices des k meilleurs scores, triés par score décroissant (argpartition puis tri de k)"""
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class _Segment:
+    """Vue mappée d'un segment: vecteurs normalisés, identifiants, lignes supprimées
+    et, une fois l'IVF entraîné, liste de chaque ligne"""
+
+    __slots__ = ('name', 'count', 'vectors', 'ids', 'deleted', 'mask', 'lists', 'inverted')
+
+    def __init__(self, name: str, count: int, vectors: np.ndarray, ids: np.ndarray, deleted: List[int],
+                 lists: np.ndarray = None, inverted: Tuple[np.ndarray, np.ndarray] = None):
+        self.name = name
+        self.count = count
+        self.vectors = vectors
+        self.ids = ids
+        self.deleted = len(deleted)
+        self.mask = None
+        if deleted:
+            self.mask = np.zeros(count, dtype=bool)
+            self.mask[deleted] = True
+        self.lists = lists
+        self.inverted = inverted
+
+    def probe(self, lists: np.ndarray, nlist: int) -> np.ndarray:
+        """Lignes rangées dans les listes sondées, par ordre croissant (accès séquentiel au mapping)"""
+        if self.inverted is None:
+            self.inverted = inverted_lists(self.lists, nlist)
+        order, offsets = self.inverted
+        return np.sort(np.concatenate([order[offsets[l]:offsets[l + 1]] for l in lists]))
+
+
+class SegmentedVectorStore:
+    """Vecteurs persistés en segments ajout-seul, lus par np.memmap.
+
+    Chaque segment est une paire de fichiers bruts (<nom>.vec en float32
+    normalisé, <nom>.ids en int64); manifest.json liste les segments, leur
+    nombre de lignes valides et les lignes supprimées. Un écrivain ajoute
+    les lignes en fin de segment puis remplace le manifeste de façon
+    atomique: un lecteur ne voit jamais que des lignes complètes.
+
+    Les segments étant mappés en lecture seule, tous les processus du nœud
+    (workers gunicorn) partagent les mêmes pages du cache système: un
+    nouveau worker lit le manifeste et cherche aussitôt, sans chargement.
+    Réinsérer ou supprimer un identifiant masque son ancienne ligne; la
+    compaction réécrit les lignes vivantes dans de nouveaux segments dès
+    que la part de lignes mortes dépasse compact_dead_ratio.
+
+    Sur activation (ann_min_rows > 0, recherche exacte sinon), au-delà de
+    ann_min_rows vecteurs, un k-means partitionne l'espace en
+    listes (IVF): chaque segment reçoit un fichier <nom>.g<génération>.lst
+    donnant la liste de chaque ligne, complété à chaque ajout. Une recherche
+    ne parcourt alors que les nprobe listes les plus proches de la requête.
+    Les lignes ajoutées après l'entraînement sont rangées dans les listes
+    existantes; un réentraînement (nouvelle génération de fichiers) a lieu
+    quand le nombre de vecteurs a quadruplé.
+    """
+
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, directory: str, segment_max_rows: int = None, compact_dead_ratio: float = None,
+                 ann_min_rows: int = None, nprobe: int = None):
+        self.directory = directory
+        self.segment_max_rows = segment_max_rows or Config.VECTOR_SEGMENT_MAX_ROWS
+        self.compact_dead_ratio = (compact_dead_ratio if compact_dead_ratio is not None
+                                   else Config.VECTOR_COMPACT_DEAD_RATIO)
+        self.ann_min_rows = ann_min_rows if ann_min_rows is not None else Config.VECTOR_ANN_MIN_ROWS
+        self.nprobe = nprobe or Config.VECTOR_ANN_NPROBE
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._manifest = self._empty_manifest()
+        self._manifest_key = None
+        self._segments: Dict[str, _Segment] = {}
+        self._generation = None
+        self._centroids = None
+        self._ann_logged = False
+        self.stats = {'appended': 0, 'deleted': 0, 'compactions': 0, 'trainings': 0,
+                      'searches': 0, 'ann_searches': 0}
+
+    # ------------------------------------------------------------------
+    # Manifeste et segments mappés
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _empty_manifest() -> Dict[str, Any]:
+        return {'format': 1, 'dim': None, 'version': 0, 'next_segment': 1,
+                'segments': [], 'deleted': {}, 'source_last_id': 0, 'ann': None}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def _lists_suffix(generation: int) -> str:
+        return f"g{generation:06d}.lst"
+
+    @staticmethod
+    def _centroids_file(generation: int) -> str:
+        return f"ivf-g{generation:06d}.ctr"
+
+    def _map_centroids(self, ann: Dict[str, Any], dim: int) -> np.ndarray:
+        if ann['generation'] == self._generation and self._centroids is not None:
+            return self._centroids
+        return np.memmap(self._path(self._centroids_file(ann['generation'])), dtype=VECTOR_DTYPE,
+                         mode='r', shape=(ann['nlist'], dim))
+
+    def _refresh(self, force: bool = False):
+        """Relit le manifeste s'il a été remplacé (par ce processus ou un autre)"""
+        with self._lock:
+            try:
+                stat = os.stat(self._path(self.MANIFEST))
+            except FileNotFoundError:
+                return
+            key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if key == self._manifest_key and not force:
+                return
+
+            with open(self._path(self.MANIFEST), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self._manifest_key = key
+            self._manifest = manifest
+            self._map_segments(manifest)
+
+    def _map_segments(self, manifest: Dict[str, Any]):
+        dim = manifest['dim']
+        ann = manifest.get('ann')
+        generation = ann['generation'] if ann else None
+        centroids = self._map_centroids(ann, dim) if ann else None
+
+        segments = {}
+        for entry in manifest['segments']:
+            name, count = entry['name'], entry['count']
+            if not count:
+                continue
+            deleted = manifest['deleted'].get(name, [])
+            cached = self._segments.get(name)
+            lists = inverted = None
+            if cached is not None and cached.count == count:
+                vectors, ids = cached.vectors, cached.ids
+                if generation == self._generation:
+                    lists, inverted = cached.lists, cached.inverted
+            else:
+                vectors = np.memmap(self._path(f"{name}.vec"), dtype=VECTOR_DTYPE, mode='r', shape=(count, dim))
+                ids = np.memmap(self._path(f"{name}.ids"), dtype=ID_DTYPE, mode='r', shape=(count,))
+            if ann and lists is None:
+                lists = np.memmap(self._path(f"{name}.{self._lists_suffix(generation)}"), dtype=LIST_DTYPE,
+                                  mode='r', shape=(count,))
+            segments[name] = _Segment(name, count, vectors, ids, deleted, lists, inverted)
+
+        self._segments = segments
+        self._generation = generation
+        self._centroids = centroids
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        """Remplacement atomique (os.replace): les lecteurs voient l'ancien ou le nouveau"""
+        manifest['version'] += 1
+        temp_path = self._path(f"{self.MANIFEST}.{os.getpid()}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self._path(self.MANIFEST))
+        self._refresh(force=True)
+
+    @contextmanager
+    def _exclusive(self):
+        """Verrou d'écriture entre threads et, sous POSIX, entre processus"""
+        with self._lock:
+            if fcntl is None:
+                self._refresh()
+                yield json.loads(json.dumps(self._manifest))
+                return
+            with open(self._path('.lock'), 'a') as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    yield json.loads(json.dumps(self._manifest))
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _write_at(path: str, data: np.ndarray, offset: int):
+        """Écrit data à partir de l'octet offset, tronque la suite et synchronise le disque"""
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.seek(offset)
+            f.write(data.tobytes())
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_rows(self, manifest: Dict[str, Any], vectors: np.ndarray, ids: np.ndarray):
+        """Ajoute des lignes au dernier segment, en ouvrant de nouveaux segments s'il est plein"""
+        ann = manifest.get('ann')
+        centroids = self._map_centroids(ann, manifest['dim']) if ann else None
+        offset = 0
+        while offset < len(vectors):
+            segments = manifest['segments']
+            if not segments or segments[-1]['count'] >= self.segment_max_rows:
+                segments.append({'name': f"seg-{manifest['next_segment']:06d}", 'count': 0})
+                manifest['next_segment'] += 1
+            entry = segments[-1]
+            part = slice(offset, offset + self.segment_max_rows - entry['count'])
+
+            # Écriture à la position des lignes valides: des octets laissés par un
+            # écrivain interrompu avant la mise à jour du manifeste sont écrasés
+            files = [('vec', vectors[part]), ('ids', ids[part])]
+            if ann:
+                files.append((self._lists_suffix(ann['generation']), assign_lists(vectors[part], centroids)))
+            for suffix, data in files:
+                self._write_at(self._path(f"{entry['name']}.{suffix}"), data, entry['count'] * data[:1].nbytes)
+
+            written = len(vectors[part])
+            entry['count'] += written
+            offset += written
+
+    def _tombstone(self, manifest: Dict[str, Any], ids: np.ndarray) -> int:
+        """Masque les lignes existantes portant ces identifiants"""
+        masked = 0
+        for segment in self._segments.values():
+            rows = np.nonzero(np.isin(segment.ids, ids))[0]
+            if not len(rows):
+                continue
+            deleted = set(manifest['deleted'].get(segment.name, []))
+            new_rows = [int(row) for row in rows if int(row) not in deleted]
+            if new_rows:
+                manifest['deleted'][segment.name] = sorted(deleted.union(new_rows))
+                masked += len(new_rows)
+        return masked
+
+    def append(self, ids: Sequence[int], vectors: Sequence[Sequence[float]],
+               source_last_id: int = None) -> int:
+        """Ajoute (ou remplace) des vecteurs; ceux d'une autre dimension sont ignorés.
+
+        source_last_id mémorise dans le manifeste jusqu'où la source
+        (table SQLite) a été indexée.
+        """
+        latest = {}
+        for row_id, vector in zip(ids, vectors):
+            latest[int(row_id)] = np.asarray(vector, dtype=VECTOR_DTYPE).ravel()
+
+        with self._exclusive() as manifest:
+            dim = manifest['dim'] or next((v.size for v in latest.values() if v.size), None)
+            rows = [(row_id, vector) for row_id, vector in latest.items() if vector.size == dim]
+
+            if rows:
+                id_block = np.asarray([row_id for row_id, _ in rows], dtype=ID_DTYPE)
+                self._tombstone(manifest, id_block)
+                manifest['dim'] = dim
+                self._write_rows(manifest, normalize_rows(np.stack([v for _, v in rows])), id_block)
+            if source_last_id is not None:
+                manifest['source_last_id'] = max(manifest['source_last_id'], int(source_last_id))
+            if rows or source_last_id is not None:
+                self._write_manifest(manifest)
+            self.stats['appended'] += len(rows)
+
+        self.maybe_compact()
+        self.maybe_train()
+        return len(rows)
+
+    def delete(self, ids: Sequence[int]) -> int:
+        with self._exclusive() as manifest:
+            masked = self._tombstone(manifest, np.asarray(list(ids), dtype=ID_DTYPE))
+            if masked:
+                self._write_manifest(manifest)
+            self.stats['deleted'] += masked
+
+        self.maybe_compact()
+        return masked
+
+    def needs_compaction(self) -> bool:
+        self._refresh()
+        with self._lock:
+            total = sum(entry['count'] for entry in self._manifest['segments'])
+            dead = sum(len(rows) for rows in self._manifest['deleted'].values())
+        return bool(total) and dead / total > self.compact_dead_ratio
+
+    def maybe_compact(self) -> bool:
+        if not self.needs_compaction():
+            return False
+        self.compact()
+        return True
+
+    def compact(self) -> Dict[str, Any]:
+        """Réécrit les lignes vivantes dans de nouveaux segments pleins.
+
+        Les anciens fichiers sont supprimés après le nouveau manifeste; un
+        processus qui les a encore mappés garde sa vue jusqu'à sa prochaine
+        lecture du manifeste (sous Windows, ils sont retirés plus tard).
+        """
+        with self._exclusive() as manifest:
+            old_segments = list(self._segments.values())
+            compacted = dict(manifest, segments=[], deleted={})
+            before = sum(segment.count for segment in old_segments)
+
+            for segment in old_segments:
+                live = slice(None) if segment.mask is None else ~segment.mask
+                vectors, ids = np.asarray(segment.vectors[live]), np.asarray(segment.ids[live])
+                if len(ids):
+                    self._write_rows(compacted, vectors, ids)
+
+            self._write_manifest(compacted)
+            self._remove_orphans()
+            self.stats['compactions'] += 1
+            after = sum(entry['count'] for entry in compacted['segments'])
+
+        logger.info(f"🗜️ Compaction des vecteurs {self.directory}: {before} → {after} lignes")
+        return {'rows_before': before, 'rows_after': after, 'segments': len(compacted['segments'])}
+
+    def needs_training(self) -> bool:
+        """Premier entraînement au-delà de ann_min_rows, puis à chaque quadruplement"""
+        if not self.ann_min_rows:
+            return False
+        live = len(self)
+        ann = self._manifest.get('ann')
+        if ann is None:
+            return live >= self.ann_min_rows
+        return live >= 4 * ann['trained_rows']
+
+    def maybe_train(self) -> bool:
+        if not self.needs_training():
+            return False
+        return bool(self.train(if_needed=True))
+
+    def train(self, nlist: int = None, sample_size: int = None, seed: int = 0,
+              if_needed: bool = False) -> Dict[str, Any]:
+        """Entraîne les centroïdes IVF sur un échantillon et range toutes les lignes.
+
+        Centroïdes et listes sont écrits sous une nouvelle génération de
+        fichiers: un lecteur garde l'ancienne jusqu'au manifeste suivant.
+        """
+        started = time.monotonic()
+        with self._exclusive() as manifest:
+            if if_needed and not self.needs_training():
+                return {}  # entraîné entre-temps par un autre processus
+            segments = list(self._segments.values())
+            live = [np.arange(segment.count) if segment.mask is None else np.nonzero(~segment.mask)[0]
+                    for segment in segments]
+            total = sum(len(rows) for rows in live)
+            if not total:
+                return {}
+
+            nlist = min(nlist or Config.VECTOR_ANN_NLIST or default_nlist(total), total)
+            sample_size = min(total, sample_size or max(nlist * 32, 10000))
+            picks = np.sort(np.random.default_rng(seed).choice(total, sample_size, replace=False))
+            bounds = np.cumsum([0] + [len(rows) for rows in live])
+            sample = np.concatenate([
+                np.asarray(segment.vectors[rows[picks[(picks >= low) & (picks < high)] - low]])
+                for segment, rows, low, high in zip(segments, live, bounds[:-1], bounds[1:])
+            ])
+            centroids = train_centroids(sample, nlist, seed=seed)
+
+            ann = manifest.get('ann')
+            generation = (ann['generation'] if ann else 0) + 1
+            self._write_at(self._path(self._centroids_file(generation)), centroids, 0)
+            for segment in segments:
+                self._write_at(self._path(f"{segment.name}.{self._lists_suffix(generation)}"),
+                               assign_lists(segment.vectors, centroids), 0)
+
+            manifest['ann'] = {'generation': generation, 'nlist': len(centroids), 'trained_rows': total}
+            self._write_manifest(manifest)
+            self._remove_orphans()
+            self.stats['trainings'] += 1
+
+        elapsed = time.monotonic() - started
+        logger.info(f"🧭 Index IVF {self.directory}: {len(centroids)} listes, {total} vecteurs ({elapsed:.1f}s)")
+        return {'nlist': len(centroids), 'rows': total, 'generation': generation, 'seconds': round(elapsed, 2)}
+
+    def _remove_orphans(self):
+        """Supprime les fichiers de segments et d'IVF absents du manifeste"""
+        ann = self._manifest.get('ann')
+        listed = set()
+        for entry in self._manifest['segments']:
+            listed.update((f"{entry['name']}.vec", f"{entry['name']}.ids"))
+            if ann:
+                listed.add(f"{entry['name']}.{self._lists_suffix(ann['generation'])}")
+        if ann:
+            listed.add(self._centroids_file(ann['generation']))
+
+        for filename in os.listdir(self.directory):
+            if filename.startswith(('seg-', 'ivf-')) and filename not in listed:
+                try:
+                    os.remove(self._path(filename))
+                except OSError as e:
+                    logger.debug(f"Fichier {filename} encore ouvert, suppression différée: {e}")
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+
+    @property
+    def dim(self) -> Optional[int]:
+        self._refresh()
+        return self._manifest['dim']
+
+    @property
+    def source_last_id(self) -> int:
+        self._refresh()
+        return self._manifest['source_last_id']
+
+    def __len__(self) -> int:
+        self._refresh()
+        with self._lock:
+            return sum(segment.count - segment.deleted for segment in self._segments.values())
+
+    def search(self, query: Sequence[float], k: int = 10, threshold: float = None,
+               nprobe: int = None) -> List[Tuple[int, float]]:
+        """k identifiants les plus proches (cosinus décroissant), au-dessus du seuil éventuel.
+
+        Une fois l'IVF entraîné et la recherche approchée activée (ann_min_rows),
+        seules les nprobe listes les plus proches sont parcourues (self.nprobe par
+        défaut); un nprobe explicite l'impose, nprobe >= nlist donne la recherche exacte.
+        """
+        self._refresh()
+        with self._lock:
+            segments = list(self._segments.values())
+            dim = self._manifest['dim']
+            centroids = self._centroids
+
+        query = np.asarray(query, dtype=VECTOR_DTYPE).ravel()
+        if k <= 0 or dim is None or query.shape != (dim,):
+            return []
+        query = normalize_rows(query)
+        self.stats['searches'] += 1
+
+        probe = None
+        if nprobe is None and self.ann_min_rows:
+            nprobe = self.nprobe
+        if centroids is not None and nprobe and nprobe < len(centroids):
+            probe = top_k(np.asarray(centroids @ query), nprobe)
+            self.stats['ann_searches'] += 1
+            if not self._ann_logged:
+                self._ann_logged = True
+                logger.warning(f"🧭 Recherche approchée IVF active sur {self.directory}: "
+                               f"{nprobe}/{len(centroids)} listes par requête, rappel < 100% "
+                               f"(à mesurer avec benchmark_vector_search.py)")
+
+        scores, ids = [], []
+        for segment in segments:
+            if probe is not None and segment.lists is not None:
+                rows = segment.probe(probe, len(centroids))
+                vectors, row_ids = segment.vectors[rows], segment.ids[rows]
+                mask = segment.mask[rows] if segment.mask is not None else None
+            else:
+                vectors, row_ids, mask = segment.vectors, segment.ids, segment.mask
+            segment_scores = np.asarray(vectors @ query)
+            if mask is not None:
+                segment_scores[mask] = -np.inf
+            best = top_k(segment_scores, k)
+            scores.append(segment_scores[best])
+            ids.append(np.asarray(row_ids[best]))
+
+        if not scores:
+            return []
+        scores, ids = np.concatenate(scores), np.concatenate(ids)
+        results = []
+        for index in top_k(scores, k):
+            score = float(scores[index])
+            if score == -np.inf or (threshold is not None and score < threshold):
+                break
+            results.append((int(ids[index]), score))
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._refresh()
+        with self._lock:
+            manifest = self._manifest
+            rows = sum(entry['count'] for entry in manifest['segments'])
+            dead = sum(len(deleted) for deleted in manifest['deleted'].values())
+        return {
+            'type': 'mmap_segments',
+            'directory': self.directory,
+            'dim': manifest['dim'],
+            'version': manifest['version'],
+            'segments': len(manifest['segments']),
+            'vectors': rows - dead,
+            'deleted_rows': dead,
+            'mapped_mb': round(rows * (manifest['dim'] or 0) * VECTOR_DTYPE.itemsize / 1024 / 1024, 2),
+            'source_last_id': manifest['source_last_id'],
+            'ann': dict(manifest['ann'], nprobe=self.nprobe, active=bool(self.ann_min_rows))
+                   if manifest.get('ann') else None,
+            **self.stats
+        }
+
+
+def sync_from_sqlite(store: SegmentedVectorStore, db_path: str, table: str, columns: str,
+                     condition: str = '1', params: Sequence[Any] = (),
+                     decode: Callable[..., Sequence[float]] = json.loads,
+                     batch_size: int = 5000) -> SegmentedVectorStore:
+    """Ajoute au magasin les lignes de `table` qu'il n'a pas encore (id > source_last_id).
+
+    decode(*colonnes) rend le vecteur d'une ligne retenue par `condition`;
+    une ligne illisible est ignorée. Une fois à jour, le coût se limite à
+    la lecture de MAX(id).
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT MAX(id) FROM {table}')
+        max_id = cursor.fetchone()[0] or 0
+        last_id = store.source_last_id
+
+        while last_id < max_id:
+            cursor.execute(f'''
+                SELECT id, {columns} FROM {table}
+                WHERE id > ? AND id <= ? AND ({condition})
+                ORDER BY id LIMIT ?
+            ''', (last_id, max_id, *params, batch_size))
+            rows = cursor.fetchall()
+
+            ids, vectors = [], []
+            for row_id, *values in rows:
+                try:
+                    vectors.append(decode(*values))
+                    ids.append(row_id)
+                except (ValueError, UnicodeDecodeError) as e:
+                    logger.debug(f"Embedding illisible ignoré ({table} {row_id}): {e}")
+
+            last_id = rows[-1][0] if rows else max_id
+            store.append(ids, vectors, source_last_id=last_id)
+    finally:
+        conn.close()
+
+    return store
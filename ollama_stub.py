@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+# ollama_stub.py - Serveur Ollama factice pour les tests et benchmarks hors ligne
+
+"""
+Remplaçant local d'Ollama (bibliothèque standard uniquement).
+
+Endpoints: /api/tags, /api/ps, /api/version, /api/pull, /api/generate et
+/api/chat (streaming ou non, JSON via "format"), /api/embeddings, /api/embed.
+Statistiques du stub: GET /stub/stats.
+
+Latence, débit en tokens/s, temps de chargement des modèles et taux
+d'erreur sont configurables; les embeddings sont déterministes (deux
+textes proches donnent des vecteurs proches).
+
+Usage:
+    python ollama_stub.py --port 11435 --tokens-per-second 40 --failure-rate 0.05
+    OLLAMA_BASE_URL=http://localhost:11435 python app.py
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+DEFAULT_MODELS = ['mistral:latest', 'nomic-embed-text:latest']
+
+# Vocabulaire des réponses générées (texte plausible, déterministe)
+WORDS = (
+    "Bonjour je serais ravi d'échanger avec vous sur votre parcours et vos projets "
+    "mon expérience en développement Python et data m'a permis de mener des projets "
+    "ambitieux au sein d'équipes agiles votre entreprise attire mon attention pour "
+    "sa culture d'innovation et je souhaiterais contribuer à vos prochains défis "
+    "n'hésitez pas à me contacter pour en discuter cordialement"
+).split()
+
+
+class StubSettings:
+    """Comportement du stub (modifiable à chaud via POST /stub/config)"""
+
+    def __init__(self, **options):
+        self.models = list(options.get('models') or DEFAULT_MODELS)
+        self.latency_ms = float(options.get('latency_ms', 20))
+        self.latency_spread_ms = float(options.get('latency_spread_ms', 10))
+        self.latency_dist = options.get('latency_dist', 'normal')
+        self.tokens_per_second = float(options.get('tokens_per_second', 50))
+        self.prompt_tokens_per_second = float(options.get('prompt_tokens_per_second', 500))
+        self.max_tokens = int(options.get('max_tokens', 120))
+        self.load_ms = float(options.get('load_ms', 0))
+        self.embedding_dim = int(options.get('embedding_dim', 768))
+        self.embed_ms_per_input = float(options.get('embed_ms_per_input', 5))
+        self.failure_rate = float(options.get('failure_rate', 0.0))
+        self.failure_status = int(options.get('failure_status', 503))
+        self.hang_rate = float(options.get('hang_rate', 0.0))
+        self.hang_seconds = float(options.get('hang_seconds', 120))
+        self.realtime = bool(options.get('realtime', True))
+        self.random = random.Random(options.get('seed'))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: v for k, v in self.__dict__.items() if k != 'random'}
+
+    def update(self, values: Dict[str, Any]):
+        for key, value in values.items():
+            if key in self.__dict__ and key != 'random':
+                setattr(self, key, value)
+
+
+class StubState:
+    """Modèles chargés (keep_alive) et compteurs de requêtes"""
+
+    def __init__(self, settings: StubSettings):
+        self.settings = settings
+        self.lock = threading.Lock()
+        self.loaded: Dict[str, float] = {}  # modèle -> expiration (epoch)
+        self.in_flight = 0
+        self.stats: Dict[str, Any] = {'requests': {}, 'failures_injected': 0, 'hangs_injected': 0,
+                                      'cold_loads': 0, 'max_in_flight': 0}
+
+    def count(self, path: str):
+        with self.lock:
+            self.stats['requests'][path] = self.stats['requests'].get(path, 0) + 1
+
+    def enter(self):
+        with self.lock:
+            self.in_flight += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.in_flight)
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def touch_model(self, model: str, keep_alive: Any) -> float:
+        """Marque le modèle chargé; retourne le temps de chargement simulé (ms)"""
+        now = time.time()
+        with self.lock:
+            expires = self.loaded.get(model)
+            cold = expires is None or expires < now
+            duration = parse_keep_alive(keep_alive)
+            if duration == 0:
+                self.loaded.pop(model, None)
+            else:
+                self.loaded[model] = math.inf if duration < 0 else now + duration
+            if cold:
+                self.stats['cold_loads'] += 1
+        return self.settings.load_ms if cold else 0.0
+
+    def running_models(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self.lock:
+            self.loaded = {m: exp for m, exp in self.loaded.items() if exp >= now}
+            return [
+                {
+                    'name': model,
+                    'model': model,
+                    'size_vram': 4_000_000_000,
+                    'expires_at': '2318-08-08T00:00:00+00:00' if exp == math.inf else
+                    time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime(exp))
+                }
+                for model, exp in self.loaded.items()
+            ]
+
+
+def parse_keep_alive(value: Any) -> float:
+    """Durée keep_alive Ollama en secondes ("30m", "1h", "-1", 300); 5 min par défaut"""
+    if value is None or value == '':
+        return 300.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r'(-?\d+(?:\.\d+)?)([smh]?)', str(value).strip())
+    if not match:
+        return 300.0
+    number, unit = float(match.group(1)), match.group(2)
+    return number * {'': 1, 's': 1, 'm': 60, 'h': 3600}[unit]
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximation courante: ~4 caractères par token"""
+    return max(1, math.ceil(len(text) / 4))
+
+
+@lru_cache(maxsize=50000)
+def _word_vector(model: str, word: str, dim: int) -> tuple:
+    seed = int.from_bytes(hashlib.sha256(f'{model}:{word}'.encode('utf-8')).digest()[:8], 'big')
+    rng = random.Random(seed)
+    return tuple(rng.gauss(0.0, 1.0) for _ in range(dim))
+
+
+def deterministic_embedding(text: str, model: str, dim: int) -> List[float]:
+    """Somme normalisée de vecteurs pseudo-aléatoires par mot: stable et sensible au contenu"""
+    vector = [0.0] * dim
+    words = re.findall(r'\w+', text.lower()) or ['']
+    for word in words:
+        vector = [a + b for a, b in zip(vector, _word_vector(model, word, dim))]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def generate_tokens(prompt: str, count: int) -> List[str]:
+    """Suite de mots déterministe dérivée du prompt"""
+    rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+    return [WORDS[rng.randrange(len(WORDS))] + ' ' for _ in range(count)]
+
+
+def value_for_schema(schema: Dict[str, Any], name: str = 'valeur') -> Any:
+    """Instance minimale valide d'un schéma JSON (sortie structurée "format")"""
+    kind = schema.get('type')
+    if kind == 'object' or 'properties' in schema:
+        return {key: value_for_schema(sub, key) for key, sub in schema.get('properties', {}).items()}
+    if kind == 'array':
+        return [value_for_schema(schema.get('items', {'type': 'string'}), name) for _ in range(2)]
+    if kind in ('integer', 'number'):
+        return 7
+    if kind == 'boolean':
+        return True
+    if 'enum' in schema:
+        return schema['enum'][0]
+    return f"{name} (stub)"
+
+
+class OllamaStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state: StubState = None  # injecté par make_server
+
+    def log_message(self, *args):
+        pass
+
+    # ------------------------------------------------------------------
+    # Utilitaires HTTP
+    # ------------------------------------------------------------------
+
+    def _send_json(self, obj: Any, status: int = 200):
+        body = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _write_chunk(self, obj: Dict[str, Any]):
+        data = (json.dumps(obj, ensure_ascii=False) + '\n').encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+    def _read_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length) if length else b''
+        return json.loads(raw or b'{}')
+
+    def _sleep_ms(self, ms: float):
+        if self.state.settings.realtime and ms > 0:
+            time.sleep(ms / 1000)
+
+    def _base_latency_ms(self) -> float:
+        settings = self.state.settings
+        rng = settings.random
+        if settings.latency_dist == 'fixed':
+            return settings.latency_ms
+        if settings.latency_dist == 'uniform':
+            return rng.uniform(max(0.0, settings.latency_ms - settings.latency_spread_ms),
+                               settings.latency_ms + settings.latency_spread_ms)
+        if settings.latency_dist == 'lognormal' and settings.latency_ms > 0:
+            sigma = settings.latency_spread_ms / settings.latency_ms if settings.latency_ms else 0.5
+            return settings.latency_ms * math.exp(rng.gauss(0.0, sigma))
+        return max(0.0, rng.gauss(settings.latency_ms, settings.latency_spread_ms))
+
+    def _inject_failure(self) -> bool:
+        """Erreur HTTP ou blocage aléatoire selon les taux configurés"""
+        settings = self.state.settings
+        roll = settings.random.random()
+        if roll < settings.failure_rate:
+            with self.state.lock:
+                self.state.stats['failures_injected'] += 1
+            self._send_json({'error': 'failure injected by ollama_stub'}, settings.failure_status)
+            return True
+        if roll < settings.failure_rate + settings.hang_rate:
+            with self.state.lock:
+                self.state.stats['hangs_injected'] += 1
+            time.sleep(settings.hang_seconds)
+            self._send_json({'error': 'hang injected by ollama_stub'}, 500)
+            return True
+        return False
+
+    def _known_model(self, model: str) -> bool:
+        names = set(self.state.settings.models)
+        return model in names or f'{model}:latest' in names
+
+    # ------------------------------------------------------------------
+    # Routage
+    # ------------------------------------------------------------------
+
+    def do_GET(self):
+        self.state.count(self.path)
+        if self.path == '/api/tags':
+            self._send_json({'models': [{'name': m, 'model': m, 'size': 4_000_000_000}
+                                        for m in self.state.settings.models]})
+        elif self.path == '/api/ps':
+            self._send_json({'models': self.state.running_models()})
+        elif self.path == '/api/version':
+            self._send_json({'version': '0.0.0-stub'})
+        elif self.path == '/stub/stats':
+            with self.state.lock:
+                stats = json.loads(json.dumps(self.state.stats))
+                stats['in_flight'] = self.state.in_flight
+            stats['settings'] = self.state.settings.to_dict()
+            self._send_json(stats)
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        self.state.count(self.path)
+        try:
+            body = self._read_body()
+        except ValueError:
+            self._send_json({'error': 'invalid JSON'}, 400)
+            return
+
+        if self.path == '/stub/config':
+            self.state.settings.update(body)
+            self._send_json(self.state.settings.to_dict())
+            return
+        if self.path == '/api/pull':
+            name = body.get('name') or body.get('model', '')
+            if name and not self._known_model(name):
+                self.state.settings.models.append(name if ':' in name else f'{name}:latest')
+            self._send_json({'status': 'success'})
+            return
+
+        handlers = {
+            '/api/generate': self._handle_generation,
+            '/api/chat': self._handle_generation,
+            '/api/embeddings': self._handle_embeddings,
+            '/api/embed': self._handle_embed
+        }
+        handler = handlers.get(self.path)
+        if handler is None:
+            self._send_json({'error': 'not found'}, 404)
+            return
+
+        model = body.get('model', '')
+        if not self._known_model(model):
+            self._send_json({'error': f"model '{model}' not found, try pulling it first"}, 404)
+            return
+
+        self.state.enter()
+        try:
+            if self._inject_failure():
+                return
+            handler(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client parti (annulation)
+        finally:
+            self.state.leave()
+
+    # ------------------------------------------------------------------
+    # Génération
+    # ------------------------------------------------------------------
+
+    def _handle_generation(self, body: Dict[str, Any]):
+        settings = self.state.settings
+        is_chat = self.path == '/api/chat'
+        model = body['model']
+        options = body.get('options') or {}
+
+        if is_chat:
+            messages = body.get('messages') or []
+            prompt = '\n'.join(m.get('content', '') for m in messages)
+        else:
+            prompt = (body.get('system') or '') + (body.get('prompt') or '')
+
+        load_ms = self.state.touch_model(model, body.get('keep_alive'))
+        latency_ms = self._base_latency_ms()
+
+        # Requête sans prompt: simple chargement du modèle
+        if not prompt:
+            self._sleep_ms(load_ms + latency_ms)
+            result = {'model': model, 'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ'), 'done': True,
+                      'done_reason': 'load', 'load_duration': int(load_ms * 1e6)}
+            if is_chat:
+                result['message'] = {'role': 'assistant', 'content': ''}
+            else:
+                result['response'] = ''
+            self._send_json(result)
+            return
+
+        prompt_tokens = estimate_tokens(prompt)
+        num_predict = options.get('num_predict', settings.max_tokens)
+        count = settings.max_tokens if num_predict is None or num_predict < 0 else min(num_predict, settings.max_tokens)
+
+        output_format = body.get('format')
+        if output_format:
+            schema = output_format if isinstance(output_format, dict) else {'type': 'object', 'properties': {
+                'response': {'type': 'string'}}}
+            text = json.dumps(value_for_schema(schema), ensure_ascii=False)
+            # Découpage en morceaux pour exercer les parseurs incrémentaux
+            tokens = [text[i:i + 8] for i in range(0, len(text), 8)]
+        else:
+            tokens = generate_tokens(prompt, max(1, count))
+            stops = options.get('stop') or []
+            text = ''.join(tokens)
+            for stop in stops:
+                if stop and stop in text:
+                    text = text[:text.index(stop)]
+                    tokens = [text]
+
+        eval_count = len(tokens)
+        prompt_eval_ms = prompt_tokens / settings.prompt_tokens_per_second * 1000
+        per_token_ms = 1000 / settings.tokens_per_second
+        eval_ms = eval_count * per_token_ms
+
+        def final(extra: Dict[str, Any]) -> Dict[str, Any]:
+            result = {
+                'model': model,
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'done': True,
+                'done_reason': 'stop',
+                'total_duration': int((load_ms + latency_ms + prompt_eval_ms + eval_ms) * 1e6),
+                'load_duration': int(load_ms * 1e6),
+                'prompt_eval_count': prompt_tokens,
+                'prompt_eval_duration': int(prompt_eval_ms * 1e6),
+                'eval_count': eval_count,
+                'eval_duration': int(eval_ms * 1e6)
+            }
+            result.update(extra)
+            return result
+
+        if body.get('stream', True):
+            self._sleep_ms(load_ms + latency_ms + prompt_eval_ms)
+            self._start_stream()
+            for token in tokens:
+                self._sleep_ms(per_token_ms)
+                chunk = {'model': model, 'done': False}
+                if is_chat:
+                    chunk['message'] = {'role': 'assistant', 'content': token}
+                else:
+                    chunk['response'] = token
+                self._write_chunk(chunk)
+            empty = {'message': {'role': 'assistant', 'content': ''}} if is_chat else {'response': ''}
+            self._write_chunk(final(empty))
+            self._end_stream()
+        else:
+            self._sleep_ms(load_ms + latency_ms + prompt_eval_ms + eval_ms)
+            text = ''.join(tokens)
+            self._send_json(final({'message': {'role': 'assistant', 'content': text}} if is_chat
+                                  else {'response': text}))
+
+    # ------------------------------------------------------------------
+    # Embeddings
+    # ------------------------------------------------------------------
+
+    def _handle_embeddings(self, body: Dict[str, Any]):
+        """Ancien endpoint: un texte, champ "embedding" """
+        settings = self.state.settings
+        load_ms = self.state.touch_model(body['model'], body.get('keep_alive'))
+        self._sleep_ms(load_ms + self._base_latency_ms() + settings.embed_ms_per_input)
+        embedding = deterministic_embedding(body.get('prompt', ''), body['model'], settings.embedding_dim)
+        self._send_json({'embedding': embedding})
+
+    def _handle_embed(self, body: Dict[str, Any]):
+        """Endpoint par lot: "input" texte ou liste, champ "embeddings" """
+        settings = self.state.settings
+        inputs = body.get('input', '')
+        inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+
+        load_ms = self.state.touch_model(body['model'], body.get('keep_alive'))
+        compute_ms = settings.embed_ms_per_input * len(inputs)
+        self._sleep_ms(load_ms + self._base_latency_ms() + compute_ms)
+
+        self._send_json({
+            'model': body['model'],
+            'embeddings': [deterministic_embedding(text, body['model'], settings.embedding_dim) for text in inputs],
+            'total_duration': int((load_ms + compute_ms) * 1e6),
+            'load_duration': int(load_ms * 1e6),
+            'prompt_eval_count': sum(estimate_tokens(text) for text in inputs)
+        })
+
+
+def make_server(host: str = '127.0.0.1', port: int = 11435, **options) -> ThreadingHTTPServer:
+    """Crée le serveur (port=0 pour un port libre, cf. server.server_address)"""
+    handler = type('ConfiguredOllamaStubHandler', (OllamaStubHandler,), {
+        'state': StubState(StubSettings(**options))
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_stub_server(host: str = '127.0.0.1', port: int = 0, **options):
+    """Démarre le stub dans un thread; retourne (serveur, url de base)"""
+    server = make_server(host, port, **options)
+    thread = threading.Thread(target=server.serve_forever, name='ollama-stub', daemon=True)
+    thread.start()
+    bound_host, bound_port = server.server_address[:2]
+    return server, f"http://{bound_host}:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur Ollama factice pour LinkedBoost")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--models', default=','.join(DEFAULT_MODELS),
+                        help="modèles exposés par /api/tags (séparés par des virgules)")
+    parser.add_argument('--latency-ms', type=float, default=20, help="latence de base par requête")
+    parser.add_argument('--latency-spread-ms', type=float, default=10, help="dispersion de la latence")
+    parser.add_argument('--latency-dist', choices=['fixed', 'uniform', 'normal', 'lognormal'], default='normal')
+    parser.add_argument('--tokens-per-second', type=float, default=50, help="débit de génération")
+    parser.add_argument('--prompt-tokens-per-second', type=float, default=500, help="débit d'évaluation du prompt")
+    parser.add_argument('--max-tokens', type=int, default=120, help="plafond de tokens générés")
+    parser.add_argument('--load-ms', type=float, default=0, help="temps de chargement d'un modèle froid")
+    parser.add_argument('--embedding-dim', type=int, default=768)
+    parser.add_argument('--embed-ms-per-input', type=float, default=5)
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="probabilité d'une erreur HTTP")
+    parser.add_argument('--failure-status', type=int, default=503)
+    parser.add_argument('--hang-rate', type=float, default=0.0, help="probabilité d'une requête bloquée")
+    parser.add_argument('--hang-seconds', type=float, default=120)
+    parser.add_argument('--no-sleep', action='store_true', help="réponses immédiates (durées simulées seulement)")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = make_server(
+        args.host, args.port,
+        models=[m.strip() for m in args.models.split(',') if m.strip()],
+        latency_ms=args.latency_ms,
+        latency_spread_ms=args.latency_spread_ms,
+        latency_dist=args.latency_dist,
+        tokens_per_second=args.tokens_per_second,
+        prompt_tokens_per_second=args.prompt_tokens_per_second,
+        max_tokens=args.max_tokens,
+        load_ms=args.load_ms,
+        embedding_dim=args.embedding_dim,
+        embed_ms_per_input=args.embed_ms_per_input,
+        failure_rate=args.failure_rate,
+        failure_status=args.failure_status,
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+        realtime=not args.no_sleep,
+        seed=args.seed
+    )
+    print(f"🧪 Ollama stub sur http://{args.host}:{args.port}")
+    print(f"💡 Utilisez: OLLAMA_BASE_URL=http://{args.host}:{args.port} python app.py")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Arrêt du stub")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+# tests/conftest.py - Racine du projet importable depuis les tests, stub Ollama partagé
+
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ollama_stub  # noqa: E402
+from models import ollama_async, ollama_client  # noqa: E402
+
+
+@pytest.fixture
+def stub():
+    """Serveur Ollama factice: url, compteurs (stats) et réglages modifiables (settings)"""
+    server, url = ollama_stub.start_stub_server('127.0.0.1', latency_ms=5, latency_spread_ms=0,
+                                                tokens_per_second=40, max_tokens=20, embedding_dim=16)
+    state = server.RequestHandlerClass.state
+    yield SimpleNamespace(url=url, stats=state.stats, settings=state.settings)
+    server.shutdown()
+
+
+@pytest.fixture
+def stub_clients(stub, monkeypatch):
+    """Clients Ollama partagés (sync et async) pointés vers le stub"""
+    client = ollama_client.OllamaClient([stub.url])
+    monkeypatch.setattr(ollama_client, '_client', client)
+    monkeypatch.setattr(ollama_async, '_async_client', ollama_async.AsyncOllamaClient(client))
+    return stub
@@ -0,0 +1,37 @@
+# tests/test_async_fallback.py - Client async sans aiohttp (repli sur le client synchrone)
+
+import asyncio
+import time
+
+import pytest
+
+from models import ollama_async
+
+
+@pytest.fixture
+def fallback_client(stub_clients, monkeypatch):
+    monkeypatch.setattr(ollama_async, 'AIOHTTP_AVAILABLE', False)
+    return ollama_async.get_async_ollama_client()
+
+
+def test_coalesced_call_returns_without_aiohttp(fallback_client):
+    embedding = fallback_client.run_sync(fallback_client.embeddings('nomic-embed-text', 'Python'), timeout=5)
+
+    assert len(embedding) == 16
+    stats = fallback_client.sync_client.single_flight.get_stats()
+    assert stats['upstream_calls'] == 1 and stats['in_flight'] == 0
+
+
+def test_fallback_stream_is_incremental(fallback_client):
+    payload = {'model': 'mistral:latest', 'prompt': 'Bonjour', 'stream': True}
+
+    async def consume():
+        started, arrivals = time.monotonic(), []
+        async for chunk in fallback_client.stream_json('/api/generate', payload):
+            arrivals.append(time.monotonic() - started)
+        return arrivals
+
+    arrivals = asyncio.run(consume())
+    # 20 tokens à 40 tokens/s: le premier objet arrive bien avant la fin du flux
+    assert len(arrivals) > 2
+    assert arrivals[0] < arrivals[-1] - 0.2
@@ -0,0 +1,77 @@
+# tests/test_batch_generator.py - Lots de lettres: offres introuvables comptées à part
+
+import asyncio
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from config import Config
+from models.batch_generator import BatchGenerationManager
+
+
+class FakeKnowledgeBase:
+    def get_jobs_by_hash_ids(self, hash_ids):
+        return {h: {'title': f'Poste {h}', 'company': 'ACME', 'description': 'x'}
+                for h in hash_ids if not h.startswith('absent')}
+
+
+class FakeAsyncClient:
+    def __init__(self):
+        self.pool = ThreadPoolExecutor(1)
+
+    def submit(self, coro):
+        return self.pool.submit(asyncio.run, coro)
+
+
+class FakeGenerator:
+    knowledge_base = None
+
+    def __init__(self):
+        self.async_client = FakeAsyncClient()
+
+    async def agenerate_cover_letter(self, job_title, **kwargs):
+        if job_title.endswith('ko'):
+            raise ValueError("génération vide")
+        return f"Lettre pour {job_title}"
+
+
+def test_not_found_items_are_not_counted_as_failed():
+    generator = FakeGenerator()
+    manager = BatchGenerationManager(generator, knowledge_base=FakeKnowledgeBase())
+    batch = manager.create_batch(['a', 'absent-1', 'b-ko', 'absent-2'], profile={})
+    generator.async_client.pool.shutdown(wait=True)
+
+    progress = manager.get_batch(batch['batch_id'])['progress']
+    assert progress['completed'] == 1
+    assert progress['failed'] == 1
+    assert progress['not_found'] == 2
+    assert progress['percentage'] == 100.0
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """Client de test Flask, lots servis par des faux (pas d'appel Ollama)"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Config, 'MODEL_WARMUP_ENABLED', False)
+    monkeypatch.setattr(Config, 'OFFER_SUMMARY_ENABLED', False)
+    app_module = importlib.import_module('app')
+    manager = BatchGenerationManager(FakeGenerator(), knowledge_base=FakeKnowledgeBase())
+    monkeypatch.setattr(app_module, 'batch_manager', manager)
+    yield app_module.app.test_client(), manager
+    manager.ai_generator.async_client.pool.shutdown(wait=True)
+
+
+@pytest.mark.parametrize('concurrency, status', [('2', 202), (3, 202), (None, 202), ('beaucoup', 400), ([2], 400)])
+def test_batch_route_validates_concurrency(api, concurrency, status):
+    client, manager = api
+    response = client.post('/api/generate/batch', json={
+        'hash_ids': ['a', 'b'], 'applicant_name': 'Ada', 'concurrency': concurrency
+    })
+
+    assert response.status_code == status
+    if status == 202:
+        batch = manager.batches[response.get_json()['batch_id']]
+        assert batch['concurrency'] == min(int(concurrency or Config.BATCH_CONCURRENCY), Config.BATCH_CONCURRENCY)
+    else:
+        assert 'concurrency' in response.get_json()['error']
@@ -0,0 +1,73 @@
+# tests/test_cancellable_coalescing.py - Jobs annulables: fusion conservée, annulation isolée
+
+import threading
+import time
+
+from models.cancellation import CancellationToken, GenerationCancelled, cancellation_scope
+from models.ollama_client import OllamaClient
+
+PAYLOAD = {
+    'model': 'mistral:latest',
+    'messages': [{'role': 'user', 'content': 'Bonjour'}],
+    'stream': False,
+    'options': {'num_predict': 20}
+}
+
+
+def chat_requests(stats):
+    return stats['requests'].get('/api/chat', 0)
+
+
+def run_in_thread(fn, results):
+    def run():
+        try:
+            results.append(fn())
+        except BaseException as e:
+            results.append(e)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_cancellable_job_still_coalesces_with_identical_request(stub):
+    client = OllamaClient([stub.url])
+    token = CancellationToken()
+
+    def cancellable():
+        with cancellation_scope(token):
+            return client.post_json('/api/chat', PAYLOAD)
+
+    job_results, plain_results = [], []
+    job = run_in_thread(cancellable, job_results)
+    time.sleep(0.05)
+    plain = run_in_thread(lambda: client.post_json('/api/chat', PAYLOAD), plain_results)
+    job.join()
+    plain.join()
+
+    assert chat_requests(stub.stats) == 1
+    assert job_results[0]['message']['content']
+    assert job_results[0]['message']['content'] == plain_results[0]['message']['content']
+    assert job_results[0]['done']
+
+
+def test_cancelling_the_job_does_not_fail_the_coalesced_request(stub):
+    client = OllamaClient([stub.url])
+    token = CancellationToken()
+
+    def cancellable():
+        with cancellation_scope(token):
+            return client.post_json('/api/chat', PAYLOAD)
+
+    job_results, plain_results = [], []
+    job = run_in_thread(cancellable, job_results)
+    time.sleep(0.05)
+    plain = run_in_thread(lambda: client.post_json('/api/chat', PAYLOAD), plain_results)
+    time.sleep(0.1)
+    token.cancel('job_cancelled')
+    job.join()
+    plain.join()
+
+    assert isinstance(job_results[0], GenerationCancelled)
+    assert plain_results[0]['message']['content']
+    # L'appel coupé puis relancé par le suiveur
+    assert chat_requests(stub.stats) == 2
@@ -0,0 +1,51 @@
+# tests/test_embeddings_async.py - Embeddings sans blocage de la boucle async
+
+import asyncio
+import time
+
+from models.embeddings import EmbeddingManager
+
+
+async def measure_ticks(coro, interval=0.01):
+    """Exécute coro en comptant les réveils d'une tâche voisine (0 si la boucle est bloquée)"""
+    ticks = 0
+    running = True
+
+    async def ticker():
+        nonlocal ticks
+        while running:
+            await asyncio.sleep(interval)
+            ticks += 1
+
+    task = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0)
+    started = time.monotonic()
+    result = await coro
+    elapsed = time.monotonic() - started
+    running = False
+    await task
+    return result, ticks, elapsed
+
+
+def test_single_embedding_does_not_block_the_loop(stub_clients):
+    stub_clients.settings.update({'embed_ms_per_input': 200})
+    manager = EmbeddingManager()
+    assert manager.method == 'ollama'
+
+    embedding, ticks, elapsed = asyncio.run(measure_ticks(manager.generate_embedding('Développeur Python')))
+
+    assert len(embedding) == 16
+    assert elapsed >= 0.2
+    assert ticks >= 10
+
+
+def test_batch_embeddings_do_not_block_the_loop(stub_clients):
+    stub_clients.settings.update({'embed_ms_per_input': 50})
+    manager = EmbeddingManager()
+    texts = [f"Offre {i} Python" for i in range(6)] + ['']
+
+    embeddings, ticks, _ = asyncio.run(measure_ticks(manager.generate_embeddings(texts, batch_size=3)))
+
+    assert [len(e) for e in embeddings] == [16] * 6 + [0]
+    assert stub_clients.stats['requests'].get('/api/embed') == 2
+    assert ticks >= 10
@@ -0,0 +1,63 @@
+# tests/test_generation_cache.py - Cache de générations: clé de contenu, deux niveaux, éviction
+
+import time
+
+import pytest
+
+from models.generation_cache import GenerationCache
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    def make(**options):
+        options.setdefault('memory_size', 2)
+        options.setdefault('ttl_seconds', 3600)
+        options.setdefault('max_bytes', 10 ** 6)
+        return GenerationCache(db_path=str(tmp_path / 'cache.db'), **options)
+    return make
+
+
+def test_key_ignores_transport_fields_but_not_options():
+    payload = {'model': 'mistral', 'prompt': 'Bonjour', 'options': {'temperature': 0.7}}
+    key = GenerationCache.make_key(payload)
+
+    assert GenerationCache.make_key(dict(payload, stream=True, keep_alive='5m')) == key
+    assert GenerationCache.make_key(dict(reversed(list(payload.items())))) == key
+    assert GenerationCache.make_key(dict(payload, options={'temperature': 0.2})) != key
+
+
+def test_memory_lru_falls_back_to_disk_and_is_shared(make_cache):
+    cache = make_cache()
+    for name in ('a', 'b', 'c'):
+        cache.set(name, f'réponse {name}', model='mistral')
+
+    assert cache.get('c') == 'réponse c'
+    assert cache.get('a') == 'réponse a'  # sortie du LRU mémoire, relue sur disque
+    assert cache.get('a') == 'réponse a'
+    assert cache.get('absent') is None
+    stats = cache.get_stats()
+    assert (stats['memory_hits'], stats['disk_hits'], stats['misses']) == (2, 1, 1)
+    # Un autre processus (autre instance) lit le niveau SQLite
+    assert make_cache().get('b') == 'réponse b'
+
+
+def test_expired_entries_are_misses(make_cache):
+    cache = make_cache(ttl_seconds=0.05)
+    cache.set('k', 'réponse')
+    time.sleep(0.1)
+    assert cache.get('k') is None
+    assert make_cache().get('k') is None
+
+
+def test_eviction_drops_least_recently_read_entries(make_cache, monkeypatch):
+    monkeypatch.setattr(GenerationCache, 'EVICTION_INTERVAL', 4)
+    cache = make_cache(memory_size=0, max_bytes=250)
+    for name in ('a', 'b', 'c'):
+        cache.set(name, name * 100)
+        time.sleep(0.01)
+    cache.get('a')  # 'b' devient la moins récemment lue
+    cache.set('d', 'd' * 100)  # quatrième écriture: passe d'éviction
+
+    assert cache.get('b') is None and cache.get('c') is None
+    assert cache.get('a') == 'a' * 100 and cache.get('d') == 'd' * 100
+    assert cache.get_stats()['evictions'] == 2
@@ -0,0 +1,69 @@
+# tests/test_job_queue.py - File de génération: profondeur, annulation, exécution
+
+import threading
+
+import pytest
+
+from models.cancellation import current_cancellation
+from models.job_queue import GenerationJobQueue, QueueFullError
+
+
+@pytest.fixture
+def blocked_queue():
+    """File d'un worker occupé par un job bloquant, relâché en fin de test"""
+    release = threading.Event()
+    started = threading.Event()
+    jobs = GenerationJobQueue(num_workers=1, max_depth=2)
+
+    def blocker():
+        started.set()
+        release.wait(5)
+        return {'ok': True}
+
+    first = jobs.submit('blocker', blocker)
+    assert started.wait(2)
+    yield jobs, first, release
+    release.set()
+
+
+def test_cancelled_jobs_free_queue_depth(blocked_queue):
+    jobs, _, _ = blocked_queue
+    waiting = [jobs.submit('message', lambda: {}) for _ in range(2)]
+    with pytest.raises(QueueFullError):
+        jobs.submit('message', lambda: {})
+
+    for job in waiting:
+        jobs.cancel(job['job_id'])
+    # Les jobs annulés restent dans la file interne mais ne comptent plus
+    replacement = jobs.submit('message', lambda: {'done': 1})
+    assert jobs.get_stats()['depth'] == 1 and jobs.counters['rejected'] == 1
+    assert replacement['position'] == 1
+
+
+def test_jobs_run_in_order_after_release(blocked_queue):
+    jobs, first, release = blocked_queue
+    second = jobs.submit('message', lambda: {'value': 2})
+    release.set()
+
+    assert jobs.get_job(first['job_id'], wait=2)['result'] == {'ok': True}
+    done = jobs.get_job(second['job_id'], wait=2)
+    assert done['status'] == 'completed' and done['result'] == {'value': 2}
+    assert jobs.get_stats()['depth'] == 0 and jobs.queued == 0
+
+
+def test_running_job_cancellation_reaches_token():
+    jobs = GenerationJobQueue(num_workers=1, max_depth=2)
+    started = threading.Event()
+
+    def cancellable():
+        token, cancelled = current_cancellation(), threading.Event()
+        token.add_callback(cancelled.set)
+        started.set()
+        cancelled.wait(5)
+        token.raise_if_cancelled()
+        return {}
+
+    job = jobs.submit('message', cancellable)
+    assert started.wait(2)
+    jobs.cancel(job['job_id'])
+    assert jobs.get_job(job['job_id'], wait=2)['status'] == 'cancelled'
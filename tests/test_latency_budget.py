@@ -0,0 +1,75 @@
+# tests/test_latency_budget.py - Budget de latence jugé sur la durée côté modèle
+
+import threading
+
+import pytest
+
+from models.ai_generator import LinkedBoostAI
+
+
+@pytest.fixture
+def generator(stub_clients, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stub_clients.settings.update({'tokens_per_second': 400, 'max_tokens': 10})
+    generator = LinkedBoostAI()
+    generator.cache = None
+    return generator
+
+
+def test_slot_wait_is_not_charged_to_the_model(generator):
+    route = generator.router.routes['message_connection']
+    route['latency_budget_ms'] = 300
+    scheduler = generator.client.scheduler
+
+    # Tous les slots occupés pendant 600 ms: la génération attend avant de partir
+    held = [scheduler.acquire() for _ in range(scheduler.capacity)]
+    timer = threading.Timer(0.6, lambda: [scheduler.release(lane) for lane in held])
+    timer.start()
+    try:
+        infos = [generator._generate_content('message_connection', 'Bonjour', use_cache=False, with_info=True)[1]
+                 for _ in range(generator.router.breach_threshold)]
+    finally:
+        timer.join()
+
+    assert infos[0]['duration_ms'] > 500
+    assert all(info['model_duration_ms'] < 300 for info in infos)
+    state = generator.router._state['message_connection']
+    assert state['breaches'] == 0
+    assert not generator.router.route('message_connection')['fallback']
+
+
+def test_slow_model_still_triggers_fallback(generator):
+    generator.router.fallback_model = 'llama3.2:1b'
+    route = generator.router.routes['message_connection']
+    route['latency_budget_ms'] = 1
+
+    for _ in range(generator.router.breach_threshold):
+        generator._generate_content('message_connection', 'Bonjour', use_cache=False)
+
+    assert generator.router.route('message_connection')['fallback']
+
+
+def test_coalesced_callers_count_one_upstream_call(generator, stub_clients):
+    stub_clients.settings.update({'latency_ms': 300})
+    generator.router.fallback_model = 'llama3.2:1b'
+    route = generator.router.routes['message_connection']
+    route['latency_budget_ms'] = 1
+    callers = generator.router.breach_threshold + 1
+    barrier = threading.Barrier(callers)
+    infos = []
+
+    def call():
+        barrier.wait()
+        infos.append(generator._generate_content('message_connection', 'Bonjour', use_cache=False,
+                                                 with_info=True)[1])
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert sum(not info['coalesced'] for info in infos) == 1
+    state = generator.router._state['message_connection']
+    assert state['calls'] == 1 and state['breaches'] == 1
+    assert not generator.router.route('message_connection')['fallback']
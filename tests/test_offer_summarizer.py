@@ -0,0 +1,78 @@
+# tests/test_offer_summarizer.py - Échecs de résumé: report, abandon, pas de famine des offres anciennes
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from models.knowledge_base import KnowledgeBase
+from models.offer_summarizer import OfferSummarizer
+
+
+class FakeGenerator:
+    """Résume toutes les offres sauf celles dont le titre commence par 'KO'"""
+
+    knowledge_base = None
+
+    def __init__(self):
+        self.calls = []
+
+    def summarize_job_offer(self, title, company, description):
+        self.calls.append(title)
+        if title.startswith('KO'):
+            raise ValueError("réponse vide")
+        return f"Résumé de {title}", 'mistral:latest'
+
+
+@pytest.fixture
+def knowledge_base(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    kb = KnowledgeBase()
+    titles = ['OK ancien 1', 'OK ancien 2', 'KO récent 1', 'KO récent 2', 'KO récent 3']
+    for day, title in enumerate(titles, start=1):
+        asyncio.run(kb.store_job({'title': title, 'company': 'ACME', 'description': 'x' * 50}))
+        conn = sqlite3.connect(kb.db_path)
+        conn.execute('UPDATE job_offers_main SET scraped_at = ? WHERE title = ?', (f'2026-01-0{day}', title))
+        conn.commit()
+        conn.close()
+    return kb
+
+
+def summarized_titles(kb):
+    conn = sqlite3.connect(kb.db_path)
+    rows = conn.execute('''
+        SELECT j.title, s.model FROM job_offer_summaries s JOIN job_offers_main j ON j.hash_id = s.hash_id
+    ''').fetchall()
+    conn.close()
+    return dict(rows)
+
+
+def test_failing_recent_offers_do_not_starve_older_ones(knowledge_base):
+    generator = FakeGenerator()
+    summarizer = OfferSummarizer(generator, knowledge_base, min_chars=10, sweep_interval=3600, sweep_batch=3)
+
+    assert summarizer.sweep() == 0  # les 3 offres récentes échouent
+    assert summarizer.sweep() == 2  # reportées: le balayage passe aux anciennes
+    assert summarizer.sweep() == 0  # rien à faire avant la fin du délai
+
+    assert summarized_titles(knowledge_base) == {'OK ancien 1': 'mistral:latest', 'OK ancien 2': 'mistral:latest'}
+    assert sorted(generator.calls) == ['KO récent 1', 'KO récent 2', 'KO récent 3', 'OK ancien 1', 'OK ancien 2']
+    assert summarizer.get_stats()['failed'] == 3
+
+
+def test_offer_is_abandoned_after_max_attempts(knowledge_base):
+    generator = FakeGenerator()
+    summarizer = OfferSummarizer(generator, knowledge_base, min_chars=10, sweep_interval=0.0001,
+                                 sweep_batch=10, max_attempts=3)
+
+    for _ in range(6):
+        summarizer.sweep()
+
+    assert generator.calls.count('KO récent 1') == 3
+    assert summarizer.get_stats()['abandoned'] == 3
+    assert knowledge_base.get_hash_ids_without_summary(10, max_attempts=3) == []
+
+    conn = sqlite3.connect(knowledge_base.db_path)
+    errors = conn.execute('SELECT attempts, last_error FROM job_offer_summary_failures').fetchall()
+    conn.close()
+    assert errors == [(3, 'réponse vide')] * 3
@@ -0,0 +1,97 @@
+# tests/test_priority_scheduler.py - Voies de priorité devant les slots Ollama
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from models.cancellation import CancellationToken, GenerationCancelled, cancellation_scope
+from models.priority_scheduler import (BACKGROUND, BATCH, INTERACTIVE, PriorityScheduler,
+                                       priority_lane)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition jamais atteinte"
+        time.sleep(0.005)
+
+
+def start_waiter(scheduler, lane, order, token=None):
+    def run():
+        with priority_lane(lane), cancellation_scope(token):
+            try:
+                with scheduler.slot():
+                    order.append(lane)
+            except GenerationCancelled:
+                order.append(f'{lane}:cancelled')
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_freed_slots_go_to_interactive_then_batch_then_background():
+    scheduler = PriorityScheduler(1, reserved_interactive=0)
+    held = scheduler.acquire()
+    order = []
+    threads = []
+    for count, lane in enumerate((BACKGROUND, BATCH, INTERACTIVE), start=1):
+        threads.append(start_waiter(scheduler, lane, order))
+        wait_for(lambda: sum(l['waiting'] for l in scheduler.get_stats()['lanes'].values()) == count)
+
+    scheduler.release(held)
+    for thread in threads:
+        thread.join(2)
+    assert order == [INTERACTIVE, BATCH, BACKGROUND]
+    assert scheduler.get_stats()['in_use'] == 0
+
+
+def test_reserved_slot_stays_free_for_interactive_calls():
+    scheduler = PriorityScheduler(2, reserved_interactive=1)
+    with priority_lane(BATCH):
+        batch_lane = scheduler.acquire()
+    order = []
+    batch_thread = start_waiter(scheduler, BATCH, order)
+    wait_for(lambda: scheduler.get_stats()['lanes'][BATCH]['waiting'] == 1)
+
+    with scheduler.slot() as lane:  # voie interactive par défaut: admise sans attendre
+        assert lane == INTERACTIVE and order == []
+
+    scheduler.release(batch_lane)
+    batch_thread.join(2)
+    assert order == [BATCH]
+
+
+def test_cancelled_waiter_leaves_the_queue_without_a_slot():
+    scheduler = PriorityScheduler(1, reserved_interactive=0)
+    held = scheduler.acquire()
+    token, order = CancellationToken(), []
+    thread = start_waiter(scheduler, BATCH, order, token)
+    wait_for(lambda: scheduler.get_stats()['lanes'][BATCH]['waiting'] == 1)
+
+    token.cancel('test')
+    thread.join(2)
+    assert order == ['batch:cancelled']
+    stats = scheduler.get_stats()
+    assert stats['lanes'][BATCH]['waiting'] == 0 and stats['lanes'][BATCH]['cancelled'] == 1
+    scheduler.release(held)
+    assert scheduler.get_stats()['in_use'] == 0
+
+
+def test_async_waiter_cancellation_releases_its_place():
+    scheduler = PriorityScheduler(1, reserved_interactive=0)
+
+    async def scenario():
+        held = await scheduler.aacquire()
+        waiting = asyncio.ensure_future(scheduler.aacquire())
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        scheduler.release(held)
+        scheduler.release(await asyncio.wait_for(scheduler.aacquire(), 1))
+
+    asyncio.run(scenario())
+    assert scheduler.get_stats()['in_use'] == 0
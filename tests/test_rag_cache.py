@@ -0,0 +1,43 @@
+# tests/test_rag_cache.py - Insights mis en cache par version de la base de connaissances
+
+import asyncio
+
+import pytest
+
+from models.knowledge_base import KnowledgeBase
+from models.rag_cache import RAGContextCache, get_rag_context_cache
+
+
+@pytest.fixture
+def knowledge_base(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    get_rag_context_cache().clear()
+    kb = KnowledgeBase()
+    asyncio.run(kb.store_job({'title': 'Dev Python', 'company': 'ACME', 'description': 'x',
+                              'technologies': ['Python']}))
+    yield kb
+    get_rag_context_cache().clear()
+
+
+def test_hits_are_flagged_and_keep_their_compute_time(knowledge_base):
+    first = asyncio.run(knowledge_base.get_market_insights())
+    second = asyncio.run(knowledge_base.get_market_insights())
+
+    assert first['cached'] is False and second['cached'] is True
+    assert second['last_updated'] == first['last_updated']
+    assert second['total_jobs'] == 1
+
+    asyncio.run(knowledge_base.store_job({'title': 'Dev Go', 'company': 'Globex', 'description': 'y'}))
+    third = asyncio.run(knowledge_base.get_market_insights())
+    assert third['cached'] is False and third['total_jobs'] == 2
+    assert third['last_updated'] >= first['last_updated']
+
+
+def test_cached_copy_is_not_altered_by_callers():
+    cache = RAGContextCache(max_entries=4)
+    value = cache.get_or_compute('company', 'acme', 1, lambda: {'jobs_found': 3})
+    value['jobs_found'] = 0
+
+    assert cache.get_or_compute('company', 'acme', 1, lambda: {}) == {'jobs_found': 3, 'cached': True}
+    assert cache.get_or_compute('company', 'acme', 2, lambda: {'jobs_found': 4}) == {'jobs_found': 4,
+                                                                                     'cached': False}
@@ -0,0 +1,172 @@
+# tests/test_single_flight.py - Fusion des appels identiques et annulation du leader
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from models.cancellation import CancellationToken, GenerationCancelled, cancellation_scope
+from models.ollama_client import OllamaError
+from models.single_flight import SingleFlight, last_call_coalesced
+
+
+def start_follower(flight, key, fn, results):
+    def run():
+        try:
+            results.append(flight.do(key, fn))
+        except BaseException as e:
+            results.append(e)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_concurrent_identical_calls_share_one_upstream_call():
+    flight = SingleFlight(shared_errors=(OllamaError,))
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'ok'
+
+    results = []
+    threads = [start_follower(flight, 'k', fn, results) for _ in range(5)]
+    for thread in threads:
+        thread.join()
+
+    assert results == ['ok'] * 5
+    assert len(calls) == 1
+    assert flight.get_stats()['coalesced'] == 4
+
+
+def test_ollama_error_reaches_followers():
+    flight = SingleFlight(shared_errors=(OllamaError,))
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.1)
+        raise OllamaError("boom", status_code=500)
+
+    results = []
+    threads = [start_follower(flight, 'k', fn, results) for _ in range(3)]
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(isinstance(result, OllamaError) for result in results)
+
+
+def test_cancelled_leader_hands_the_call_to_a_follower():
+    flight = SingleFlight(shared_errors=(OllamaError,))
+    leader_started = threading.Event()
+
+    def cancelled_leader():
+        leader_started.set()
+        time.sleep(0.1)
+        raise GenerationCancelled('client_disconnect')
+
+    leader_results, follower_results = [], []
+    leader = start_follower(flight, 'k', cancelled_leader, leader_results)
+    leader_started.wait()
+    follower = start_follower(flight, 'k', lambda: 'fresh', follower_results)
+    leader.join()
+    follower.join()
+
+    assert isinstance(leader_results[0], GenerationCancelled)
+    assert follower_results == ['fresh']
+    assert flight.get_stats()['released'] == 1
+    assert flight.get_stats()['in_flight'] == 0
+
+
+def test_cancelled_follower_stops_waiting_without_touching_the_leader():
+    flight = SingleFlight(shared_errors=(OllamaError,))
+    leader_started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        leader_started.set()
+        release.wait(2)
+        return 'ok'
+
+    leader_results = []
+    leader = start_follower(flight, 'k', slow, leader_results)
+    leader_started.wait()
+
+    token = CancellationToken()
+    threading.Timer(0.05, token.cancel, args=('job_cancelled',)).start()
+    with cancellation_scope(token):
+        with pytest.raises(GenerationCancelled):
+            flight.do('k', lambda: 'unused')
+
+    release.set()
+    leader.join()
+    assert leader_results == ['ok']
+
+
+def test_async_leader_cancellation_does_not_fail_followers():
+    flight = SingleFlight(shared_errors=(OllamaError,))
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(1)
+            return 'leader'
+
+        async def fast():
+            return 'follower'
+
+        leader = asyncio.ensure_future(flight.ado('k', slow))
+        await started.wait()
+        follower = asyncio.ensure_future(flight.ado('k', fast))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.wait_for(follower, 1)
+
+    assert asyncio.run(scenario()) == 'follower'
+
+
+def test_async_follower_cancellation_does_not_cancel_shared_call():
+    flight = SingleFlight(shared_errors=(OllamaError,))
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(0.1)
+            return 'ok'
+
+        leader = asyncio.ensure_future(flight.ado('k', slow))
+        await started.wait()
+        quitter = asyncio.ensure_future(flight.ado('k', slow))
+        stayer = asyncio.ensure_future(flight.ado('k', slow))
+        await asyncio.sleep(0.01)
+        quitter.cancel()
+        return await leader, await stayer, quitter.cancelled()
+
+    assert asyncio.run(scenario()) == ('ok', 'ok', True)
+
+
+def test_async_callers_know_whether_their_result_was_coalesced():
+    flight = SingleFlight()
+
+    async def fn():
+        await asyncio.sleep(0.05)
+        return 'ok'
+
+    async def caller():
+        result = await flight.ado('k', fn)
+        return result, last_call_coalesced()
+
+    async def scenario():
+        return await asyncio.gather(*(caller() for _ in range(3)))
+
+    results = asyncio.run(scenario())
+    assert sorted(coalesced for _, coalesced in results) == [False, True, True]
@@ -0,0 +1,58 @@
+# tests/test_structured_output.py - Parsing incrémental et réparation du JSON des modèles
+
+import json
+
+from models.structured_output import (PROFILE_ANALYSIS_SCHEMA, IncrementalJSONParser,
+                                      conform_to_schema, repair_json)
+
+DOCUMENT = {
+    'score_global': '7/10',
+    'points_forts': ['Python', 'Échanges "clients"'],
+    'titre_suggere': 'Data engineer',
+    'details': {'niveau': 3, 'remote': True, 'note': None}
+}
+
+
+def test_incremental_parser_exposes_fields_as_they_complete():
+    text = '```json\n' + json.dumps(DOCUMENT, ensure_ascii=False) + '\n```'
+    parser = IncrementalJSONParser()
+    seen = []
+    for char in text:
+        snapshot = parser.feed(char)
+        assert isinstance(snapshot, dict)
+        seen.append(snapshot)
+
+    assert parser.complete
+    assert seen[-1] == DOCUMENT
+    assert parser.completed_fields == list(DOCUMENT)
+    # Le titre est lisible, même partiel, avant que sa chaîne soit refermée
+    assert any(s.get('titre_suggere') == 'Data' for s in seen)
+    assert any(s.get('points_forts') == ['Python'] for s in seen)
+
+
+def test_incremental_parser_tolerates_chunk_boundaries_in_escapes():
+    parser = IncrementalJSONParser()
+    for chunk in ['{"resume_optimise": "a\\', '"b', '", "score_global": 1', '2}']:
+        parser.feed(chunk)
+    assert parser.snapshot() == {'resume_optimise': 'a"b', 'score_global': 12}
+
+
+def test_repair_json_fixes_common_defects():
+    assert repair_json('Voici:\n```json\n{"a": [1, 2,], }\n```') == {'a': [1, 2]}
+    assert repair_json('{“titre”: “Dev”}') == {'titre': 'Dev'}
+    assert repair_json('{"a": 1, "liste": ["x", "y') == {'a': 1, 'liste': ['x', 'y']}
+    assert repair_json('{"a": 1} texte après') == {'a': 1}
+    assert repair_json('pas de json') is None
+    assert repair_json('') is None
+
+
+def test_conform_to_schema_coerces_types_and_reports_missing():
+    data = {'score_global': 8, 'points_forts': '- Python\n- SQL', 'titre_suggere': ['Dev', 'Ops']}
+    result, missing = conform_to_schema(data, PROFILE_ANALYSIS_SCHEMA, {'resume_optimise': 'n/a'})
+
+    assert result['score_global'] == '8'
+    assert result['points_forts'] == ['Python', 'SQL']
+    assert result['titre_suggere'] == 'Dev, Ops'
+    assert result['resume_optimise'] == 'n/a'
+    assert set(missing) == {'points_amelioration', 'resume_optimise',
+                            'mots_cles_manquants', 'recommandations_urgentes'}
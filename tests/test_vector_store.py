@@ -0,0 +1,104 @@
+# tests/test_vector_store.py - Magasin de vecteurs: format binaire, remplacement, compaction, rappel IVF
+
+import json
+import logging
+import sqlite3
+
+import numpy as np
+import pytest
+
+from models.vector_codec import VECTOR_DTYPE, decode_stored, decode_vector, encode_vector
+from models.vector_store import SegmentedVectorStore, sync_from_sqlite
+
+
+def clustered(rng, centers, count, noise=1.0):
+    labels = rng.integers(len(centers), size=count)
+    return (centers[labels] + noise * rng.standard_normal((count, centers.shape[1]))).astype(np.float32)
+
+
+@pytest.fixture
+def dataset():
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((40, 32))
+    return clustered(rng, centers, 4000), clustered(rng, centers, 50)
+
+
+def recall(store, queries, k, nprobe):
+    exact = [[row_id for row_id, _ in store.search(q, k, nprobe=store.get_stats()['ann']['nlist'])]
+             for q in queries]
+    found = [[row_id for row_id, _ in store.search(q, k, nprobe=nprobe)] for q in queries]
+    return np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(found, exact)])
+
+
+def test_codec_round_trip_and_legacy_json():
+    vector = np.random.default_rng(1).standard_normal(7)
+    blob, dim = encode_vector(vector.tolist())
+
+    assert dim == 7 and len(blob) == 7 * VECTOR_DTYPE.itemsize
+    np.testing.assert_array_equal(decode_vector(blob, dim), vector.astype(VECTOR_DTYPE))
+    np.testing.assert_array_equal(decode_stored(blob, dim), vector.astype(VECTOR_DTYPE))
+    # Anciennes lignes: JSON texte ou octets, sans dimension
+    legacy = json.dumps([0.5, -1.0, 2.0])
+    np.testing.assert_array_equal(decode_stored(legacy, None), [0.5, -1.0, 2.0])
+    np.testing.assert_array_equal(decode_stored(legacy.encode(), None), [0.5, -1.0, 2.0])
+
+
+def test_upsert_delete_and_compaction_keep_latest_vectors(tmp_path):
+    store = SegmentedVectorStore(str(tmp_path), segment_max_rows=4, compact_dead_ratio=0.5)
+    basis = np.eye(8, dtype=np.float32)
+    store.append(range(8), basis)
+    store.append([3], [-basis[3]])  # remplace la ligne 3
+    store.delete([5])
+
+    assert len(store) == 7
+    assert store.search(basis[5], k=1)[0][0] != 5
+    assert store.search(-basis[3], k=1) == [(3, pytest.approx(1.0))]
+
+    store.delete([0, 1, 2])  # plus de la moitié des lignes mortes: compaction
+    stats = store.get_stats()
+    assert stats['compactions'] == 1 and stats['deleted_rows'] == 0 and len(store) == 4
+    # Un autre lecteur (autre processus) voit le même état
+    assert len(SegmentedVectorStore(str(tmp_path))) == 4
+
+
+def test_sync_from_sqlite_catches_up_and_skips_unreadable_rows(tmp_path):
+    db_path = str(tmp_path / 'source.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE offers (id INTEGER PRIMARY KEY, embedding TEXT)')
+    conn.executemany('INSERT INTO offers (embedding) VALUES (?)',
+                     [('[1, 0]',), ('pas du json',), (None,), ('[0, 1]',)])
+    conn.commit()
+    store = SegmentedVectorStore(str(tmp_path / 'vectors'))
+
+    sync_from_sqlite(store, db_path, 'offers', 'embedding', 'embedding IS NOT NULL', batch_size=2)
+    assert len(store) == 2 and store.source_last_id == 4
+
+    conn.execute("INSERT INTO offers (embedding) VALUES ('[1, 1]')")
+    conn.commit()
+    conn.close()
+    assert sync_from_sqlite(store, db_path, 'offers', 'embedding').search([1, 1], k=1)[0][0] == 5
+
+
+def test_approximate_search_is_opt_in(tmp_path, dataset):
+    vectors, queries = dataset
+    store = SegmentedVectorStore(str(tmp_path), ann_min_rows=0, nprobe=2)
+    store.append(range(len(vectors)), vectors)
+    assert store.get_stats()['ann'] is None  # pas d'entraînement automatique
+
+    store.train(nlist=32)
+    store.search(queries[0], k=5)
+    assert store.stats['ann_searches'] == 0  # toujours exacte sans activation
+
+
+def test_ivf_recall_against_exact_search(tmp_path, dataset, caplog):
+    vectors, queries = dataset
+    store = SegmentedVectorStore(str(tmp_path), segment_max_rows=1024, ann_min_rows=3000, nprobe=8)
+    store.append(range(3000), vectors[:3000])
+    assert store.get_stats()['ann']['nlist'] == int(np.sqrt(3000))
+    store.append(range(3000, len(vectors)), vectors[3000:])  # rangés dans les listes existantes
+
+    with caplog.at_level(logging.WARNING, logger='models.vector_store'):
+        assert recall(store, queries, k=10, nprobe=None) >= 0.95
+    assert store.stats['ann_searches'] == len(queries)
+    assert sum('Recherche approchée IVF active' in r.message for r in caplog.records) == 1
+    assert recall(store, queries, k=10, nprobe=1) < recall(store, queries, k=10, nprobe=16)